@@ -0,0 +1,130 @@
+# a_poll_engine.py
+# Incremental polling of A's transaction table.
+#
+# Instead of re-reading a "last minute" window with fetchall(), the engine
+# keeps a high-watermark (transaction_date, transaction_id) and asks the
+# source only for rows after it, streamed in fetchmany() batches. The poll
+# interval adapts to volume: a poll that returned at least a full batch
+# comes back after MIN_INTERVAL, quieter polls halve the interval and empty
+# polls back off towards MAX_INTERVAL. Parsed rows go to a sink, normally
+# A's served itemlines (ItemLines.upsert, capped at the newest codes).
+#
+# Sources are pluggable: anything with fetch_after(watermark) yielding row
+# batches works. DBAPISource covers oracledb and sqlite3 (both accept
+# :named parameters); SQLiteSource lets the engine run against a local
+# SQLite copy of ecommerce_transactions.
+import time
+from datetime import datetime, timedelta
+
+BATCH_SIZE = 1000          # rows per fetchmany / cursor.arraysize
+PREFETCH_ROWS = 1000       # oracledb round-trip prefetch
+LOOKBACK = 60              # seconds of history read on the very first poll
+MIN_INTERVAL = 1           # seconds
+BASE_INTERVAL = 10
+MAX_INTERVAL = 60
+
+COLUMNS = "transaction_id, user_id, product_id, amount, status, transaction_date"
+
+class DBAPISource:
+    """Reads rows after a watermark from any DB-API connection with :named params."""
+
+    def __init__(self, connection, table="ecommerce_transactions",
+                 arraysize=BATCH_SIZE, prefetchrows=PREFETCH_ROWS, lookback=LOOKBACK):
+        self.connection = connection
+        self.arraysize = arraysize
+        self.prefetchrows = prefetchrows
+        self.lookback = lookback
+        # Ties on transaction_date are broken by transaction_id so a row is
+        # neither skipped nor read twice at the window edge.
+        self.query_after = f"""
+            SELECT {COLUMNS} FROM {table}
+            WHERE transaction_date > :d
+               OR (transaction_date = :d AND transaction_id > :id)
+            ORDER BY transaction_date, transaction_id
+        """
+        self.query_from = f"""
+            SELECT {COLUMNS} FROM {table}
+            WHERE transaction_date >= :d
+            ORDER BY transaction_date, transaction_id
+        """
+
+    def initial_watermark(self):
+        return (datetime.now() - timedelta(seconds=self.lookback), None)
+
+    def fetch_after(self, watermark):
+        """Yield lists of rows newer than `watermark`, oldest first."""
+        date, txn_id = watermark
+        cursor = self.connection.cursor()
+        try:
+            cursor.arraysize = self.arraysize
+            if hasattr(cursor, "prefetchrows"):  # oracledb only
+                cursor.prefetchrows = self.prefetchrows
+            if txn_id is None:
+                cursor.execute(self.query_from, {"d": date})
+            else:
+                cursor.execute(self.query_after, {"d": date, "id": txn_id})
+            while True:
+                rows = cursor.fetchmany(self.arraysize)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+class SQLiteSource(DBAPISource):
+    """Local stand-in: same schema in SQLite, dates stored as ISO text."""
+
+    def initial_watermark(self):
+        date, txn_id = super().initial_watermark()
+        return (date.isoformat(sep=" "), txn_id)
+
+def row_to_line(row):
+    """Render a transaction row as an item line: "<code> <desc...> <qty> <value>"."""
+    txn_id, user_id, product_id, amount, status, txn_date = row
+    return f"{txn_id} {product_id} {status} 1 {float(amount):.2f}"
+
+class PollEngine:
+    """High-watermark poller feeding new rows into `sink` (e.g. itemlines.upsert)."""
+
+    def __init__(self, source, sink, to_line=row_to_line, min_interval=MIN_INTERVAL,
+                 base_interval=BASE_INTERVAL, max_interval=MAX_INTERVAL):
+        self.source = source
+        self.sink = sink
+        self.to_line = to_line
+        self.min_interval = min_interval
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.interval = base_interval
+        self.watermark = source.initial_watermark()
+        self.rows_total = 0
+
+    def poll_once(self):
+        """Read everything after the watermark; returns the number of rows."""
+        count = 0
+        for rows in self.source.fetch_after(self.watermark):
+            self.sink([self.to_line(r) for r in rows])
+            last = rows[-1]
+            self.watermark = (last[5], last[0])
+            count += len(rows)
+        self.rows_total += count
+        self._adapt(count)
+        return count
+
+    def _adapt(self, count):
+        if count >= getattr(self.source, "arraysize", BATCH_SIZE):
+            self.interval = self.min_interval          # busy: come straight back
+        elif count:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, max(self.interval, self.base_interval) * 1.5)
+
+    def run(self, stop=None):
+        """Poll until `stop` (a threading.Event) is set."""
+        while stop is None or not stop.is_set():
+            count = self.poll_once()
+            print(f"[A] Polled {count} new transactions; next poll in {self.interval:.1f}s "
+                  f"(watermark {self.watermark})")
+            if stop is not None:
+                stop.wait(self.interval)
+            else:
+                time.sleep(self.interval)
@@ -0,0 +1,70 @@
+# test_a_poll_engine.py
+# PollEngine against an in-memory SQLite ecommerce_transactions table.
+#
+# Usage:
+#   python -m pytest A/test_a_poll_engine.py
+import sqlite3
+
+from a_poll_engine import SQLiteSource, PollEngine, row_to_line
+
+START = ("2024-01-01 00:00:00", None)
+
+def make_db(rows=()):
+    db = sqlite3.connect(":memory:")
+    db.execute("""CREATE TABLE ecommerce_transactions (
+        transaction_id INTEGER PRIMARY KEY, user_id INTEGER, product_id INTEGER,
+        amount REAL, status TEXT, transaction_date TEXT)""")
+    insert(db, rows)
+    return db
+
+def insert(db, rows):
+    db.executemany("INSERT INTO ecommerce_transactions VALUES (?, 1, ?, 9.5, 'paid', ?)",
+                   [(txn_id, 500 + txn_id, date) for txn_id, date in rows])
+    db.commit()
+
+def make_engine(db, arraysize=2):
+    lines = []
+    engine = PollEngine(SQLiteSource(db, arraysize=arraysize), lines.extend)
+    engine.watermark = START
+    return engine, lines
+
+def ids(lines):
+    return [int(ln.split(" ", 1)[0]) for ln in lines]
+
+def test_tied_rows_are_read_once_across_batches_and_polls():
+    # five rows share one date; batches of two cut through the tie
+    tie = "2024-01-01 10:00:00"
+    db = make_db([(i, tie) for i in range(1, 6)] + [(6, "2024-01-01 10:00:01")])
+    engine, lines = make_engine(db)
+    assert engine.poll_once() == 6
+    assert ids(lines) == [1, 2, 3, 4, 5, 6]
+    assert engine.watermark == ("2024-01-01 10:00:01", 6)
+    assert engine.poll_once() == 0
+    assert ids(lines) == [1, 2, 3, 4, 5, 6]
+
+def test_row_with_watermark_date_and_higher_id_is_picked_up():
+    tie = "2024-01-01 10:00:00"
+    db = make_db([(1, tie), (2, tie)])
+    engine, lines = make_engine(db)
+    assert engine.poll_once() == 2
+    assert engine.watermark == (tie, 2)
+    # committed later with the same date as the watermark
+    insert(db, [(3, tie), (4, "2024-01-01 10:00:05")])
+    assert engine.poll_once() == 2
+    assert ids(lines) == [1, 2, 3, 4]
+    assert engine.watermark == ("2024-01-01 10:00:05", 4)
+
+def test_first_poll_reads_from_the_start_date_inclusive():
+    db = make_db([(1, "2023-12-31 23:59:59"), (2, START[0]), (3, "2024-01-02 00:00:00")])
+    engine, lines = make_engine(db)
+    engine.poll_once()
+    assert ids(lines) == [2, 3]
+
+def test_lines_and_interval():
+    db = make_db([(1, "2024-01-01 10:00:00")])
+    engine, lines = make_engine(db, arraysize=1)
+    engine.poll_once()
+    assert lines == [row_to_line((1, 1, 501, 9.5, "paid", "2024-01-01 10:00:00"))]
+    assert engine.interval == engine.min_interval  # a full batch: come straight back
+    engine.poll_once()
+    assert engine.interval > engine.min_interval   # empty poll: back off
@@ -2,8 +2,14 @@
 """
 FastAPI secure logging sink (C)
 - Receives POST /log
+- Receives POST /log/bulk (NDJSON, optionally gzip; one transaction per request)
+- Serves GET /feed (keyset-paginated NDJSON pull)
+- Serves GET /stream (Server-Sent Events push of every accepted record)
+- Serves GET /metrics (Prometheus text; see ../metrics.py)
 - Auth: API Key (Bearer) or mutual TLS (optional)
-- Stores raw payloads into SQLite (logs table)
+- Stores raw payloads into day-partitioned SQLite files (see log_store.py):
+  compressed payloads, headers stored once per distinct set
+- Writes go through one long-lived WAL connection that group-commits batches
 - Minimal dependencies: fastapi, uvicorn
 
 Usage:
@@ -16,48 +22,270 @@ See the `# CERT` block at the bottom for example OpenSSL commands to create test
 """
 
 from fastapi import FastAPI, Request, Header, HTTPException, status
-from fastapi.responses import JSONResponse
-import sqlite3
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from contextlib import asynccontextmanager
+import asyncio
+import base64
 import os
+import sys
 import argparse
 import ssl
+import queue
+import threading
+import time
+import zlib
+import concurrent.futures
 import uvicorn
 from datetime import datetime
 import json
 from typing import Optional
+from log_store import LOG_DIR, LogStore, canonical_headers, utc_day
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import metrics  # shared with A/B/C at the repo root
 
-DB_PATH = os.environ.get("C_LOG_DB", "c_logs.db")
 API_KEYS = {"A": "api_key_for_A_123", "B": "api_key_for_B_456"}  # rotate/replace in prod
+READ_API_KEYS = {"dashboard": "api_key_for_dashboard_789"}        # may read /feed, not write
+
+FEED_DEFAULT_LIMIT = 100
+FEED_MAX_LIMIT = 10000
+FEED_FETCH_ROWS = 500   # rows per fetchmany while streaming
+
+# Live push (/stream)
+SUBSCRIBER_BUFFER = 1000          # records queued per subscriber
+SLOW_CONSUMER_POLICY = "disconnect"  # or "drop": discard records for a full subscriber
+STREAM_KEEPALIVE = 15             # seconds between SSE comment pings
+
+# Group commit: a batch is committed when it reaches BATCH_MAX_ROWS or when
+# BATCH_MAX_WAIT seconds have passed since its first record.
+GROUP_COMMIT = os.environ.get("C_LOG_GROUP_COMMIT", "1") != "0"
+BATCH_MAX_ROWS = 500
+BATCH_MAX_WAIT = 0.005
+WRITE_QUEUE_SIZE = 10000
+WRITE_RETRY_AFTER = 1   # seconds, sent with 503 when the write queue is full
+
+# Bulk ingest (/log/bulk)
+BULK_MAX_BYTES = 64 * 1024 * 1024   # decompressed body limit
+BULK_MAX_RECORDS = 100000
+
+# --- METRICS ---
+M_REQUESTS = metrics.counter("feed_requests_total", "Write requests accepted", ["endpoint", "source"])
+M_RECORDS = metrics.counter("feed_records_total", "Records stored", ["source"])
+M_APPEND = metrics.histogram("feed_append_seconds", "Write request received until committed", ["endpoint"])
+M_COMMIT = metrics.histogram("feed_commit_seconds", "One insert + commit", ["mode"])
+M_BATCH = metrics.histogram("feed_commit_rows", "Rows per group commit", scale=1, bounds=metrics.SIZE_BOUNDS)
+M_QUEUE = metrics.gauge("feed_write_queue_depth", "Requests waiting for the writer thread")
+M_SUBSCRIBERS = metrics.gauge("feed_stream_subscribers", "Open /stream connections")
+M_DROPPED = metrics.counter("feed_stream_dropped_total", "Records not delivered to a full subscriber")
+M_REJECTED = metrics.counter("feed_rejected_total", "Write requests refused because the write queue was full", ["endpoint"])
 
-app = FastAPI(title="C - Secure Logging Sink")
 
 # --- DB helpers ---
-def init_db(path=DB_PATH):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        received_at TEXT NOT NULL,
-        source TEXT,
-        client_ip TEXT,
-        headers TEXT,
-        payload_raw BLOB
-    );
-    """)
-    conn.commit()
-    conn.close()
+store = LogStore(LOG_DIR)
+
+
+def init_db():
+    store.ensure_partition(utc_day())
+
+
+def published_rows(items, ids):
+    """(id, received_at, source, client_ip, headers, payload) rows for the broadcaster."""
+    out = []
+    for (meta, rows), row_ids in zip(items, ids):
+        for log_id, row in zip(row_ids, rows):
+            if meta is not None:
+                row = row[:2] + meta[2:4] + row[4:]
+            out.append((log_id,) + row)
+    return out
 
 
 def append_log(source: Optional[str], client_ip: Optional[str], headers: dict, payload_bytes: bytes):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO logs (received_at, source, client_ip, headers, payload_raw) VALUES (?, ?, ?, ?, ?)",
-        (datetime.utcnow().isoformat() + 'Z', source, client_ip, json.dumps(headers), payload_bytes),
-    )
-    conn.commit()
+    """Insert one row on its own connection; returns (id, row)."""
+    row = (datetime.utcnow().isoformat() + 'Z', source, client_ip, canonical_headers(headers), payload_bytes)
+    conn = store.connect()
+    with M_COMMIT.labels("direct").time(), conn:
+        (log_id,), = store.insert_items(conn, [(None, [row])])
     conn.close()
+    return log_id, row
+
+
+def append_bulk(meta, rows):
+    """Insert one bulk request on its own connection; returns the row ids."""
+    conn = store.connect()
+    with M_COMMIT.labels("direct").time(), conn:
+        ids, = store.insert_items(conn, [(meta, rows)])
+    conn.close()
+    return ids
+
+
+class LogWriter:
+    """Single writer thread owning one WAL-mode connection to today's partition.
+
+    Requests enqueue records and await a future; the thread drains the queue
+    into batches, inserts each with executemany in one transaction, and
+    resolves the futures with the new row ids once the commit is done.
+    """
+
+    def __init__(self, log_store=None, max_rows=BATCH_MAX_ROWS, max_wait=BATCH_MAX_WAIT):
+        self.store = log_store or store
+        self.max_rows = max_rows
+        self.max_wait = max_wait
+        self.queue = queue.Queue(WRITE_QUEUE_SIZE)
+        self.batches = 0
+        self.rows = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread:
+            self.queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, rows, meta=None):
+        """Queue rows (see insert_items); the Future resolves to their ids.
+
+        Never blocks (it runs on the event loop): raises queue.Full when the
+        writer is WRITE_QUEUE_SIZE requests behind.
+        """
+        future = concurrent.futures.Future()
+        self.queue.put_nowait((meta, rows, future))
+        return future
+
+    def _submit_or_503(self, endpoint, rows, meta=None):
+        try:
+            return self.submit(rows, meta)
+        except queue.Full:
+            M_REJECTED.labels(endpoint).inc()
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Log writer is behind, retry later",
+                                headers={"Retry-After": str(WRITE_RETRY_AFTER)})
+
+    async def write(self, source, client_ip, headers, payload_bytes):
+        row = (datetime.utcnow().isoformat() + 'Z', source, client_ip, canonical_headers(headers), payload_bytes)
+        ids = await asyncio.wrap_future(self._submit_or_503("log", [row]))
+        return ids[0]
+
+    async def write_bulk(self, meta, rows):
+        return await asyncio.wrap_future(self._submit_or_503("bulk", rows, meta))
+
+    def _next_batch(self):
+        first = self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        count = len(first[1])
+        deadline = time.monotonic() + self.max_wait
+        while count < self.max_rows:
+            try:
+                item = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                self.queue.put(None)  # finish this batch, then stop
+                break
+            batch.append(item)
+            count += len(item[1])
+        return batch
+
+    def _run(self):
+        day = utc_day()
+        conn = self.store.connect(day)
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    break
+                if utc_day() != day:
+                    # Midnight (UTC): continue in the next day's partition
+                    conn.close()
+                    day = utc_day()
+                    conn = self.store.connect(day)
+                M_QUEUE.set(self.queue.qsize())
+                items = [(meta, rows) for meta, rows, _ in batch]
+                try:
+                    with M_COMMIT.labels("group").time(), conn:
+                        ids = self.store.insert_items(conn, items)
+                except Exception as e:
+                    for _, _, future in batch:
+                        future.set_exception(e)
+                    continue
+                for (_, _, future), row_ids in zip(batch, ids):
+                    future.set_result(row_ids)
+                self.batches += 1
+                self.rows += sum(len(r) for r in ids)
+                M_BATCH.observe(sum(len(r) for r in ids))
+                broadcaster.publish_threadsafe(published_rows(items, ids))
+        finally:
+            conn.close()
+
+
+class Subscriber:
+    def __init__(self, sources):
+        self.sources = sources   # None = all sources
+        self.queue = asyncio.Queue(SUBSCRIBER_BUFFER)
+        self.dropped = 0
+        self.closed = False
+
+
+class Broadcaster:
+    """Fans committed records out to /stream subscribers, in id order."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.loop = None
+
+    def subscribe(self, sources=None):
+        sub = Subscriber(sources)
+        self.subscribers.add(sub)
+        M_SUBSCRIBERS.set(len(self.subscribers))
+        return sub
+
+    def unsubscribe(self, sub):
+        self.subscribers.discard(sub)
+        M_SUBSCRIBERS.set(len(self.subscribers))
+
+    def publish_threadsafe(self, rows):
+        """Called by the writer thread with committed (id, received_at, source, ...) rows."""
+        if self.subscribers and self.loop is not None:
+            self.loop.call_soon_threadsafe(self.publish, rows)
+
+    def publish(self, rows):
+        for row in rows:
+            line = None
+            for sub in list(self.subscribers):
+                if sub.closed or (sub.sources and row[2] not in sub.sources):
+                    continue
+                if line is None:
+                    line = row_to_ndjson(row)
+                try:
+                    sub.queue.put_nowait((row[0], line))
+                except asyncio.QueueFull:
+                    sub.dropped += 1
+                    M_DROPPED.inc()
+                    if SLOW_CONSUMER_POLICY == "disconnect":
+                        # It can reconnect with Last-Event-ID and backfill from SQLite
+                        sub.closed = True
+                        self.unsubscribe(sub)
+
+
+writer = LogWriter()
+broadcaster = Broadcaster()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    init_db()
+    broadcaster.loop = asyncio.get_running_loop()
+    if GROUP_COMMIT:
+        writer.start()
+    yield
+    writer.stop()
+
+
+app = FastAPI(title="C - Secure Logging Sink", lifespan=lifespan)
 
 
 # --- Auth dependency ---
@@ -74,6 +302,45 @@ async def verify_api_key(authorization: Optional[str] = Header(None)) -> Optiona
     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid API key")
 
 
+async def verify_read_key(authorization: Optional[str] = Header(None)) -> str:
+    """Like verify_api_key, but also accepts READ_API_KEYS."""
+    if authorization and authorization.startswith("Bearer "):
+        key = authorization.split(" ", 1)[1].strip()
+        for reader, valid_key in READ_API_KEYS.items():
+            if key == valid_key:
+                return reader
+    return await verify_api_key(authorization)
+
+
+def row_to_ndjson(row) -> bytes:
+    """One logs row as an NDJSON line; headers are stored as JSON and embedded as-is."""
+    log_id, received_at, source, client_ip, headers, payload = row
+    if headers and '"authorization"' in headers:
+        # Never hand API keys to feed readers
+        parsed = json.loads(headers)
+        parsed["authorization"] = "<redacted>"
+        headers = json.dumps(parsed)
+    try:
+        payload_field = '"payload":' + json.dumps(bytes(payload or b"").decode("utf-8"))
+    except UnicodeDecodeError:
+        payload_field = '"payload_b64":"' + base64.b64encode(payload).decode("ascii") + '"'
+    return ('{"id":%d,"received_at":%s,"source":%s,"client_ip":%s,"headers":%s,%s}\n' % (
+        log_id, json.dumps(received_at), json.dumps(source), json.dumps(client_ip),
+        headers or "null", payload_field)).encode("utf-8")
+
+
+def stream_feed(rows):
+    """Yield NDJSON lines for `rows`, FEED_FETCH_ROWS at a time."""
+    chunk = []
+    for row in rows:
+        chunk.append(row_to_ndjson(row))
+        if len(chunk) >= FEED_FETCH_ROWS:
+            yield b"".join(chunk)
+            chunk = []
+    if chunk:
+        yield b"".join(chunk)
+
+
 # --- Endpoints ---
 @app.post("/log")
 async def receive_log(request: Request, authorization: Optional[str] = Header(None)):
@@ -89,10 +356,173 @@ async def receive_log(request: Request, authorization: Optional[str] = Header(No
     headers = dict(request.headers)
     body = await request.body()
 
-    # Append raw payload only; NO processing
-    append_log(source, client_ip, headers, body)
+    # Append raw payload only; NO processing. Acknowledged once committed.
+    started = time.perf_counter()
+    if GROUP_COMMIT:
+        log_id = await writer.write(source, client_ip, headers, body)
+    else:
+        log_id, row = append_log(source, client_ip, headers, body)
+        broadcaster.publish([(log_id,) + row])
+    M_APPEND.labels("log").observe(time.perf_counter() - started)
+    M_REQUESTS.labels("log", source).inc()
+    M_RECORDS.labels(source).inc()
+
+    return JSONResponse({"status": "ok", "received_from": source, "bytes": len(body), "id": log_id})
 
-    return JSONResponse({"status": "ok", "received_from": source, "bytes": len(body)})
+
+def read_bulk_body(body: bytes, encoding: Optional[str]) -> bytes:
+    """Undo Content-Encoding: gzip, refusing bodies that inflate past BULK_MAX_BYTES."""
+    if not encoding or encoding.lower() == "identity":
+        data = body
+    elif encoding.lower() == "gzip":
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            data = d.decompress(body, BULK_MAX_BYTES + 1)
+        except zlib.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+        if d.unconsumed_tail or not d.eof:
+            if len(data) > BULK_MAX_BYTES:
+                raise HTTPException(status_code=413, detail="Decompressed body too large")
+            raise HTTPException(status_code=400, detail="Truncated gzip body")
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+    if len(data) > BULK_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Body too large")
+    return data
+
+
+@app.post("/log/bulk")
+async def receive_bulk(request: Request, authorization: Optional[str] = Header(None),
+                       content_encoding: Optional[str] = Header(None)):
+    """Store many NDJSON records from one request in a single transaction.
+
+    Every non-empty line must be a JSON document; lines that are not are
+    reported as errors and the rest are still stored. The request headers
+    and client IP are kept once in `batches` rather than on every row.
+    Results are listed per line (1-based) in body order.
+    """
+    source = await verify_api_key(authorization)
+    client_ip = request.client.host if request.client else None
+    headers = dict(request.headers)
+    data = read_bulk_body(await request.body(), content_encoding)
+
+    received_at = datetime.utcnow().isoformat() + 'Z'
+    rows, results = [], []
+    for n, line in enumerate(data.split(b"\n"), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            json.loads(line)
+        except ValueError as e:
+            results.append({"line": n, "status": "error", "error": f"Invalid JSON: {e}"})
+            continue
+        rows.append((received_at, source, None, None, line))
+        results.append({"line": n, "status": "ok"})
+        if len(rows) > BULK_MAX_RECORDS:
+            raise HTTPException(status_code=413, detail=f"More than {BULK_MAX_RECORDS} records")
+
+    ids = []
+    if rows:
+        meta = (received_at, source, client_ip, canonical_headers(headers))
+        started = time.perf_counter()
+        if GROUP_COMMIT:
+            ids = await writer.write_bulk(meta, rows)
+        else:
+            ids = await asyncio.to_thread(append_bulk, meta, rows)
+            broadcaster.publish(published_rows([(meta, rows)], [ids]))
+        M_APPEND.labels("bulk").observe(time.perf_counter() - started)
+        M_RECORDS.labels(source).inc(len(rows))
+    M_REQUESTS.labels("bulk", source).inc()
+    ok = iter(ids)
+    for r in results:
+        if r["status"] == "ok":
+            r["id"] = next(ok)
+
+    return JSONResponse({"status": "ok", "received_from": source, "bytes": len(data),
+                         "stored": len(rows), "rejected": len(results) - len(rows),
+                         "results": results})
+
+
+@app.get("/feed")
+async def feed(source: Optional[str] = None, after_id: int = 0, since: Optional[str] = None,
+               until: Optional[str] = None, limit: int = FEED_DEFAULT_LIMIT,
+               authorization: Optional[str] = Header(None)):
+    """Page through logs in id order as NDJSON.
+
+    Pass the last id you received as `after_id` to get the next page; fewer
+    than `limit` lines means you are caught up. `since`/`until` are ISO
+    timestamps matched against received_at.
+    """
+    await verify_read_key(authorization)
+    limit = max(1, min(limit, FEED_MAX_LIMIT))
+    rows = store.iter_rows(source, after_id, since, until, limit, fetch_rows=FEED_FETCH_ROWS)
+    return StreamingResponse(stream_feed(rows), media_type="application/x-ndjson")
+
+
+def fetch_page(source_list, after_id, limit=FEED_FETCH_ROWS):
+    """Rows with id > after_id for any of `source_list` (None = all), oldest first."""
+    return list(store.iter_rows(sources=source_list, after_id=after_id, limit=limit))
+
+
+def sse_event(log_id, line: bytes) -> bytes:
+    return b"id: %d\nevent: log\ndata: " % log_id + line.rstrip(b"\n") + b"\n\n"
+
+
+@app.get("/stream")
+async def stream(request: Request, source: Optional[str] = None, last_id: Optional[int] = None,
+                 authorization: Optional[str] = Header(None),
+                 last_event_id: Optional[str] = Header(None)):
+    """Server-Sent Events tail of accepted records.
+
+    `source` takes a comma-separated filter (e.g. A,B). Resume with
+    `last_id` or the standard Last-Event-ID header: records after it are
+    backfilled from SQLite before switching to the live feed. Subscribers
+    that fall SUBSCRIBER_BUFFER records behind are disconnected (or have
+    records dropped, per SLOW_CONSUMER_POLICY) and can resume the same way.
+    """
+    await verify_read_key(authorization)
+    sources = [s.strip() for s in source.split(",")] if source else None
+    if last_id is None:
+        last_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+
+    async def events():
+        sent = last_id
+        sub = None
+        try:
+            if sent is None:
+                sent = 0
+            else:
+                # Backfill until caught up, then subscribe and close the gap once more
+                while True:
+                    rows = await asyncio.to_thread(fetch_page, sources, sent)
+                    for row in rows:
+                        yield sse_event(row[0], row_to_ndjson(row))
+                        sent = row[0]
+                    if len(rows) < FEED_FETCH_ROWS:
+                        break
+            sub = broadcaster.subscribe(sources)
+            if last_id is not None:
+                for row in await asyncio.to_thread(fetch_page, sources, sent, FEED_MAX_LIMIT):
+                    yield sse_event(row[0], row_to_ndjson(row))
+                    sent = row[0]
+            while not sub.closed:
+                try:
+                    log_id, line = await asyncio.wait_for(sub.queue.get(), STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": keepalive\n\n"
+                    continue
+                if log_id > sent:
+                    yield sse_event(log_id, line)
+                    sent = log_id
+        finally:
+            if sub is not None:
+                broadcaster.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @app.get("/health")
@@ -100,6 +530,12 @@ async def health():
     return {"status": "ok", "time_utc": datetime.utcnow().isoformat() + 'Z'}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text format; holds no payloads, so it needs no key."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 # --- CLI / TLS config and run ---
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Run C - secure logging sink")
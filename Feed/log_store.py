@@ -0,0 +1,442 @@
+#als
+"""
+Day-partitioned log storage for the Feed sink (C)
+- One SQLite file per UTC day: <LOG_DIR>/logs-YYYY-MM-DD.db
+- Payloads compressed per row with zlib or lzma (codec stored per row, so
+  changing PAYLOAD_CODEC never breaks old rows)
+- Header sets stored once per partition in a content-addressed `headers`
+  table (blake2b of the canonical JSON)
+- Ids stay globally increasing: a new partition's AUTOINCREMENT sequence
+  starts where the previous one ended, so /feed keyset cursors span days
+- Reads ATTACH the partitions they need to one connection and merge them
+  with UNION ALL ... ORDER BY id
+- Retention deletes whole files (RETENTION_DAYS); no DELETE or VACUUM
+
+Usage:
+  python log_store.py import-legacy c_logs.db   # split an old single-file DB into partitions
+  python log_store.py prune --days 30
+  python log_store.py stats
+"""
+
+import os
+import re
+import glob
+import json
+import lzma
+import zlib
+import sqlite3
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta
+
+LOG_DIR = os.environ.get("C_LOG_DIR", "c_logs")
+PAYLOAD_CODEC = os.environ.get("C_LOG_CODEC", "zlib")  # "zlib", "lzma" or "none"
+PAYLOAD_MIN_BYTES = 128   # smaller payloads are stored as-is
+ZLIB_LEVEL = 6
+LZMA_PRESET = 6
+RETENTION_DAYS = int(os.environ.get("C_LOG_RETENTION_DAYS", "0")) or None  # None keeps every day
+ATTACH_MAX = 8            # partitions attached per read connection (SQLite allows 10 by default)
+# Per-request headers that would defeat deduplication; the payload gives its own length
+VOLATILE_HEADERS = ("content-length",)
+
+PARTITION_RE = re.compile(r"logs-(\d{4}-\d{2}-\d{2})\.db$")
+
+# --- payload codecs ---
+CODECS = {
+    "zlib": (lambda b: zlib.compress(b, ZLIB_LEVEL), zlib.decompress),
+    "lzma": (lambda b: lzma.compress(b, preset=LZMA_PRESET), lzma.decompress),
+}
+
+
+def encode_payload(data: bytes, codec=PAYLOAD_CODEC):
+    """Return (codec or None, stored bytes); keeps the raw bytes when compression doesn't pay."""
+    if codec not in CODECS or len(data) < PAYLOAD_MIN_BYTES:
+        return None, data
+    packed = CODECS[codec][0](data)
+    if len(packed) >= len(data):
+        return None, data
+    return codec, packed
+
+
+def decode_payload(codec, data):
+    if codec is None or data is None:
+        return data
+    return CODECS[codec][1](data)
+
+
+# --- headers ---
+def canonical_headers(headers: dict) -> str:
+    """Stable JSON for a header set (sorted, volatile headers dropped)."""
+    kept = {k: v for k, v in headers.items() if k.lower() not in VOLATILE_HEADERS}
+    return json.dumps(kept, sort_keys=True, separators=(",", ":"))
+
+
+def headers_hash(headers_json: str) -> str:
+    return hashlib.blake2b(headers_json.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# --- partitions ---
+def utc_day(ts=None) -> str:
+    """YYYY-MM-DD for an ISO timestamp (or now)."""
+    if ts:
+        return ts[:10]
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+
+def next_day(day: str) -> str:
+    return (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def partition_path(day, directory=LOG_DIR):
+    return os.path.join(directory, f"logs-{day}.db")
+
+
+def list_partitions(directory=LOG_DIR):
+    """Return [(day, path)] oldest first."""
+    found = []
+    for path in glob.glob(os.path.join(directory, "logs-*.db")):
+        m = PARTITION_RE.search(os.path.basename(path))
+        if m:
+            found.append((m.group(1), path))
+    return sorted(found)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    received_at TEXT NOT NULL,
+    source TEXT,
+    client_ip TEXT,
+    headers_hash TEXT,
+    codec TEXT,
+    payload BLOB,
+    batch_id INTEGER
+);
+-- Request metadata shared by all records of one /log/bulk call
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    received_at TEXT NOT NULL,
+    source TEXT,
+    client_ip TEXT,
+    headers_hash TEXT,
+    records INTEGER
+);
+-- Content-addressed header sets
+CREATE TABLE IF NOT EXISTS headers (
+    hash TEXT PRIMARY KEY,
+    headers TEXT NOT NULL
+) WITHOUT ROWID;
+-- Keyset reads: WHERE source = ? AND id > ? ORDER BY id, and time-range filters
+CREATE INDEX IF NOT EXISTS idx_logs_source_id ON logs (source, id);
+CREATE INDEX IF NOT EXISTS idx_logs_received_at ON logs (received_at);
+"""
+
+
+def last_ids(path):
+    """(last log id, last batch id) handed out in a partition."""
+    conn = sqlite3.connect(path)
+    try:
+        seq = dict(conn.execute("SELECT name, seq FROM sqlite_sequence").fetchall())
+    except sqlite3.OperationalError:
+        seq = {}
+    finally:
+        conn.close()
+    return seq.get("logs", 0), seq.get("batches", 0)
+
+
+class LogStore:
+    """The set of day partitions under one directory."""
+
+    def __init__(self, directory=LOG_DIR, codec=PAYLOAD_CODEC, retention_days=RETENTION_DAYS):
+        self.directory = directory
+        self.codec = codec
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._ready = set()   # partition paths known to exist with schema
+        self._bounds = {}     # path -> (min id, max id) for closed days
+
+    # --- writing ---
+    def ensure_partition(self, day):
+        """Create the partition for `day` if needed, continuing the id sequence."""
+        path = partition_path(day, self.directory)
+        if path in self._ready:
+            return path
+        with self._lock:
+            if path in self._ready:
+                return path
+            os.makedirs(self.directory, exist_ok=True)
+            fresh = not os.path.exists(path)
+            previous = [p for d, p in list_partitions(self.directory) if d < day]
+            conn = sqlite3.connect(path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            if fresh and previous:
+                log_id, batch_id = last_ids(previous[-1])
+                with conn:
+                    conn.executemany("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                                     [("logs", log_id), ("batches", batch_id)])
+            conn.close()
+            self._ready.add(path)
+            if fresh:
+                self.apply_retention(day)
+        return path
+
+    def connect(self, day=None):
+        """Write connection to the partition for `day` (default: today, UTC)."""
+        conn = sqlite3.connect(self.ensure_partition(day or utc_day()), check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def insert_items(self, conn, items):
+        """Insert [(meta, rows)] in the caller's transaction; returns the row ids per item.
+
+        `rows` are (received_at, source, client_ip, headers_json, payload)
+        tuples. `meta` is None for single /log records, or (received_at,
+        source, client_ip, headers_json) for a /log/bulk request: it is
+        stored once in `batches` and its rows reference it.
+        """
+        hashes = {}
+
+        def ref(headers_json):
+            if headers_json is None:
+                return None
+            h = hashes.get(headers_json)
+            if h is None:
+                h = hashes[headers_json] = headers_hash(headers_json)
+            return h
+
+        all_rows = []
+        for meta, rows in items:
+            batch_id = None
+            if meta is not None:
+                received_at, source, client_ip, headers_json = meta
+                batch_id = conn.execute(
+                    "INSERT INTO batches (received_at, source, client_ip, headers_hash, records) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (received_at, source, client_ip, ref(headers_json), len(rows))).lastrowid
+            for received_at, source, client_ip, headers_json, payload in rows:
+                codec, stored = encode_payload(payload, self.codec)
+                all_rows.append((received_at, source, client_ip, ref(headers_json), codec,
+                                 stored, batch_id))
+        conn.executemany("INSERT OR IGNORE INTO headers (hash, headers) VALUES (?, ?)",
+                         [(h, j) for j, h in hashes.items()])
+        conn.executemany(
+            "INSERT INTO logs (received_at, source, client_ip, headers_hash, codec, payload, batch_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", all_rows)
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        # Only one connection writes at a time, so the rows got consecutive ids
+        next_id = last_id - len(all_rows) + 1
+        ids = []
+        for _, rows in items:
+            ids.append(list(range(next_id, next_id + len(rows))))
+            next_id += len(rows)
+        return ids
+
+    # --- retention ---
+    def apply_retention(self, today=None):
+        """Delete partitions older than retention_days; returns the days dropped."""
+        if not self.retention_days:
+            return []
+        cutoff = (datetime.strptime(today or utc_day(), "%Y-%m-%d")
+                  - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+        return self.drop_before(cutoff)
+
+    def drop_before(self, day):
+        dropped = []
+        partitions = list_partitions(self.directory)
+        # The newest partition carries the id sequence forward; never drop it
+        for d, path in partitions[:-1]:
+            if d >= day:
+                break
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            self._ready.discard(path)
+            self._bounds.pop(path, None)
+            dropped.append(d)
+        if dropped:
+            print(f"[store] Dropped partitions {dropped[0]}..{dropped[-1]}")
+        return dropped
+
+    # --- reading ---
+    def bounds(self, day, path):
+        """(min id, max id) of a partition; cached once its day is over."""
+        cached = self._bounds.get(path)
+        if cached:
+            return cached
+        conn = sqlite3.connect(path)
+        try:
+            lo, hi = conn.execute("SELECT MIN(id), MAX(id) FROM logs").fetchone()
+        finally:
+            conn.close()
+        result = (lo or 0, hi or 0)
+        if day < utc_day():
+            self._bounds[path] = result
+        return result
+
+    def partitions_for(self, after_id=0, since=None, until=None):
+        """Partitions that can hold rows matching a keyset/time filter, oldest first.
+
+        A row lands in the partition of the day it was committed, which is
+        never before the day it was received but can be the day after (a
+        row received just before midnight), so `until` keeps one more day
+        of partitions and the received_at filter makes the exact cut.
+        """
+        last_day = next_day(utc_day(until)) if until else None
+        out = []
+        for day, path in list_partitions(self.directory):
+            if since and day < since[:10]:
+                continue
+            if last_day and day > last_day:
+                break
+            if after_id and self.bounds(day, path)[1] <= after_id:
+                continue
+            out.append(path)
+        return out
+
+    def iter_rows(self, source=None, after_id=0, since=None, until=None, limit=None,
+                  sources=None, fetch_rows=500):
+        """Yield (id, received_at, source, client_ip, headers_json, payload) in id order.
+
+        Up to ATTACH_MAX partitions are attached to one in-memory connection
+        at a time and read with a single UNION ALL ... ORDER BY id query,
+        which SQLite merges arm by arm without sorting.
+        """
+        where = ["l.id > ?"]
+        params = [after_id]
+        if source:
+            sources = [source]
+        if sources:
+            where.append("l.source IN (%s)" % ",".join("?" * len(sources)))
+            params += list(sources)
+        if since:
+            where.append("l.received_at >= ?")
+            params.append(since)
+        if until:
+            where.append("l.received_at < ?")
+            params.append(until)
+        where = " AND ".join(where)
+
+        paths = self.partitions_for(after_id, since, until)
+        remaining = limit
+        for start in range(0, len(paths), ATTACH_MAX):
+            window = paths[start:start + ATTACH_MAX]
+            conn = sqlite3.connect(":memory:")
+            try:
+                arms = []
+                for i, path in enumerate(window):
+                    conn.execute(f"ATTACH DATABASE ? AS p{i}", (path,))
+                    arms.append(
+                        f"SELECT l.id, l.received_at, l.source, COALESCE(l.client_ip, b.client_ip), "
+                        f"h.headers, l.codec, l.payload FROM p{i}.logs l "
+                        f"LEFT JOIN p{i}.batches b ON b.id = l.batch_id "
+                        f"LEFT JOIN p{i}.headers h ON h.hash = COALESCE(l.headers_hash, b.headers_hash) "
+                        f"WHERE {where}")
+                sql = " UNION ALL ".join(arms) + " ORDER BY 1"
+                args = params * len(window)
+                if remaining is not None:
+                    sql += " LIMIT ?"
+                    args.append(remaining)
+                cur = conn.execute(sql, args)
+                while True:
+                    rows = cur.fetchmany(fetch_rows)
+                    if not rows:
+                        break
+                    for log_id, received_at, src, client_ip, headers, codec, payload in rows:
+                        yield (log_id, received_at, src, client_ip, headers,
+                               decode_payload(codec, payload))
+                    if remaining is not None:
+                        remaining -= len(rows)
+            finally:
+                conn.close()
+            if remaining is not None and remaining <= 0:
+                break
+
+    def stats(self):
+        """Per-partition row counts and file sizes."""
+        out = []
+        for day, path in list_partitions(self.directory):
+            conn = sqlite3.connect(path)
+            try:
+                rows, = conn.execute("SELECT COUNT(*) FROM logs").fetchone()
+                headers, = conn.execute("SELECT COUNT(*) FROM headers").fetchone()
+                stored, = conn.execute("SELECT COALESCE(SUM(LENGTH(payload)), 0) FROM logs").fetchone()
+            finally:
+                conn.close()
+            out.append({"day": day, "rows": rows, "header_sets": headers,
+                        "payload_bytes": stored, "file_bytes": os.path.getsize(path)})
+        return out
+
+    # --- migration ---
+    def import_legacy(self, path):
+        """Copy an old single-file c_logs.db into day partitions, keeping ids."""
+        if list_partitions(self.directory):
+            raise SystemExit(f"{self.directory} already has partitions; import into an empty directory")
+        src = sqlite3.connect(path)
+        columns = [r[1] for r in src.execute("PRAGMA table_info(logs)")]
+        batch_col = "batch_id" if "batch_id" in columns else "NULL"
+        cur = src.execute(f"SELECT id, received_at, source, client_ip, headers, payload_raw, {batch_col} "
+                          "FROM logs ORDER BY id")
+        batches = {}
+        if src.execute("SELECT 1 FROM sqlite_master WHERE name = 'batches'").fetchone():
+            for bid, received_at, source, client_ip, headers, records in src.execute(
+                    "SELECT id, received_at, source, client_ip, headers, records FROM batches"):
+                batches[bid] = (received_at, source, client_ip, headers, records)
+        conn = day = None
+        copied = 0
+        for log_id, received_at, source, client_ip, headers, payload, batch_id in cur:
+            row_day = max(utc_day(received_at), day or "")
+            if row_day != day:
+                if conn:
+                    conn.commit()
+                    conn.close()
+                day = row_day
+                conn = self.connect(day)
+            ref = None
+            if headers:
+                headers = canonical_headers(json.loads(headers))
+                ref = headers_hash(headers)
+                conn.execute("INSERT OR IGNORE INTO headers (hash, headers) VALUES (?, ?)", (ref, headers))
+            if batch_id in batches:
+                b_received, b_source, b_ip, b_headers, records = batches.pop(batch_id)
+                b_ref = None
+                if b_headers:
+                    b_headers = canonical_headers(json.loads(b_headers))
+                    b_ref = headers_hash(b_headers)
+                    conn.execute("INSERT OR IGNORE INTO headers (hash, headers) VALUES (?, ?)",
+                                 (b_ref, b_headers))
+                conn.execute("INSERT INTO batches (id, received_at, source, client_ip, headers_hash, records) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", (batch_id, b_received, b_source, b_ip, b_ref, records))
+            codec, stored = encode_payload(bytes(payload or b""), self.codec)
+            conn.execute("INSERT INTO logs (id, received_at, source, client_ip, headers_hash, codec, "
+                         "payload, batch_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (log_id, received_at, source, client_ip, ref, codec, stored, batch_id))
+            copied += 1
+        if conn:
+            conn.commit()
+            conn.close()
+        src.close()
+        return copied
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Feed log partitions")
+    parser.add_argument("--dir", default=LOG_DIR)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_import = sub.add_parser("import-legacy", help="Split a single-file c_logs.db into partitions")
+    p_import.add_argument("path")
+    p_prune = sub.add_parser("prune", help="Drop partitions older than --days")
+    p_prune.add_argument("--days", type=int, required=True)
+    sub.add_parser("stats", help="Rows and sizes per partition")
+    args = parser.parse_args()
+
+    store = LogStore(args.dir)
+    if args.cmd == "import-legacy":
+        print(f"[store] Imported {store.import_legacy(args.path)} rows into {args.dir}")
+    elif args.cmd == "prune":
+        store.retention_days = args.days
+        store.apply_retention()
+    else:
+        for part in store.stats():
+            print(json.dumps(part))
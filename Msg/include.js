@@ -1,17 +1,24 @@
 <script>
-  fetch("http://127.0.0.1:8889/ipc", { 
-    method: "POST",
-    headers: {
-      "Content-Type": "text/plain"
-    }
-  })
-  .then(res => res.text())
-  .then(data => {
-    console.log("Received from service:", data);
-    // you can assign it to a JS variable
-    var ipcValue = data;
-  })
-  .catch(err => console.error("IPC send error:", err));
+  // --- Receive every message from service (long-poll) ---
+  var ipcValue = "";
+  var ipcSeq = 0;
+  function listenToService() {
+    fetch("http://127.0.0.1:8889/ipc?after=" + ipcSeq + "&wait=25")
+    .then(res => res.json())
+    .then(data => {
+      data.messages.forEach(m => {
+        console.log("Received from service:", m.message);
+        ipcValue = m.message;
+      });
+      ipcSeq = data.seq;
+      listenToService();
+    })
+    .catch(err => {
+      console.error("IPC read error:", err);
+      setTimeout(listenToService, 2000);
+    });
+  }
+  listenToService();
 </script>
 <script>
   // --- Send new message to service ---
@@ -1,93 +1,229 @@
-#als 
+#als
+import sys
+import json
+import time
+import signal
 import socket
+import argparse
 import threading
-from http.server import BaseHTTPRequestHandler, HTTPServer
-import win32serviceutil
-import win32service
-import win32event
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+try:
+    import win32serviceutil
+    import win32service
+    import win32event
+except ImportError:  # Linux: run with `python message_part.py daemon`
+    win32serviceutil = None
 
 HOST = "127.0.0.1"
 PORT_SOCKET = 8888  # TCP socket listener
 PORT_HTTP = 8889    # HTTP endpoint for JS
 
-latest_message = ""
+RING_SIZE = 1000          # messages kept for /ipc?after=
+MAX_WAIT = 30             # seconds a long-poll may block
+MAX_LINE = 64 * 1024      # longest socket message accepted
+SOCKET_IDLE_TIMEOUT = 300 # seconds before an idle socket client is dropped
+
+
+# --- Message ring: sequenced, bounded history of messages ---
+class MessageRing:
+    """Keeps the last `size` messages with increasing sequence numbers."""
+
+    def __init__(self, size=RING_SIZE):
+        self.messages = deque(maxlen=size)  # (seq, message)
+        self.seq = 0
+        self.cond = threading.Condition()
+
+    def publish(self, message):
+        with self.cond:
+            self.seq += 1
+            self.messages.append((self.seq, message))
+            self.cond.notify_all()
+            return self.seq
+
+    def latest(self):
+        with self.cond:
+            return self.messages[-1][1] if self.messages else ""
+
+    def after(self, seq, wait=0):
+        """Return (messages newer than seq, current seq, reset), blocking up to `wait` seconds.
+
+        `reset` is true when messages after `seq` already fell out of the ring
+        (or `seq` is from before a restart); the caller gets what is left.
+        """
+        deadline = time.monotonic() + wait
+        with self.cond:
+            while self.seq == seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            reset = seq > self.seq or (bool(self.messages) and self.messages[0][0] > seq + 1)
+            if seq > self.seq:
+                seq = 0
+            newer = [m for m in self.messages if m[0] > seq]
+            return newer, self.seq, reset
+
+
+ring = MessageRing()
 
 
 # --- Socket listener: receives messages from external apps ---
+def handle_socket_client(conn, addr):
+    """One persistent connection; every newline-terminated line is a message.
+
+    A sender that writes a single message without a newline and closes
+    (the old protocol) still works: the remainder is published at EOF.
+    """
+    conn.settimeout(SOCKET_IDLE_TIMEOUT)
+    try:
+        with conn, conn.makefile("rb") as f:
+            while True:
+                line = f.readline(MAX_LINE + 1)
+                if not line:
+                    break
+                if len(line) > MAX_LINE and not line.endswith(b"\n"):
+                    print(f"[SOCKET] {addr}: message over {MAX_LINE} bytes, closing")
+                    break
+                message = line.rstrip(b"\r\n").decode("utf-8", errors="replace")
+                if message:
+                    seq = ring.publish(message)
+                    print(f"[SOCKET] Received #{seq}: {message}")
+    except socket.timeout:
+        pass
+    except Exception as e:
+        print(f"[SOCKET ERROR] {addr}: {e}")
+
+
 def socket_listener():
-    global latest_message
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     server.bind((HOST, PORT_SOCKET))
-    server.listen(5)
+    server.listen(128)
     print(f"[SOCKET] Listening on {HOST}:{PORT_SOCKET}")
     while True:
         try:
             conn, addr = server.accept()
-            data = conn.recv(1024)
-            if data:
-                latest_message = data.decode("utf-8")
-                print(f"[SOCKET] Received: {latest_message}")
-            conn.close()
+            threading.Thread(target=handle_socket_client, args=(conn, addr), daemon=True).start()
         except Exception as e:
             print(f"[SOCKET ERROR] {e}")
 
 
 # --- HTTP handler: JS can read/write messages ---
 class IPCHandler(BaseHTTPRequestHandler):
+    """GET /ipc returns the latest message as text.
+
+    GET /ipc?after=<seq>&wait=<s> returns JSON
+      {"seq": <latest seq>, "reset": bool, "messages": [{"seq", "message"}, ...]}
+    with every message after <seq>, blocking up to <s> seconds (max MAX_WAIT)
+    until there is one. Pass the returned seq as the next `after`.
+    """
+
     def do_GET(self):
-        if self.path == "/ipc":
-            self.send_response(200)
-            self.send_header("Content-type", "text/plain")
-            self.end_headers()
-            self.wfile.write(latest_message.encode("utf-8"))
-        else:
+        url = urlsplit(self.path)
+        if url.path != "/ipc":
             self.send_response(404)
             self.end_headers()
+            return
+        query = parse_qs(url.query)
+        if "after" not in query:
+            self.send_body(ring.latest().encode("utf-8"), "text/plain")
+            return
+        try:
+            after = int(query["after"][0])
+            wait = min(max(float(query.get("wait", ["0"])[0]), 0), MAX_WAIT)
+        except ValueError:
+            self.send_response(400)
+            self.end_headers()
+            return
+        messages, seq, reset = ring.after(after, wait)
+        body = json.dumps({"seq": seq, "reset": reset,
+                           "messages": [{"seq": s, "message": m} for s, m in messages]})
+        self.send_body(body.encode("utf-8"), "application/json")
 
     def do_POST(self):
-        global latest_message
         if self.path == "/ipc":
             content_length = int(self.headers.get('Content-Length', 0))
             post_data = self.rfile.read(content_length).decode('utf-8')
-            latest_message = post_data
-            print(f"[HTTP POST] Updated latest_message: {latest_message}")
+            seq = ring.publish(post_data)
+            print(f"[HTTP POST] Message #{seq}: {post_data}")
             self.send_response(200)
+            self.send_header("X-IPC-Seq", str(seq))
             self.end_headers()
-            self.wfile.write(f"Received: {latest_message}".encode('utf-8'))
+            self.wfile.write(f"Received: {post_data}".encode('utf-8'))
         else:
             self.send_response(404)
             self.end_headers()
 
+    def send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-type", content_type)
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
     def log_message(self, format, *args):
         return  # disable default logging
 
 
 # --- HTTP server thread ---
 def http_server():
-    server = HTTPServer((HOST, PORT_HTTP), IPCHandler)
+    # Threaded: each long-poll holds its own thread while it waits
+    server = ThreadingHTTPServer((HOST, PORT_HTTP), IPCHandler)
+    server.daemon_threads = True
     print(f"[HTTP] Listening on http://{HOST}:{PORT_HTTP}/ipc")
     server.serve_forever()
 
 
+def start_bridge():
+    threading.Thread(target=socket_listener, daemon=True).start()
+    threading.Thread(target=http_server, daemon=True).start()
+
+
+# --- Linux daemon: runs in the foreground until SIGTERM/SIGINT (e.g. under systemd) ---
+def run_daemon():
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    start_bridge()
+    stop.wait()
+    print("[IPC] Stopped")
+
+
 # --- Windows Service definition ---
-class IPCService(win32serviceutil.ServiceFramework):
-    _svc_name_ = "IPCBridgeService"
-    _svc_display_name_ = "IPC Bridge Service (Two-Way IPC)"
+if win32serviceutil is not None:
+    class IPCService(win32serviceutil.ServiceFramework):
+        _svc_name_ = "IPCBridgeService"
+        _svc_display_name_ = "IPC Bridge Service (Two-Way IPC)"
 
-    def __init__(self, args):
-        super().__init__(args)
-        self.hWaitStop = win32event.CreateEvent(None, 0, 0, None)
+        def __init__(self, args):
+            super().__init__(args)
+            self.hWaitStop = win32event.CreateEvent(None, 0, 0, None)
 
-    def SvcStop(self):
-        self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
-        win32event.SetEvent(self.hWaitStop)
+        def SvcStop(self):
+            self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
+            win32event.SetEvent(self.hWaitStop)
 
-    def SvcDoRun(self):
-        threading.Thread(target=socket_listener, daemon=True).start()
-        threading.Thread(target=http_server, daemon=True).start()
-        win32event.WaitForSingleObject(self.hWaitStop, win32event.INFINITE)
+        def SvcDoRun(self):
+            start_bridge()
+            win32event.WaitForSingleObject(self.hWaitStop, win32event.INFINITE)
 
 
 if __name__ == "__main__":
-    win32serviceutil.HandleCommandLine(IPCService)
+    # Windows: python message_part.py install|start|stop|remove (service)
+    # Linux:   python message_part.py daemon [--host 127.0.0.1 --socket-port 8888 --http-port 8889]
+    if win32serviceutil is None or sys.argv[1:2] == ["daemon"]:
+        parser = argparse.ArgumentParser(description="IPC bridge daemon")
+        parser.add_argument("cmd", nargs="?", choices=["daemon"], default="daemon")
+        parser.add_argument("--host", default=HOST)
+        parser.add_argument("--socket-port", type=int, default=PORT_SOCKET)
+        parser.add_argument("--http-port", type=int, default=PORT_HTTP)
+        parser.add_argument("--ring-size", type=int, default=RING_SIZE)
+        args = parser.parse_args()
+        HOST, PORT_SOCKET, PORT_HTTP = args.host, args.socket_port, args.http_port
+        ring = MessageRing(args.ring_size)
+        run_daemon()
+    else:
+        win32serviceutil.HandleCommandLine(IPCService)
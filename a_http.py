@@ -0,0 +1,324 @@
+# a_http.py
+# Cached /itemlines serving for A.
+#
+# ItemLines is a list that counts its own mutations, so the rendered
+# "<custom>...</custom>" body (and its gzip form and ETag) is rebuilt only
+# after itemlines actually changes. The handler runs on a ThreadingHTTPServer
+# with HTTP/1.1 keep-alive, answers If-None-Match with 304 and gzips for
+# clients that accept it.
+#
+# Delta feed: every mutation bumps a sequence number and records which item
+# codes it touched. GET /itemlines?since=<cursor> returns only the lines
+# added or changed since that cursor as <custom> tags, removed codes as
+# <removed> tags, and the new <cursor>. A cursor from another A instance
+# (e.g. before a restart) gets the full list with <reset>1</reset>.
+# ItemLines.delta() gives the same answer as Python lists, and subscribe()
+# callbacks run on every change, for in-process readers (embedded.py).
+import gzip
+import time
+import uuid
+import hashlib
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+try:
+    import metrics
+    M_REQUESTS = metrics.counter("a_itemlines_requests_total", "GET /itemlines answers by kind", ["kind"])
+    M_SERVE = metrics.histogram("a_itemlines_seconds", "Time to answer GET /itemlines", ["kind"])
+except ImportError:  # a_http.py copied next to a monitor without metrics.py
+    metrics = None
+
+GZIP_MIN_BYTES = 1024   # smaller bodies are sent uncompressed
+GZIP_LEVEL = 6
+
+def code_of(line):
+    return line.split(" ", 1)[0]
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+def etag_matches(if_none_match, etag):
+    """True when an If-None-Match header value lists `etag` or is "*".
+
+    Entity tags are compared weakly (a W/ prefix is ignored) and exactly,
+    so one tag being a substring of another doesn't match.
+    """
+    if not if_none_match:
+        return False
+    etag = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+class ItemLines(list):
+    """A list of item lines that knows when, and which codes, changed."""
+
+    def __init__(self, lines=()):
+        super().__init__(lines)
+        self.lock = threading.RLock()
+        self.version = 0
+        self.instance = uuid.uuid4().hex[:12]
+        self._rendered = None  # (version, body, gzip body or None, etag)
+        self._current = {}     # code -> latest line
+        self._count = {}       # code -> lines in the list with that code
+        self._changes = {}     # code -> version of its last change, oldest first
+        self._listeners = []
+        for ln in self:
+            self._track_added(ln)
+
+    def subscribe(self, callback):
+        """Call callback(self) after every change; it runs under the lock, keep it short."""
+        self._listeners.append(callback)
+
+    # --- change tracking ---
+    def _touch(self, code):
+        self._changes.pop(code, None)
+        self._changes[code] = self.version
+
+    def _track_added(self, line):
+        code = code_of(line)
+        self._count[code] = self._count.get(code, 0) + 1
+        self._current[code] = line
+        self._touch(code)
+
+    def _track_removed(self, line):
+        code = code_of(line)
+        left = self._count.get(code, 0) - 1
+        if left > 0:
+            self._count[code] = left
+        else:
+            self._count.pop(code, None)
+            self._current.pop(code, None)
+        self._touch(code)
+
+    def _changed(self, added=(), removed=()):
+        self.version += 1
+        for ln in removed:
+            self._track_removed(ln)
+        for ln in added:
+            self._track_added(ln)
+        for callback in self._listeners:
+            callback(self)
+
+    # --- list mutators ---
+    def append(self, line):
+        with self.lock:
+            super().append(line)
+            self._changed(added=[line])
+
+    def extend(self, lines):
+        lines = list(lines)
+        with self.lock:
+            super().extend(lines)
+            self._changed(added=lines)
+
+    def __iadd__(self, lines):
+        self.extend(lines)
+        return self
+
+    def upsert(self, lines, max_lines=None):
+        """Replace the line of each code in `lines` in place, append new codes,
+        then drop the oldest lines beyond `max_lines`."""
+        latest = {}
+        for ln in lines:
+            latest[code_of(ln)] = ln  # last line of a code in the batch wins
+        with self.lock:
+            added, removed, fresh = [], [], []
+            for code, ln in latest.items():
+                old = self._current.get(code)
+                if old is None:
+                    fresh.append(ln)
+                elif old != ln:
+                    added.append(ln)
+                    removed.append(old)
+            if max_lines is not None:
+                fresh = fresh[-max_lines:]
+            if removed:
+                where = {old: i for i, old in enumerate(self)}
+                for old, ln in zip(removed, added):
+                    super().__setitem__(where[old], ln)
+            super().extend(fresh)
+            if added or fresh:
+                self._changed(added=added + fresh, removed=removed)
+            excess = len(self) - max_lines if max_lines is not None else 0
+            if excess > 0:
+                trimmed = self[:excess]
+                super().__delitem__(slice(0, excess))
+                self._changed(removed=trimmed)
+
+    def insert(self, index, line):
+        with self.lock:
+            super().insert(index, line)
+            self._changed(added=[line])
+
+    def remove(self, line):
+        with self.lock:
+            super().remove(line)
+            self._changed(removed=[line])
+
+    def pop(self, index=-1):
+        with self.lock:
+            line = super().pop(index)
+            self._changed(removed=[line])
+            return line
+
+    def clear(self):
+        with self.lock:
+            removed = list(self)
+            super().clear()
+            self._changed(removed=removed)
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            old = _as_list(self[key])
+            value = list(value) if isinstance(key, slice) else value
+            super().__setitem__(key, value)
+            self._changed(added=_as_list(value), removed=old)
+
+    def __delitem__(self, key):
+        with self.lock:
+            old = _as_list(self[key])
+            super().__delitem__(key)
+            self._changed(removed=old)
+
+    def __imul__(self, n):
+        with self.lock:
+            before = list(self)
+            super().__imul__(n)
+            self._changed(added=list(self), removed=before)
+        return self
+
+    def sort(self, *args, **kwargs):
+        with self.lock:
+            super().sort(*args, **kwargs)
+            self.version += 1  # order only; no code changed
+
+    def reverse(self):
+        with self.lock:
+            super().reverse()
+            self.version += 1
+
+    # --- rendering ---
+    def cursor(self):
+        return f"{self.instance}:{self.version}"
+
+    def render(self, tag="custom"):
+        """Return (body, gzip_body, etag) for the current contents, cached per version."""
+        with self.lock:
+            cached = self._rendered
+            if cached is not None and cached[0] == self.version:
+                return cached[1:]
+            version = self.version
+            body = "".join(f"<{tag}>{ln}</{tag}>\n" for ln in self).encode()
+        etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        gz = gzip.compress(body, GZIP_LEVEL) if len(body) >= GZIP_MIN_BYTES else None
+        with self.lock:
+            if self.version == version:
+                self._rendered = (version, body, gz, etag)
+        return body, gz, etag
+
+    def delta(self, since):
+        """(lines, removed codes, new cursor, reset) for changes after cursor `since`.
+
+        Walks the change log from the newest end, so the cost is
+        proportional to the number of changed codes. An unknown cursor
+        gives every line with reset True.
+        """
+        with self.lock:
+            instance, _, seq = (since or "").partition(":")
+            if instance != self.instance or not seq.isdigit() or int(seq) > self.version:
+                return list(self), [], self.cursor(), True
+            seq = int(seq)
+            lines, removed = [], []
+            for code in reversed(self._changes):
+                if self._changes[code] <= seq:
+                    break
+                line = self._current.get(code)
+                if line is None:
+                    removed.append(code)
+                else:
+                    lines.append(line)
+            return lines, removed, self.cursor(), False
+
+    def render_delta(self, since, tag="custom"):
+        """Body with lines changed after cursor `since`, removed codes and the new cursor."""
+        with self.lock:
+            lines, removed, cursor, reset = self.delta(since)
+            if reset:
+                body, _, _ = self.render(tag)
+                return body + f"<reset>1</reset>\n<cursor>{cursor}</cursor>\n".encode()
+        out = [f"<{tag}>{ln}</{tag}>\n" for ln in lines]
+        out += [f"<removed>{code}</removed>\n" for code in removed]
+        out.append(f"<cursor>{cursor}</cursor>\n")
+        return "".join(out).encode()
+
+class ItemLinesHandler(BaseHTTPRequestHandler):
+    """Serves `items` (an ItemLines) at `path`; subclass and set both."""
+
+    protocol_version = "HTTP/1.1"
+    items = ItemLines()
+    path_itemlines = "/itemlines"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path != self.path_itemlines:
+            self.send_error_body(404, b"Not Found")
+            return
+        started = time.perf_counter()
+        query = parse_qs(url.query, keep_blank_values=True)
+        if "since" in query:
+            self.send_body(self.items.render_delta(query["since"][0]))
+            self.observe("delta", started)
+            return
+        body, gz, etag = self.items.render()
+        if etag_matches(self.headers.get("If-None-Match"), etag):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            self.observe("not_modified", started)
+            return
+        self.send_body(body, gz, etag)
+        self.observe("full", started)
+
+    def observe(self, kind, started):
+        if metrics is not None:
+            M_REQUESTS.labels(kind).inc()
+            M_SERVE.labels(kind).observe(time.perf_counter() - started)
+
+    def send_body(self, body, gz=None, etag=None):
+        accepts_gzip = "gzip" in (self.headers.get("Accept-Encoding") or "")
+        if gz is None and accepts_gzip and len(body) >= GZIP_MIN_BYTES:
+            gz = gzip.compress(body, GZIP_LEVEL)
+        self.send_response(200)
+        self.send_header("Content-type", "text/plain; charset=utf-8")
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Vary", "Accept-Encoding")
+        if gz is not None and accepts_gzip:
+            body = gz
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_body(self, code, body):
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def make_handler(items, path="/itemlines"):
+    """Handler class serving `items` at `path`."""
+    return type("Handler", (ItemLinesHandler,), {"items": items, "path_itemlines": path})
+
+def make_server(items, host="0.0.0.0", port=8000, path="/itemlines"):
+    server = ThreadingHTTPServer((host, port), make_handler(items, path))
+    server.daemon_threads = True
+    return server
@@ -3,7 +3,8 @@ import socket
 import json
 import time
 import random
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import metrics
+from a_http import ItemLines, make_handler, make_server
 
 # --- CONFIG ---
 C_HOST = "127.0.0.1"  # C server IP
@@ -11,40 +12,59 @@ C_PORT = 5000
 
 B_TRIGGER_HOST = "127.0.0.1"  # B listener IP
 B_TRIGGER_PORT = 5051
+TRIGGER_SEQ = True  # send itemlines' cursor so B can skip triggers a pull already covered
 
 HTTP_PORT = 8000
+METRICS_PORT = 9201  # /metrics and /traces; 0 disables
 EVOLUTION_INTERVAL = 10  # seconds
 
 # --- DATA ---
-itemlines = [
+itemlines = ItemLines([
     "101 18V Cordless Drill 2 89.99",
     "102 6-inch Wood Clamp 4 12.50",
     "103 Carpenter's Hammer 1 19.99"
-]
+])
 
-class Handler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        if self.path == "/itemlines":
-            self.send_response(200)
-            self.send_header("Content-type", "text/plain")
-            self.end_headers()
-            for ln in itemlines:
-                self.wfile.write(f"<custom>{ln}</custom>\n".encode())
+# Threaded, cached /itemlines handler (see a_http.py)
+Handler = make_handler(itemlines)
 
-def send_to_c():
+# --- METRICS ---
+M_TRIGGERS = metrics.counter("a_triggers_total", "Triggers sent to B", ["status"])
+M_TRIGGER = metrics.histogram("a_trigger_seconds", "Connect and send of one trigger to B")
+M_SEND = metrics.histogram("a_send_to_c_seconds", "Send to C and wait for its reply")
+
+def send_to_c(trace=None):
     """Send itemlines to C"""
-    payload = {"source": "A", "itemlines": itemlines}
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+    trace = trace or metrics.new_trace()
+    started = time.time()
+    payload = {"source": "A", "itemlines": itemlines, "trace": trace}
+    with M_SEND.time(), socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.connect((C_HOST, C_PORT))
         s.sendall(json.dumps(payload).encode())
         resp = s.recv(1024)
         print("[A] C responded:", resp.decode())
+    metrics.record_span(trace, "a.send_to_c", started)
 
-def trigger_b():
-    """Tell B it can start"""
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.connect((B_TRIGGER_HOST, B_TRIGGER_PORT))
-        s.sendall(b"SUCCESS")
+def trigger_b(trace=None):
+    """Tell B it can start; the trace id rides along so C can time A->C.
+
+    Returns the trace. B also accepts a bare b"SUCCESS" from older A's.
+    """
+    trace = trace or metrics.new_trace()
+    started = time.time()
+    message = f"SUCCESS {metrics.trace_to_text(trace)}"
+    if TRIGGER_SEQ:
+        message += f" seq={itemlines.cursor()}"
+    try:
+        with M_TRIGGER.time(), socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.connect((B_TRIGGER_HOST, B_TRIGGER_PORT))
+            s.sendall(message.encode())
+    except OSError:
+        M_TRIGGERS.labels("error").inc()
+        raise
+    M_TRIGGERS.labels("sent").inc()
+    metrics.record_span(trace, "a.trigger_b", started)
+    return trace
 
 def listen_for_checkout():
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -60,6 +80,7 @@ def listen_for_checkout():
 if __name__ == "__main__":
     #listen_for_checkout()
     print("[A] Static mode, serving HTTP only")
-    server = HTTPServer(("0.0.0.0", HTTP_PORT), Handler)
+    metrics.start_metrics_server(METRICS_PORT)
+    server = make_server(itemlines, "0.0.0.0", HTTP_PORT)
     print(f"[A] HTTP server running on port {HTTP_PORT}...")
     server.serve_forever()
@@ -1,14 +1,86 @@
 
 # b_collector_monitor.py
+import os
 import socket
 import json
+import re
+import time
+import random
+import asyncio
+import argparse
+import queue
+import threading
+import contextlib
+import concurrent.futures
 import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+import wire
+from framing import FrameError, encode_frame, send_frame, recv_frame
 
 C_HOST = "127.0.0.1"  # C server IP
 C_PORT = 5000
 
 LISTEN_HOST = "0.0.0.0"
 LISTEN_PORT = 5051  # Matches A's trigger port
+TRIGGER_WINDOW = 0.5  # seconds; triggers for one A within this window share a pull
+TRIGGER_RETRY_DELAY = 5  # seconds before a failed pull's triggers are pulled again
+
+A_URL = "http://127.0.0.1:8000/itemlines"
+CHUNK_SIZE = 64 * 1024  # bytes per iter_content chunk
+HTTP_POOL_SIZE = 4      # keep-alive connections kept per A host
+HTTP_POOL_HOSTS = 64    # A hosts with a cached connection pool
+HTTP_TIMEOUT = 30       # seconds
+
+# Sending to C over one persistent framed connection (C's default --mode async).
+# Set C_FRAMED = False for a C running the legacy thread-per-connection server.
+C_FRAMED = True
+# "binary": send transaction batches in wire.py's format when C offers it
+# on connect (older C's get JSON). Fewer bytes and less decode work for C,
+# but encoding costs B a few microseconds per line, so it pays off when
+# C or the B->C link is the bottleneck rather than a shared host's CPU.
+C_WIRE_FORMAT = "json"
+BATCH_MAX_ITEMS = 50000     # flush once this many transactions are pending
+BATCH_LINGER = 0.05         # seconds to wait for more items before flushing
+SEND_QUEUE_SIZE = 64        # pending submissions before send_to_c blocks
+BACKPRESSURE_TIMEOUT = 30   # seconds send_to_c waits on a full queue before dropping
+RECONNECT_MAX_DELAY = 10    # seconds between reconnect attempts, at most
+STATS_INTERVAL = 60         # seconds between stats lines
+METRICS_PORT = 9202         # /metrics and /traces; 0 disables
+
+# Fan-out collector (--endpoints): pull many A front-ends concurrently; C keeps
+# each endpoint's B history apart (history_B-<endpoint>) and reconciles their union
+A_ENDPOINTS = [A_URL]
+COLLECT_CONCURRENCY = 16    # endpoints pulled at the same time
+COLLECT_TIMEOUT = 30        # seconds per endpoint attempt (HTTP connect/read and body)
+COLLECT_RETRIES = 3         # attempts per endpoint per cycle
+COLLECT_BACKOFF = 0.5       # seconds, doubled per retry (with jitter)
+COLLECT_INTERVAL = 60       # seconds between cycles
+
+# --- METRICS ---
+M_TRIGGERS = metrics.counter("b_triggers_total", "Trigger connections received", ["status"])
+M_PULLS = metrics.counter("b_pulls_total", "Pulls from A", ["result"])
+M_PULL = metrics.histogram("b_pull_seconds", "handle_transaction_pull: fetch from A and hand to send_to_c")
+M_PULLS_INFLIGHT = metrics.gauge("b_pulls_inflight", "Pulls from A in progress")
+M_FETCH = metrics.histogram("b_fetch_seconds", "GET /itemlines including parsing", ["mode"])
+M_SEND = metrics.histogram("b_send_to_c_seconds", "One send to C until its reply", ["mode"])
+M_BATCH = metrics.histogram("b_batch_items", "Transactions per batch sent to C",
+                            scale=1, bounds=metrics.SIZE_BOUNDS)
+M_ITEMS = metrics.counter("b_items_total", "Transactions handed to C", ["status"])
+M_QUEUE = metrics.gauge("b_send_queue_depth", "Submissions waiting for the C sender")
+M_WIRE_BYTES = metrics.counter("b_wire_bytes_total", "Frame bytes sent to C", ["format"])
+M_TRIGGER_OUTCOMES = metrics.counter("b_trigger_outcomes_total",
+                                     "SUCCESS triggers by scheduler outcome", ["outcome"])
+M_TRIGGER_PULLS = metrics.counter("b_trigger_pulls_total", "Pulls run by the trigger scheduler")
+M_TRIGGER_RETRIES = metrics.counter("b_trigger_pull_failures_total",
+                                    "Trigger pulls that failed and were queued again")
+M_TRIGGER_WAIT = metrics.histogram("b_trigger_wait_seconds", "First coalesced trigger until its pull starts")
+
+# Pooled keep-alive session to A
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE))
+session.mount("https://", HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE))
 
 def extract_strings_recursive(test_str, tag):
     start_idx = test_str.find("<" + tag + ">")
@@ -19,8 +91,211 @@ def extract_strings_recursive(test_str, tag):
     res += extract_strings_recursive(test_str[end_idx+len(tag)+3:], tag)
     return res
 
+def extract_strings_stream(chunks, tags="custom", with_tags=False):
+    """Yield the contents of <tag>...</tag> elements from an iterable of text chunks.
+
+    Single linear pass: tags may be split across chunk boundaries and only
+    the unfinished tail of the input is kept between chunks. `tags` is a tag
+    name or a list of them; with_tags=True yields (tag, value) pairs.
+    """
+    if isinstance(tags, str):
+        tags = [tags]
+    opener = re.compile("<(" + "|".join(re.escape(t) for t in tags) + ")>")
+    closers = {t: "</" + t + ">" for t in tags}
+    keep = max(len(t) for t in tags) + 1  # longest possible partial "<tag"
+
+    buf = ""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buf += chunk
+        pos = 0
+        while True:
+            m = opener.search(buf, pos)
+            if m is None:
+                # Nothing open: keep only what could be the start of a tag
+                pos = max(pos, len(buf) - keep)
+                break
+            tag = m.group(1)
+            end = buf.find(closers[tag], m.end())
+            if end == -1:
+                pos = m.start()  # element continues in the next chunk
+                break
+            value = buf[m.end():end]
+            yield (tag, value) if with_tags else value
+            pos = end + len(closers[tag])
+        buf = buf[pos:]
+
+def extract_strings(text, tag="custom"):
+    """Linear-time replacement for extract_strings_recursive."""
+    return list(extract_strings_stream([text], tag))
+
+def parse_trigger(text):
+    """(trace, seq, url) from what follows "SUCCESS" in a trigger.
+
+    "<trace id> <trace start>" is the trace; "seq=<n>" or "seq=<instance>:<n>"
+    orders triggers from one A and "url=<A /itemlines URL>" names the A to
+    pull (default A_URL). Every part is optional.
+    """
+    plain, options = [], {}
+    for token in text.split():
+        key, eq, value = token.partition("=")
+        if eq:
+            options[key] = value
+        else:
+            plain.append(token)
+    seq = None
+    instance, _, n = options.get("seq", "").rpartition(":")
+    if n.isdigit():
+        seq = (instance, int(n))
+    return metrics.trace_from_text(" ".join(plain)), seq, options.get("url") or A_URL
+
+class _Slot:
+    """Trigger state of one A: a running pull and at most one queued behind it."""
+
+    def __init__(self):
+        self.running = False
+        self.pending = False
+        self.due = 0.0          # monotonic time the queued pull may start
+        self.first = 0.0        # time.time() of the queued pull's first trigger
+        self.trace = None       # trace of that first trigger
+        self.count = 0          # triggers folded into the queued pull
+        self.seq = None         # highest (instance, n) seen for the queued pull
+        self.covered = None     # highest (instance, n) a pull has delivered to C
+
+def _newer(seq, than):
+    """True when trigger sequence `seq` is past `than` (or from another A instance)."""
+    return than is None or seq[0] != than[0] or seq[1] > than[1]
+
+class TriggerScheduler:
+    """Coalesces SUCCESS triggers into pulls, per A.
+
+    The first trigger for an idle A queues a pull that starts `window`
+    seconds later; triggers arriving meanwhile, or while a pull for that A
+    is running, join the one queued pull. Triggers carrying a sequence
+    number no newer than what a pull already delivered to C are skipped.
+
+    `pull(url, trace, on_sent, on_failed)` calls on_sent once C has the
+    pulled data (or there was nothing new) and on_failed if the pull or the
+    send failed; either may run later on another thread. Only on_sent marks
+    the pull's triggers covered; on_failed queues them again for a pull
+    `retry_delay` seconds later.
+    """
+
+    def __init__(self, pull=None, window=None, retry_delay=None):
+        self.pull = pull or (lambda url, trace, on_sent, on_failed:
+                             handle_transaction_pull(trace, url, on_sent, on_failed))
+        self.window = TRIGGER_WINDOW if window is None else window
+        self.retry_delay = TRIGGER_RETRY_DELAY if retry_delay is None else retry_delay
+        self.received = self.coalesced = self.stale = self.executed = self.failed = 0
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def trigger(self, url=None, trace=None, seq=None):
+        """Register one trigger; returns "queued", "coalesced" or "stale"."""
+        url = url or A_URL
+        with self._lock:
+            self.received += 1
+            slot = self._slots.setdefault(url, _Slot())
+            if seq is not None and not _newer(seq, slot.covered):
+                self.stale += 1
+                outcome = "stale"
+            elif slot.pending:
+                self.coalesced += 1
+                slot.count += 1
+                if seq is not None and _newer(seq, slot.seq):
+                    slot.seq = seq
+                outcome = "coalesced"
+            else:
+                slot.pending = True
+                slot.due = time.monotonic() + self.window
+                slot.first = time.time()
+                slot.trace, slot.count, slot.seq = trace, 1, seq
+                if not slot.running:
+                    self._schedule(url, self.window)
+                outcome = "queued"
+        M_TRIGGER_OUTCOMES.labels(outcome).inc()
+        return outcome
+
+    def _schedule(self, url, delay):
+        timer = threading.Timer(max(0.0, delay), self._run, (url,))
+        timer.daemon = True
+        timer.start()
+
+    def _run(self, url):
+        with self._lock:
+            slot = self._slots[url]
+            if slot.running or not slot.pending:
+                return
+            slot.running, slot.pending = True, False
+            trace, first, count, seq = slot.trace, slot.first, slot.count, slot.seq
+            self.executed += 1
+        M_TRIGGER_PULLS.inc()
+        M_TRIGGER_WAIT.observe(time.time() - first)
+        metrics.record_span(trace, "b.trigger_wait", first, triggers=count)
+        try:
+            self.pull(url, trace, lambda: self._sent(url, seq),
+                      lambda: self._failed(url, trace, first, count, seq))
+        except Exception as e:
+            print(f"[B] Trigger pull from {url} failed: {e}")
+            self._failed(url, trace, first, count, seq)
+        finally:
+            with self._lock:
+                slot.running = False
+                if slot.pending:
+                    self._schedule(url, slot.due - time.monotonic())
+
+    def _sent(self, url, seq):
+        """C has the data of a pull covering triggers up to `seq`."""
+        if seq is None:
+            return
+        with self._lock:
+            slot = self._slots[url]
+            if _newer(seq, slot.covered):
+                slot.covered = seq
+
+    def _failed(self, url, trace, first, count, seq):
+        """Queue a failed pull's triggers again, unless a later pull already delivered them."""
+        with self._lock:
+            self.failed += 1
+            slot = self._slots[url]
+            if seq is not None and not _newer(seq, slot.covered):
+                return
+            if slot.pending:
+                slot.count += count
+                if seq is not None and _newer(seq, slot.seq):
+                    slot.seq = seq
+                if first < slot.first:
+                    slot.first, slot.trace = first, trace
+            else:
+                slot.pending = True
+                slot.due = time.monotonic() + self.retry_delay
+                slot.first, slot.trace, slot.count, slot.seq = first, trace, count, seq
+                if not slot.running:
+                    self._schedule(url, self.retry_delay)
+        M_TRIGGER_RETRIES.inc()
+
+    def stats(self):
+        with self._lock:
+            return {"triggers": self.received, "coalesced": self.coalesced,
+                    "stale": self.stale, "trigger_pulls": self.executed,
+                    "trigger_pulls_failed": self.failed,
+                    "pulls_running": sum(s.running for s in self._slots.values()),
+                    "pulls_queued": sum(s.pending for s in self._slots.values())}
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = TriggerScheduler()
+        return _scheduler
+
 def wait_for_success():
-    """Wait for trigger from A and return True when received."""
+    """Wait for triggers from A and hand them to the trigger scheduler."""
+    scheduler = get_scheduler()
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.bind((LISTEN_HOST, LISTEN_PORT))
         s.listen()
@@ -29,33 +304,515 @@ def wait_for_success():
             conn, addr = s.accept()
             with conn:
                 data = conn.recv(1024).decode().strip()
-                if data == "SUCCESS":
-                    print("[B] Received SUCCESS trigger from A")
-                    #handle_transaction_pull()
+                # "SUCCESS" or "SUCCESS <trace id> <trace start> [seq=<n>] [url=<A url>]"
+                word, _, rest = data.partition(" ")
+                if word == "SUCCESS":
+                    M_TRIGGERS.labels("success").inc()
+                    trace, seq, url = parse_trigger(rest)
+                    outcome = scheduler.trigger(url, trace, seq)
+                    print(f"[B] Received SUCCESS trigger from A ({outcome})")
                 else:
+                    M_TRIGGERS.labels("other").inc()
                     print(data)
 
-def handle_transaction_pull():
-    """Pull data from A and send to C."""
+# Last ETag seen per A URL, for conditional GETs
+_etags = {}
+
+def save_etag(url, etag):
+    """Remember A's ETag for `url`; called once C has accepted that content."""
+    _etags[url] = etag
+
+# Delta pulls (?since=<cursor>): cursors per A URL, saved once C has the data
+USE_DELTA = True
+CURSOR_FILE = "b_cursors.json"
+_cursors = None
+_cursor_lock = threading.Lock()
+
+def load_cursors(path=CURSOR_FILE):
+    global _cursors
+    with _cursor_lock:
+        if _cursors is None:
+            try:
+                with open(path) as f:
+                    _cursors = json.load(f)
+            except (OSError, ValueError):
+                _cursors = {}
+        return dict(_cursors)
+
+def save_cursor(url, cursor, path=CURSOR_FILE):
+    """Record `cursor` for `url` and persist all cursors atomically."""
+    load_cursors(path)
+    with _cursor_lock:
+        _cursors[url] = cursor
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(_cursors, f)
+        os.replace(tmp, path)
+
+@contextlib.contextmanager
+def _deadline(response, timeout):
+    """Close `response` if its body isn't read within `timeout` seconds.
+
+    requests' timeout= only bounds each socket read; this bounds the whole
+    body, so a trickling A can't hold a pull (and its thread) open.
+    """
+    expired = threading.Event()
+    def expire():
+        expired.set()
+        fp = getattr(getattr(response.raw, "_fp", None), "fp", None)  # http.client's socket file
+        sock = getattr(getattr(fp, "raw", None), "_sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)  # wakes a read blocked mid-chunk
+            except OSError:
+                pass
+        response.close()
+    timer = threading.Timer(timeout, expire)
+    timer.daemon = True
+    timer.start()
     try:
-        r = requests.get("http://127.0.0.1:8000/itemlines")
-        items = extract_strings_recursive(r.text, "custom")
-        print(f"[B] Parsed items: {items}")
-        send_to_c(items)
+        yield
     except Exception as e:
-        print(f"[B] Error fetching from A: {e}")
+        if expired.is_set():
+            raise TimeoutError(f"body not received within {timeout}s") from e
+        raise
+    finally:
+        timer.cancel()
+    if expired.is_set():  # closing cut the body short without an error
+        raise TimeoutError(f"body not received within {timeout}s")
+
+def fetch_items(url=A_URL, timeout=HTTP_TIMEOUT):
+    """Stream one A endpoint's /itemlines; returns (items, etag).
+
+    items is None when A answers 304 (unchanged since the last pull). The
+    caller stores etag in _etags once C has accepted the items.
+    """
+    headers = {"If-None-Match": _etags[url]} if url in _etags else {}
+    with M_FETCH.labels("full").time(), session.get(url, stream=True, timeout=timeout, headers=headers) as r, \
+            _deadline(r, timeout):
+        if r.status_code == 304:
+            return None, None
+        r.raise_for_status()
+        if r.encoding is None:
+            r.encoding = "utf-8"
+        items = list(extract_strings_stream(
+            r.iter_content(chunk_size=CHUNK_SIZE, decode_unicode=True), "custom"))
+        return items, r.headers.get("ETag")
+
+def fetch_delta(url=A_URL, timeout=HTTP_TIMEOUT):
+    """Pull only what changed on A since our cursor.
 
-def send_to_c(transactions):
-    """Send transaction list to C."""
+    Returns (items, removed_codes, new_cursor, reset); reset is True when A
+    didn't recognise the cursor and sent its full list instead.
+    """
+    since = load_cursors().get(url, "")
+    with M_FETCH.labels("delta").time(), session.get(url, params={"since": since}, stream=True, timeout=timeout) as r, \
+            _deadline(r, timeout):
+        r.raise_for_status()
+        if r.encoding is None:
+            r.encoding = "utf-8"
+        items, removed, cursor, reset = [], [], None, False
+        for tag, value in extract_strings_stream(
+                r.iter_content(chunk_size=CHUNK_SIZE, decode_unicode=True),
+                ["custom", "removed", "cursor", "reset"], with_tags=True):
+            if tag == "custom":
+                items.append(value)
+            elif tag == "removed":
+                removed.append(value)
+            elif tag == "cursor":
+                cursor = value
+            else:
+                reset = True
+    return items, removed, cursor, reset
+
+def _then(*callbacks):
+    """One callback running each of `callbacks` that is set, or None."""
+    callbacks = [cb for cb in callbacks if cb]
+    if not callbacks:
+        return None
+    def run():
+        for cb in callbacks:
+            cb()
+    return run
+
+def pull_and_send(url=A_URL, timeout=HTTP_TIMEOUT, endpoint=None, trace=None,
+                  on_sent=None, on_failed=None):
+    """One pull from A forwarded to C; returns the number of items sent, or None if unchanged.
+
+    `trace` is A's trace from the trigger; B starts one when there is none.
+    `on_sent` runs once C has the pulled data, or right away when there
+    is nothing to send; `on_failed` if C rejects it or it cannot be sent.
+    """
+    trace = trace or metrics.new_trace()
+    started = time.time()
+    if not USE_DELTA:
+        items, etag = fetch_items(url, timeout)
+        metrics.record_span(trace, "b.fetch", started, url=url)
+        if items is None:
+            if on_sent:
+                on_sent()
+            return None
+        # Until C accepts the items, the next pull must not get a 304 for them
+        _etags.pop(url, None)
+        save = (lambda: save_etag(url, etag)) if etag else None
+        send_to_c(items, endpoint, _then(save, on_sent), trace, on_failed=on_failed)
+        return len(items)
+
+    items, removed, cursor, reset = fetch_delta(url, timeout)
+    metrics.record_span(trace, "b.fetch", started, url=url)
+    if removed:
+        print(f"[B] {len(removed)} codes removed on {url}")
+    save = (lambda: save_cursor(url, cursor)) if cursor else None
+    done = _then(save, on_sent)
+    if items or removed:
+        send_to_c(items, endpoint, done, trace, removed, on_failed)
+    elif done:
+        done()
+    return len(items) if items or removed or reset else None
+
+def handle_transaction_pull(trace=None, url=None, on_sent=None, on_failed=None):
+    """Pull data from A (`url`, default A_URL) and send to C.
+
+    `on_sent`/`on_failed` report whether the data reached C (pull_and_send).
+    """
+    with M_PULL.time(), M_PULLS_INFLIGHT.track():
+        try:
+            sent = pull_and_send(url or A_URL, trace=trace, on_sent=on_sent, on_failed=on_failed)
+            if sent is None:
+                M_PULLS.labels("unchanged").inc()
+                print("[B] A unchanged since last pull")
+            else:
+                M_PULLS.labels("changed").inc()
+                print(f"[B] Parsed {sent} items")
+        except Exception as e:
+            M_PULLS.labels("error").inc()
+            print(f"[B] Error fetching from A: {e}")
+            if on_failed:
+                on_failed()
+
+def http_stats():
+    """Requests vs. new connections on the pooled session to A."""
+    requests_made = connections = 0
+    for prefix in ("http://", "https://"):
+        pools = session.get_adapter(prefix).poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                requests_made += pool.num_requests
+                connections += pool.num_connections
+    return {"http_requests": requests_made, "http_connections": connections}
+
+class CChannel:
+    """Persistent framed connection to C that reconnects with backoff."""
+
+    def __init__(self, host=None, port=None, wire_format=None):
+        self.host = host or C_HOST
+        self.port = port or C_PORT
+        self.wire_format = wire_format or C_WIRE_FORMAT
+        self.sock = None
+        self.binary = False
+        self.connects = 0
+        self.frames = 0
+
+    def _connect(self):
+        delay = 0.1
+        while True:
+            try:
+                self.sock = socket.create_connection((self.host, self.port))
+                self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.connects += 1
+                self.binary = self.wire_format == "binary" and self._negotiate()
+                return
+            except (OSError, FrameError, ValueError) as e:
+                self.close()
+                print(f"[B] Cannot reach C ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def _negotiate(self):
+        """Ask C which formats it takes; a C without the query answers FAIL."""
+        send_frame(self.sock, {"query": "formats"})
+        reply = recv_frame(self.sock)
+        if reply is None:
+            raise ConnectionError("C closed the connection")
+        return reply.get("status") == "SUCCESS" and wire.FORMAT in (reply.get("result") or [])
+
+    def send(self, payload):
+        """Send one frame and return C's reply, reconnecting once if the link dropped."""
+        for attempt in (1, 2):
+            if self.sock is None:
+                self._connect()
+            try:
+                frame = encode_frame(payload, self.binary)
+                self.sock.sendall(frame)
+                M_WIRE_BYTES.labels(wire.FORMAT if self.binary else "json").inc(len(frame))
+                reply = recv_frame(self.sock)
+                if reply is None:
+                    raise ConnectionError("C closed the connection")
+                self.frames += 1
+                return reply
+            except (OSError, FrameError, ValueError):
+                # dropped link, or a reply we cannot read: the stream is out of sync
+                self.close()
+                if attempt == 2:
+                    raise
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+class CSender:
+    """Micro-batches transactions for C on a background thread.
+
+    Submissions are merged until BATCH_MAX_ITEMS are pending or BATCH_LINGER
+    has passed since the first one. A bounded queue pushes back on callers
+    while C is slow; after BACKPRESSURE_TIMEOUT the submission is dropped.
+    """
+
+    def __init__(self, source="B", channel=None):
+        self.source = source
+        self.channel = channel or CChannel()
+        self.queue = queue.Queue(SEND_QUEUE_SIZE)
+        self.batches = 0
+        self.items = 0
+        self.max_batch = 0
+        self.dropped = 0
+        self.failed = 0
+        self._held = None
+        self._last_stats = time.time()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, transactions, endpoint=None, on_sent=None, trace=None, removed=(),
+               on_failed=None):
+        """Queue transactions; `endpoint` tags which A they came from.
+
+        `removed` are codes A no longer lists. `on_sent` is called once C
+        has accepted the batch containing them, `on_failed` if that batch is
+        rejected, cannot be sent or is dropped here.
+        """
+        try:
+            self.queue.put((endpoint, transactions, (on_sent, on_failed), trace, removed),
+                           timeout=BACKPRESSURE_TIMEOUT)
+        except queue.Full:
+            self.dropped += len(transactions)
+            M_ITEMS.labels("dropped").inc(len(transactions))
+            print(f"[B] C is not keeping up, dropped {len(transactions)} transactions"
+                  f" and {len(removed)} removals")
+            if on_failed:
+                on_failed()
+
+    def _next_batch(self):
+        """Merge queued submissions from the same endpoint into one batch.
+
+        C applies a batch's removals before its transactions, so a later
+        removal also drops that code's earlier lines from the batch.
+        """
+        if self._held is not None:
+            endpoint, batch, done, trace, removed = self._held
+            self._held = None
+        else:
+            endpoint, batch, done, trace, removed = self.queue.get()
+        batch = list(batch)
+        removed = list(removed)
+        callbacks = [done]  # (on_sent, on_failed) per submission
+        traces = [trace] if trace else []
+        deadline = time.monotonic() + BATCH_LINGER
+        while len(batch) < BATCH_MAX_ITEMS:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                other, items, done, trace, gone = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if other != endpoint:
+                self._held = (other, items, done, trace, gone)  # starts the next batch
+                break
+            if gone:
+                dropped = set(gone)
+                batch = [t for t in batch if t.split(" ", 1)[0] not in dropped]
+                removed += gone
+            batch += items
+            callbacks.append(done)
+            if trace:
+                traces.append(trace)
+        return endpoint, batch, removed, callbacks, traces
+
+    def _run(self):
+        while True:
+            endpoint, batch, removed, callbacks, traces = self._next_batch()
+            M_QUEUE.set(self.queue.qsize())
+            payload = {"source": self.source, "transactions": batch}
+            if removed:
+                payload["removed"] = removed
+            if endpoint is not None:
+                payload["endpoint"] = endpoint
+            if traces:
+                # C times end to end from the oldest trace in the batch
+                payload["trace"] = traces[0]
+            started = time.time()
+            try:
+                with M_SEND.labels("framed").time():
+                    reply = self.channel.send(payload)
+                if reply.get("status") != "SUCCESS":
+                    self.failed += len(batch)
+                    M_ITEMS.labels("failed").inc(len(batch))
+                    print(f"[B] C rejected batch: {reply}")
+                    self._notify(callbacks, 1)
+                else:
+                    M_ITEMS.labels("sent").inc(len(batch))
+                    self._notify(callbacks, 0)
+            except Exception as e:
+                self.failed += len(batch)
+                M_ITEMS.labels("failed").inc(len(batch))
+                print(f"[B] Error sending to C: {e}")
+                self._notify(callbacks, 1)
+            M_BATCH.observe(len(batch))
+            for trace in traces:
+                metrics.record_span(trace, "b.send_to_c", started, items=len(batch))
+            self.batches += 1
+            self.items += len(batch)
+            self.max_batch = max(self.max_batch, len(batch))
+            if time.time() - self._last_stats >= STATS_INTERVAL:
+                self._last_stats = time.time()
+                print(f"[B] Stats: {stats()}")
+
+    @staticmethod
+    def _notify(callbacks, which):
+        """Run on_sent (`which` 0) or on_failed (1) of every merged submission."""
+        for done in callbacks:
+            if done[which]:
+                done[which]()
+
+    def stats(self):
+        return {
+            "c_connects": self.channel.connects,
+            "c_format": wire.FORMAT if self.channel.binary else "json",
+            "c_frames": self.channel.frames,
+            "batches": self.batches,
+            "avg_batch": self.items / self.batches if self.batches else 0,
+            "max_batch": self.max_batch,
+            "queued": self.queue.qsize(),
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+_sender = None
+_sender_lock = threading.Lock()
+
+def get_sender():
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = CSender()
+        return _sender
+
+def stats():
+    """Connection-reuse, trigger and batching counters for A and C."""
+    result = http_stats()
+    if _sender is not None:
+        result.update(_sender.stats())
+    if _scheduler is not None:
+        result.update(_scheduler.stats())
+    return result
+
+def send_to_c(transactions, endpoint=None, on_sent=None, trace=None, removed=(), on_failed=None):
+    """Send transaction list (and codes A removed) to C."""
+    if C_FRAMED:
+        get_sender().submit(transactions, endpoint, on_sent, trace, removed, on_failed)
+        return
     payload = {"source": "B", "transactions": transactions}
+    if removed:
+        payload["removed"] = list(removed)
+    if endpoint is not None:
+        payload["endpoint"] = endpoint
+    if trace:
+        payload["trace"] = trace
+    started = time.time()
     try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        with M_SEND.labels("legacy").time(), socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
             s.connect((C_HOST, C_PORT))
             s.sendall(json.dumps(payload).encode())
             resp = s.recv(1024)
             print(f"[B] C responded: {resp.decode()}")
+        M_ITEMS.labels("sent" if resp == b"SUCCESS" else "failed").inc(len(transactions))
     except Exception as e:
+        M_ITEMS.labels("failed").inc(len(transactions))
         print(f"[B] Error sending to C: {e}")
+        resp = None
+    done = on_sent if resp == b"SUCCESS" else on_failed
+    if done:
+        done()
+    metrics.record_span(trace, "b.send_to_c", started, items=len(transactions))
+
+# --- Fan-out collector: many A endpoints per cycle ---
+# Threads for the blocking fetches and sends (fetch + send per endpoint)
+_collect_pool = concurrent.futures.ThreadPoolExecutor(COLLECT_CONCURRENCY * 2)
+
+async def collect_endpoint(url, limiter, timeout=COLLECT_TIMEOUT, retries=COLLECT_RETRIES):
+    """Pull one endpoint with retry/backoff and forward its items to C.
+
+    The blocking pooled-session fetch runs in a worker thread so endpoints
+    overlap; `limiter` caps how many run at once. The timeout is enforced
+    by the HTTP request itself, so an attempt has finished (and its thread
+    is free) before the next one starts.
+    """
+    loop = asyncio.get_running_loop()
+    delay = COLLECT_BACKOFF
+    for attempt in range(1, retries + 1):
+        try:
+            async with limiter:
+                sent = await loop.run_in_executor(_collect_pool, pull_and_send, url, timeout, url)
+            return url, sent or 0, None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if attempt < retries:
+                await asyncio.sleep(delay * (1 + random.random()))
+                delay *= 2
+    print(f"[B] Giving up on {url} after {retries} attempts: {error}")
+    return url, 0, error
+
+async def collect_all(endpoints, concurrency=COLLECT_CONCURRENCY):
+    """Run one collection cycle over all endpoints; returns per-endpoint results."""
+    limiter = asyncio.Semaphore(concurrency)
+    start = time.monotonic()
+    results = await asyncio.gather(*(collect_endpoint(url, limiter) for url in endpoints))
+    ok = sum(1 for _, _, error in results if error is None)
+    items = sum(n for _, n, _ in results)
+    print(f"[B] Collected {items} items from {ok}/{len(endpoints)} endpoints "
+          f"in {time.monotonic() - start:.2f}s")
+    return results
+
+async def run_collector(endpoints, interval=COLLECT_INTERVAL, concurrency=COLLECT_CONCURRENCY):
+    global _collect_pool
+    if concurrency > COLLECT_CONCURRENCY:
+        _collect_pool = concurrent.futures.ThreadPoolExecutor(concurrency * 2)
+    while True:
+        started = time.monotonic()
+        await collect_all(endpoints, concurrency)
+        await asyncio.sleep(max(0, interval - (time.monotonic() - started)))
 
 if __name__ == "__main__":
-    wait_for_success()
+    parser = argparse.ArgumentParser(description="Run B - collector monitor")
+    parser.add_argument("--endpoints", nargs="+",
+                        help="A /itemlines URLs to pull concurrently every --interval seconds "
+                             "instead of waiting for triggers")
+    parser.add_argument("--interval", type=float, default=COLLECT_INTERVAL)
+    parser.add_argument("--concurrency", type=int, default=COLLECT_CONCURRENCY)
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="serve /metrics and /traces on this port (0 disables)")
+    parser.add_argument("--wire-format", choices=("json", "binary"), default=C_WIRE_FORMAT,
+                        help="binary: wire.py batches when C offers them (see C_WIRE_FORMAT)")
+    parser.add_argument("--trigger-window", type=float, default=TRIGGER_WINDOW,
+                        help="seconds during which triggers from one A are coalesced into one pull")
+    args = parser.parse_args()
+    C_WIRE_FORMAT = args.wire_format
+    TRIGGER_WINDOW = args.trigger_window
+
+    metrics.start_metrics_server(args.metrics_port)
+
+    if args.endpoints:
+        asyncio.run(run_collector(args.endpoints, args.interval, args.concurrency))
+    else:
+        wait_for_success()
@@ -0,0 +1,52 @@
+# bench/bench_extract.py
+# Compare B's extract_strings_recursive with the streaming extractor.
+#
+# Usage (from the repo root):
+#   python bench/bench_extract.py [--sizes 900 100000 1000000] [--chunk 65536]
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from b_collector_monitor import extract_strings_recursive, extract_strings_stream
+
+RECURSIVE_MAX_LINES = 900  # extract_strings_recursive recurses once per tag (limit 1000)
+
+def make_body(lines):
+    return "".join(f"<custom>{100 + i} Item number {i} {i % 9 + 1} {i % 500}.99</custom>\n"
+                   for i in range(lines))
+
+def chunked(text, size):
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+def timed(fn):
+    start = time.perf_counter()
+    try:
+        result = fn()
+    except RecursionError:
+        return {"status": "RecursionError", "seconds": time.perf_counter() - start}
+    return {"status": "ok", "seconds": time.perf_counter() - start, "items": len(result)}
+
+def run(sizes, chunk):
+    results = []
+    for lines in sizes:
+        body = make_body(lines)
+        row = {"lines": lines, "bytes": len(body)}
+        if lines <= RECURSIVE_MAX_LINES:
+            row["recursive"] = timed(lambda: extract_strings_recursive(body, "custom"))
+        else:
+            row["recursive"] = {"status": "skipped", "reason": "recursion limit"}
+        row["stream"] = timed(lambda: list(extract_strings_stream(chunked(body, chunk), "custom")))
+        results.append(row)
+        print(json.dumps(row), file=sys.stderr)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark B's <custom> tag extractors")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[900, 100000, 1000000])
+    parser.add_argument("--chunk", type=int, default=64 * 1024)
+    args = parser.parse_args()
+    print(json.dumps(run(args.sizes, args.chunk), indent=2))
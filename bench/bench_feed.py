@@ -0,0 +1,86 @@
+# bench/bench_feed.py
+# Load test for the Feed sink's POST /log, with and without group commit.
+#
+# Starts backend_logger under uvicorn on localhost (plain HTTP) in a child
+# process per mode, fires concurrent keep-alive requests and prints
+# requests/second as JSON.
+#
+# Usage (from the repo root):
+#   python bench/bench_feed.py [--requests 5000] [--concurrency 32]
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import concurrent.futures
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY = "api_key_for_A_123"
+
+def start_sink(port, group_commit, log_dir):
+    env = dict(os.environ, C_LOG_DIR=log_dir, C_LOG_GROUP_COMMIT="1" if group_commit else "0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend_logger:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.join(ROOT, "Feed"), env=env)
+    for _ in range(100):
+        try:
+            requests.get(f"http://127.0.0.1:{port}/health", timeout=0.2)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("sink did not start")
+
+def load(port, total, concurrency, body):
+    url = f"http://127.0.0.1:{port}/log"
+    headers = {"Authorization": f"Bearer {API_KEY}"}
+    per_worker = total // concurrency
+    latencies = []
+
+    def worker():
+        s = requests.Session()
+        out = []
+        for _ in range(per_worker):
+            t = time.perf_counter()
+            s.post(url, data=body, headers=headers).raise_for_status()
+            out.append(time.perf_counter() - t)
+        return out
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+        for result in pool.map(lambda _: worker(), range(concurrency)):
+            latencies += result
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Feed POST /log")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--port", type=int, default=18443)
+    args = parser.parse_args()
+
+    body = json.dumps({"source": "A", "transactions": ["101 18V Cordless Drill 2 89.99"]}).encode()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, group_commit in (("per_request_commit", False), ("group_commit", True)):
+            proc = start_sink(args.port, group_commit, os.path.join(tmp, mode))
+            try:
+                results[mode] = load(args.port, args.requests, args.concurrency, body)
+            finally:
+                proc.terminate()
+                proc.wait()
+            print(mode, json.dumps(results[mode]), file=sys.stderr)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,336 @@
+# bench/bench_suite.py
+# End-to-end benchmark harness for A, B, C and the Feed sink (localhost only).
+#
+# Each component runs in its own child process where it is a server, so its
+# peak RSS can be reported. Clients run here, concurrently:
+#   a_itemlines    GET /itemlines on A (a_http) with N synthetic lines: full
+#                  gzip bodies and conditional (ETag) requests
+#   b_extract      B's extract_strings_recursive vs the streaming extractor
+#   c_thread       C in thread mode, one legacy unframed message per connection
+#   c_async        C in async mode, persistent framed connections
+#   b_send_to_c    B's send_to_c/CSender batching into C (submit -> on_sent)
+#   trigger_storm  concurrent "SUCCESS" triggers into B's listener (port 5051)
+#   feed           POST /log on the Feed sink (needs fastapi/uvicorn)
+#
+# Reports throughput, p50/p99 latency and memory per component as JSON.
+# With --baseline, throughput or p99 worse than --tolerance exits 1.
+#
+# Usage (from the repo root):
+#   python bench/bench_suite.py [--components c_async trigger_storm] [--lines 100000]
+#          [--clients 16] [--out report.json] [--baseline old.json --tolerance 0.15]
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import tracemalloc
+import subprocess
+import concurrent.futures
+
+import requests
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH)
+from synth import item_lines, mutate, custom_body
+from framing import send_frame, recv_frame
+
+HOST = "127.0.0.1"   # everything binds and connects to loopback only
+COMPONENTS = ("a_itemlines", "b_extract", "c_thread", "c_async", "b_send_to_c",
+              "trigger_storm", "feed")
+RECURSIVE_MAX_LINES = 900  # extract_strings_recursive recurses once per tag (limit 1000)
+
+# --- measurement helpers ---
+def summarize(latencies, seconds, items=None):
+    """Throughput and latency percentiles for a list of per-operation seconds."""
+    lat = sorted(latencies)
+    n = len(lat)
+    out = {"ops": n, "seconds": round(seconds, 3),
+           "ops_per_s": round(n / seconds, 1) if seconds else None}
+    if items is not None:
+        out["items_per_s"] = round(items / seconds, 1) if seconds else None
+    if n:
+        out.update({"p50_ms": round(lat[n // 2] * 1000, 3),
+                    "p99_ms": round(lat[min(n - 1, int(n * 0.99))] * 1000, 3),
+                    "max_ms": round(lat[-1] * 1000, 3)})
+    return out
+
+def proc_memory(pid):
+    """Current and peak RSS of a process in MB (Linux /proc), or {}."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return {}
+    mb = lambda key: round(int(fields[key].split()[0]) / 1024, 1) if key in fields else None
+    return {"rss_mb": mb("VmRSS"), "peak_rss_mb": mb("VmHWM")}
+
+def run_clients(clients, ops_per_client, op):
+    """Call op(client_no, i) from `clients` threads; returns (latencies, errors, seconds)."""
+    def worker(c):
+        lat, errors = [], 0
+        for i in range(ops_per_client):
+            t = time.perf_counter()
+            try:
+                op(c, i)
+                lat.append(time.perf_counter() - t)
+            except Exception:
+                errors += 1
+        return lat, errors
+    start = time.perf_counter()
+    latencies, errors = [], 0
+    with concurrent.futures.ThreadPoolExecutor(clients) as pool:
+        for lat, err in pool.map(worker, range(clients)):
+            latencies += lat
+            errors += err
+    return latencies, errors, time.perf_counter() - start
+
+def wait_port(port, proc, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            socket.create_connection((HOST, port), 0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"nothing listening on {port}")
+
+class Server:
+    """A child process running `argv` (script and arguments, or ["-c", code])."""
+
+    def __init__(self, argv, port, cwd=None, log=None):
+        self.log = open(log, "w") if log else subprocess.DEVNULL
+        self.proc = subprocess.Popen([sys.executable, "-u"] + argv, cwd=cwd or ROOT,
+                                     env=dict(os.environ, PYTHONPATH=ROOT),
+                                     stdout=self.log, stderr=subprocess.STDOUT)
+        wait_port(port, self.proc)
+
+    def memory(self):
+        return proc_memory(self.proc.pid)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.proc.terminate()
+        self.proc.wait()
+        if self.log is not subprocess.DEVNULL:
+            self.log.close()
+
+# --- components ---
+def bench_a_itemlines(args, port, tmp):
+    code = (f"import sys; sys.path.insert(0, {BENCH!r})\n"
+            f"from synth import item_lines\nfrom a_http import ItemLines, make_server\n"
+            f"make_server(ItemLines(item_lines({args.lines})), {HOST!r}, {port}).serve_forever()")
+    url = f"http://{HOST}:{port}/itemlines"
+    sessions = [requests.Session() for _ in range(args.clients)]
+    with Server(["-c", code], port) as server:
+        etag = requests.get(url).headers["ETag"]
+        full = run_clients(args.clients, args.http_requests,
+                           lambda c, i: sessions[c].get(url, headers={"Accept-Encoding": "gzip"}).content)
+        cond = run_clients(args.clients, args.http_requests,
+                           lambda c, i: sessions[c].get(url, headers={"If-None-Match": etag}).content)
+        return {"lines": args.lines,
+                "full_gzip": summarize(full[0], full[2]) | {"errors": full[1]},
+                "conditional_304": summarize(cond[0], cond[2]) | {"errors": cond[1]},
+                "memory": server.memory()}
+
+def bench_b_extract(args, port, tmp):
+    from b_collector_monitor import extract_strings_recursive, extract_strings_stream
+    out = {}
+    small = custom_body(item_lines(min(args.lines, RECURSIVE_MAX_LINES)))
+    body = custom_body(item_lines(args.lines))
+    chunks = [body[i:i + 65536] for i in range(0, len(body), 65536)]
+    for name, fn, lines in (
+            ("recursive", lambda: extract_strings_recursive(small, "custom"),
+             min(args.lines, RECURSIVE_MAX_LINES)),
+            ("stream", lambda: list(extract_strings_stream(iter(chunks), "custom")), args.lines)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            fn()
+            status = "ok"
+        except RecursionError:
+            status = "RecursionError"
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        out[name] = {"status": status, "lines": lines, "seconds": round(seconds, 3),
+                     "lines_per_s": round(lines / seconds, 1) if status == "ok" else None,
+                     "memory": {"peak_alloc_mb": round(peak / 2 ** 20, 1)}}
+    return out
+
+def _c_server(mode, port, tmp):
+    # Run from a scratch directory: C writes its journals and compare_log.txt to the cwd
+    argv = [os.path.join(ROOT, "c_compare_logger.py"), "--mode", mode, "--host", HOST,
+            "--port", str(port), "--checkpoint-interval", "0"]
+    return Server(argv, port, cwd=tmp, log=os.path.join(tmp, f"c_{mode}.log"))
+
+def _c_messages(args):
+    """Per-client A/B messages: clients alternate sources, B drifts from A."""
+    lines = item_lines(args.items_per_message * args.messages)
+    drifted = mutate(lines, 0.1)
+    k = args.items_per_message
+
+    def message(c, i):
+        source = "A" if c % 2 == 0 else "B"
+        pool = lines if source == "A" else drifted
+        start = (i * k) % len(pool)
+        return {"source": source, "transactions": pool[start:start + k]}
+    return message
+
+def bench_c_thread(args, port, tmp):
+    message = _c_messages(args)
+
+    def op(c, i):
+        with socket.create_connection((HOST, port)) as s:
+            s.sendall(json.dumps(message(c, i)).encode())
+            if s.recv(16) != b"SUCCESS":
+                raise RuntimeError("C failed")
+    with _c_server("thread", port, tmp) as server:
+        lat, errors, seconds = run_clients(args.clients, args.messages, op)
+        return summarize(lat, seconds, len(lat) * args.items_per_message) | {
+            "errors": errors, "items_per_message": args.items_per_message,
+            "memory": server.memory()}
+
+def bench_c_async(args, port, tmp):
+    message = _c_messages(args)
+    conns = {}
+
+    def op(c, i):
+        s = conns.get(c)
+        if s is None:
+            s = conns[c] = socket.create_connection((HOST, port))
+        send_frame(s, message(c, i), binary=args.wire_format == "binary")
+        if recv_frame(s).get("status") != "SUCCESS":
+            raise RuntimeError("C failed")
+    with _c_server("async", port, tmp) as server:
+        lat, errors, seconds = run_clients(args.clients, args.messages, op)
+        for s in conns.values():
+            s.close()
+        return summarize(lat, seconds, len(lat) * args.items_per_message) | {
+            "errors": errors, "items_per_message": args.items_per_message,
+            "wire_format": args.wire_format, "memory": server.memory()}
+
+def bench_b_send_to_c(args, port, tmp):
+    import b_collector_monitor as b
+    b.C_HOST, b.C_PORT = HOST, port
+    lines = item_lines(args.items_per_message * args.messages)
+    k = args.items_per_message
+    with _c_server("async", port, tmp) as server:
+        sender = b.CSender(channel=b.CChannel(HOST, port, args.wire_format))
+
+        def op(c, i):
+            done = threading.Event()
+            start = (i * k) % len(lines)
+            sender.submit(lines[start:start + k], f"bench-{c}", done.set)
+            if not done.wait(60):
+                raise RuntimeError("not acknowledged")
+        lat, errors, seconds = run_clients(args.clients, args.messages, op)
+        return summarize(lat, seconds, len(lat) * k) | {
+            "errors": errors, "sender": sender.stats(), "memory_c": server.memory()}
+
+def bench_trigger_storm(args, port, tmp):
+    log = os.path.join(tmp, "b_triggers.log")
+    code = (f"import b_collector_monitor as b\nb.LISTEN_HOST, b.LISTEN_PORT = {HOST!r}, {port}\n"
+            "b.wait_for_success()")
+
+    def op(c, i):
+        with socket.create_connection((HOST, port), 5) as s:
+            s.sendall(b"SUCCESS")
+    with Server(["-c", code], port, log=log) as server:
+        per_client = max(1, args.triggers // args.clients)
+        lat, errors, seconds = run_clients(args.clients, per_client, op)
+        deadline = time.monotonic() + 10
+        received = 0
+        while time.monotonic() < deadline:
+            with open(log) as f:
+                received = f.read().count("Received SUCCESS trigger")
+            if received >= len(lat):
+                break
+            time.sleep(0.1)
+        return summarize(lat, seconds) | {"errors": errors, "received": received,
+                                          "memory": server.memory()}
+
+def bench_feed(args, port, tmp):
+    import bench_feed as bf
+    proc = bf.start_sink(port, True, os.path.join(tmp, "feed"))
+    try:
+        body = json.dumps({"source": "A", "transactions": item_lines(1)}).encode()
+        r = bf.load(port, args.http_requests * args.clients, args.clients, body)
+        return {"ops": r["requests"], "seconds": round(r["seconds"], 3),
+                "ops_per_s": round(r["rps"], 1), "p50_ms": round(r["p50_ms"], 3),
+                "p99_ms": round(r["p99_ms"], 3), "memory": proc_memory(proc.pid)}
+    finally:
+        proc.terminate()
+        proc.wait()
+
+# --- regression check ---
+def regressions(report, baseline, tolerance):
+    """Paths where throughput dropped or p99 rose by more than `tolerance`."""
+    found = []
+
+    def walk(new, old, path):
+        for key, value in new.items():
+            prev = old.get(key) if isinstance(old, dict) else None
+            if isinstance(value, dict):
+                walk(value, prev, path + [key])
+            elif isinstance(value, (int, float)) and isinstance(prev, (int, float)) and prev:
+                change = (value - prev) / prev
+                if key.endswith("_per_s") and change < -tolerance:
+                    found.append((".".join(path + [key]), prev, value))
+                elif key == "p99_ms" and change > tolerance:
+                    found.append((".".join(path + [key]), prev, value))
+    walk(report["results"], baseline.get("results", {}), [])
+    return found
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark A, B, C and Feed on localhost")
+    parser.add_argument("--components", nargs="+", choices=COMPONENTS, default=list(COMPONENTS))
+    parser.add_argument("--lines", type=int, default=100000, help="synthetic A item lines")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--http-requests", type=int, default=50, help="HTTP requests per client")
+    parser.add_argument("--messages", type=int, default=200, help="C messages per client")
+    parser.add_argument("--wire-format", choices=("json", "binary"), default="json",
+                        help="transaction frames sent to C (binary: wire.py)")
+    parser.add_argument("--items-per-message", type=int, default=100)
+    parser.add_argument("--triggers", type=int, default=5000, help="triggers in the storm")
+    parser.add_argument("--trigger-port", type=int, default=5051)
+    parser.add_argument("--base-port", type=int, default=18100, help="first port for A/C/Feed servers")
+    parser.add_argument("--out", help="also write the JSON report here")
+    parser.add_argument("--baseline", help="previous report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    report = {"meta": {"time_utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                       "python": platform.python_version(), "platform": platform.platform(),
+                       "cpus": os.cpu_count(), "args": vars(args)},
+              "results": {}}
+    for name in args.components:
+        port = args.trigger_port if name == "trigger_storm" else args.base_port + COMPONENTS.index(name)
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                result = globals()[f"bench_{name}"](args, port, tmp)
+            except Exception as e:
+                result = {"error": f"{type(e).__name__}: {e}"}
+        report["results"][name] = result
+        print(name, json.dumps(result), file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        for path, old, new in found:
+            print(f"[bench] REGRESSION {path}: {old} -> {new}", file=sys.stderr)
+        sys.exit(1 if found else 0)
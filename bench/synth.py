@@ -0,0 +1,32 @@
+# bench/synth.py
+# Synthetic A item lines for the benchmarks.
+#
+# Lines follow A's "<LINENO> <DESC> <QTY> <VAL>" layout (see search.html's
+# field table) and are reproducible for a given seed.
+import random
+
+WORDS = ("18V Cordless Drill Wood Clamp Carpenter's Hammer Adjustable Wrench Set Box "
+         "Drywall Screws Laser Distance Measurer Heavy Duty Tape Measure Level Tool "
+         "Impact Driver Precision Screwdriver Safety Goggles Work Gloves Power Extension "
+         "Cord Circular Saw Blade Square Chisel Jigsaw Paint Roller Kit Electric Sander "
+         "Utility Knife Dust Mask Angle Grinder Folding Workbench Claw Sawhorse Pair").split()
+
+def item_lines(n, seed=0, first_code=100):
+    """`n` distinct item lines with codes first_code, first_code + 1, ..."""
+    rnd = random.Random(seed)
+    return [f"{first_code + i} {' '.join(rnd.choices(WORDS, k=rnd.randint(2, 4)))} "
+            f"{rnd.randint(1, 9)} {rnd.uniform(1, 500):.2f}"
+            for i in range(n)]
+
+def mutate(lines, share, seed=1):
+    """Copy of `lines` with `share` of them given a new QTY (what B sees drift)."""
+    rnd = random.Random(seed)
+    out = list(lines)
+    for i in rnd.sample(range(len(out)), int(len(out) * share)):
+        head, qty, val = out[i].rsplit(" ", 2)
+        out[i] = f"{head} {int(qty) % 9 + 1} {val}"
+    return out
+
+def custom_body(lines, tag="custom"):
+    """A's /itemlines body for `lines`."""
+    return "".join(f"<{tag}>{ln}</{tag}>\n" for ln in lines)
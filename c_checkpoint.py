@@ -0,0 +1,172 @@
+# c_checkpoint.py
+# Binary checkpoints of C's history for fast restarts.
+#
+# A checkpoint holds every in-memory version of every code plus, per source,
+# the journal segment that was opened when it was taken. Startup loads the
+# checkpoint through mmap, rebuilds the reconciliation index from the latest
+# versions and replays only the journal segments written since.
+#
+# File layout:
+#   MAGIC | meta length (I) | meta JSON
+#   per source, per code: len(code) (H), versions (I), code,
+#                         then per version: epoch (q), len(rest) (I), rest
+import os
+import json
+import mmap
+import time
+import struct
+import threading
+
+from c_journal import iter_records, list_segments, snapshot_path
+
+MAGIC = b"CCHK\x01"
+CHECKPOINT_PATH = "c_state.ckpt"
+CHECKPOINT_INTERVAL = 300   # seconds
+COMPACT_AFTER = True        # fold journal segments covered by a checkpoint...
+COMPACT_RATIO = 0.5         # ...once they hold this share of the snapshot's bytes
+COMPACT_MIN_BYTES = 16 * 1024 * 1024  # (and at least this much)
+COMPACT_MAX_SEGMENTS = 64   # or once this many have piled up
+
+META_LEN = struct.Struct("!I")
+CODE_HEAD = struct.Struct("!HI")
+VERSION_HEAD = struct.Struct("!qI")
+
+def capture(history, journals):
+    """Take a consistent in-memory copy; caller must hold C's lock.
+
+    Journals are rotated so the checkpoint covers exactly the segments
+    before the new one.
+    """
+    snapshot = {}
+    for src, store in history.items():
+        journal = journals(src)
+        journal.rotate()
+        snapshot[src] = (journal.seq, list(store.items()))
+    return snapshot
+
+def write_checkpoint(snapshot, path=CHECKPOINT_PATH):
+    """Serialise a capture() result atomically (tmp file + fsync + rename)."""
+    meta = {
+        "created": time.time(),
+        "sources": {src: {"segment": seq, "codes": len(items)}
+                    for src, (seq, items) in snapshot.items()},
+    }
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    tmp = path + ".tmp"
+    with open(tmp, "wb", buffering=1024 * 1024) as f:
+        f.write(MAGIC + META_LEN.pack(len(meta_bytes)) + meta_bytes)
+        for src in meta["sources"]:
+            for code, versions in snapshot[src][1]:
+                c = code.encode("utf-8")
+                f.write(CODE_HEAD.pack(len(c), len(versions)) + c)
+                for epoch, rest in versions:
+                    r = rest.encode("utf-8")
+                    f.write(VERSION_HEAD.pack(epoch, len(r)) + r)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return meta
+
+def load_checkpoint(path=CHECKPOINT_PATH):
+    """Return (meta, {source: [(code, [(epoch, rest), ...]), ...]}) or None."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        if m[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a C checkpoint")
+        pos = len(MAGIC)
+        (meta_len,) = META_LEN.unpack_from(m, pos)
+        pos += META_LEN.size
+        meta = json.loads(m[pos:pos + meta_len].decode("utf-8"))
+        pos += meta_len
+        data = {}
+        for src, info in meta["sources"].items():
+            items = data[src] = []
+            for _ in range(info["codes"]):
+                clen, count = CODE_HEAD.unpack_from(m, pos)
+                pos += CODE_HEAD.size
+                code = m[pos:pos + clen].decode("utf-8")
+                pos += clen
+                versions = []
+                for _ in range(count):
+                    epoch, rlen = VERSION_HEAD.unpack_from(m, pos)
+                    pos += VERSION_HEAD.size
+                    versions.append((epoch, m[pos:pos + rlen].decode("utf-8")))
+                    pos += rlen
+                items.append((code, versions))
+    return meta, data
+
+def compact_due(source, directory, before):
+    """True when the segments before `before` are worth folding into the snapshot.
+
+    Compaction rewrites the whole snapshot, so it waits until the segments
+    are a fair share of it; the rewrite then costs O(new bytes) amortised.
+    """
+    segments = [p for seq, p in list_segments(source, directory) if seq < before]
+    if len(segments) >= COMPACT_MAX_SEGMENTS:
+        return True
+    pending = sum(os.path.getsize(p) for p in segments)
+    snapshot = snapshot_path(source, directory)
+    base = os.path.getsize(snapshot) if os.path.exists(snapshot) else 0
+    return pending >= max(COMPACT_MIN_BYTES, COMPACT_RATIO * base)
+
+def journal_tail(source, directory, from_segment=None):
+    """Yield (epoch, code, rest) to replay after a checkpoint.
+
+    With from_segment=None (no checkpoint) the snapshot and every segment
+    are replayed; otherwise only segments with seq >= from_segment.
+    """
+    if from_segment is None:
+        records = iter_records(source, directory)
+    else:
+        segments = [(seq, p) for seq, p in list_segments(source, directory)
+                    if seq >= from_segment]
+        records = iter_records(source, directory, segments, snapshot=False)
+    last_ts, last_epoch = None, 0
+    for ts, code, rest in records:
+        if ts != last_ts:
+            last_ts = ts
+            last_epoch = int(time.mktime(time.strptime(ts, "%Y-%m-%d %H:%M:%S")))
+        yield last_epoch, code, rest
+
+class Checkpointer:
+    """Background thread writing a checkpoint every `interval` seconds.
+
+    Only capture() runs under C's lock; serialisation and fsync happen
+    outside it so ingest keeps going while the file is written.
+    """
+
+    def __init__(self, lock, history, journals, path=CHECKPOINT_PATH,
+                 interval=CHECKPOINT_INTERVAL, compact_after=COMPACT_AFTER):
+        self.lock = lock
+        self.history = history
+        self.journals = journals
+        self.path = path
+        self.interval = interval
+        self.compact_after = compact_after
+        self._stop = threading.Event()
+
+    def checkpoint(self):
+        with self.lock:
+            snapshot = capture(self.history(), self.journals)
+        meta = write_checkpoint(snapshot, self.path)
+        if self.compact_after:
+            for src, info in meta["sources"].items():
+                journal = self.journals(src)
+                if compact_due(src, journal.directory, info["segment"]):
+                    journal.compact(before=info["segment"])
+        return meta
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                meta = self.checkpoint()
+                print(f"[C] Checkpoint written: {meta['sources']}")
+            except Exception as e:
+                print(f"[C] Checkpoint failed: {e}")
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
@@ -2,66 +2,401 @@
 import socket
 import threading
 import json
+import asyncio
+import argparse
+import time
 from datetime import datetime
-from collections import defaultdict
+
+import metrics
+from framing import BodyError, FrameError, decode_legacy, encode_frame, read_frame
+from wire import FORMATS, transaction_pairs
+from c_journal import Journal, list_sources
+from c_history_store import REMOVED, HistoryStore, format_ts, side_of, store_key
+import c_search
+from c_checkpoint import CHECKPOINT_PATH, CHECKPOINT_INTERVAL, Checkpointer, load_checkpoint, journal_tail
+try:
+    import c_reconcile
+except ImportError:  # numpy not installed: no bulk QTY/VAL reconciliation
+    c_reconcile = None
 
 HOST = "0.0.0.0"
 PORT = 5000
 
-# Histories keyed by source (A/B) then by item_code
-history = {
-    "A": defaultdict(list),
-    "B": defaultdict(list)
-}
+# Async server tuning
+QUEUE_SIZE = 1024      # pending messages before readers are paused
+WORKERS = 2            # messages applied at once (they share `lock`; with --shards, PIPELINE per shard)
+LEGACY_READ = 65536    # chunk size when reading legacy unframed JSON
+METRICS_PORT = 9203    # /metrics and /traces; 0 disables
+
+# History retention (see c_history_store.py)
+HISTORY_MAX_VERSIONS = 16
+HISTORY_MAX_AGE = 7 * 24 * 3600   # seconds
+HISTORY_SPILL = False             # spill evicted versions to history_<source>.spill
+
+# Append-only journals: <JOURNAL_DIR>/history_<source>.<seq>.log segments
+JOURNAL_DIR = "."
+
+# Full QTY/VAL reconciliation (c_reconcile.py, needs numpy) logged by
+# log_difference at most this often, in seconds; 0 = only on request
+RECONCILE_INTERVAL = 0
+
+def new_store(key, directory="."):
+    return HistoryStore(HISTORY_MAX_VERSIONS, HISTORY_MAX_AGE,
+                        f"{directory}/history_{key}.spill" if HISTORY_SPILL else None)
+
+def new_history(directory="."):
+    """Fresh per-source history stores."""
+    return {src: new_store(src, directory) for src in ("A", "B")}
+
+# Histories keyed by source (A/B, or B-<endpoint> per A front-end B pulls
+# from; see store_key) then by item_code
+history = new_history()
+
+def get_store(key):
+    store = history.get(key)
+    if store is None:
+        store = history[key] = new_store(key, JOURNAL_DIR)
+    return store
+
+# Journals are opened on first use so importing this module has no side effects
+journals = {}
+
+def get_journal(source):
+    journal = journals.get(source)
+    if journal is None:
+        journal = journals[source] = Journal(source, JOURNAL_DIR)
+    return journal
 
 lock = threading.Lock()
 
-def log_difference():
-    """Compare the two latest lists from A and B."""
-    latest_A = {code: hist[-1] for code, hist in history["A"].items()}
-    latest_B = {code: hist[-1] for code, hist in history["B"].items()}
+# --- METRICS ---
+M_MESSAGES = metrics.counter("c_messages_total", "A/B messages by outcome", ["source", "status"])
+M_ITEMS = metrics.counter("c_items_total", "Transactions applied", ["source"])
+M_INFLIGHT = metrics.gauge("c_messages_inflight", "Messages being applied")
+M_QUEUE_WAIT = metrics.histogram("c_queue_wait_seconds", "Async mode: queued until a worker picks it up")
+M_LOCK_WAIT = metrics.histogram("c_lock_wait_seconds", "Waiting for the history lock")
+M_APPLY = metrics.histogram("c_apply_seconds", "Work done under the lock (or by the shards)", ["step"])
+M_WRITE = metrics.histogram("c_file_write_seconds", "Journal and compare_log appends", ["file"])
+M_E2E = metrics.histogram("als_end_to_end_seconds", "Trace start on A (or B) until applied in C", ["source"])
+
+# Sharded engine (c_shard.py); None means reconcile in this process
+engine = None
+
+# Item search (c_search.py); enabled with --search-port
+SEARCH = False
+
+# Match states tracked per item code
+ONLY_A = "only_A"
+ONLY_B = "only_B"
+MATCHED = "matched"
+
+class ReconciliationIndex:
+    """Live per-code view of the latest A/B values and their match state.
+
+    add_to_history calls update() for each changed code and remove() for each
+    code A no longer lists; drain() turns the codes touched since the last
+    drain into a delta (a removed one-sided code counts as resolved), so the cost per message
+    is O(changed codes) rather than O(all codes).
+    """
 
-    only_in_A = [f"{code} {latest_A[code]}" for code in latest_A if code not in latest_B]
-    only_in_B = [f"{code} {latest_B[code]}" for code in latest_B if code not in latest_A]
+    def __init__(self):
+        self.latest = {"A": {}, "B": {}}
+        self.only = {"A": set(), "B": set()}
+        self._pending = {}  # code -> state before the first pending update
+
+    def state(self, code):
+        in_a = code in self.latest["A"]
+        in_b = code in self.latest["B"]
+        if in_a and in_b:
+            return MATCHED
+        if in_a:
+            return ONLY_A
+        if in_b:
+            return ONLY_B
+        return None
+
+    def update(self, source, code, rest):
+        if code not in self._pending:
+            self._pending[code] = self.state(code)
+        self.latest[source][code] = rest
+
+    def remove(self, source, code):
+        if code not in self.latest[source]:
+            return
+        if code not in self._pending:
+            self._pending[code] = self.state(code)
+        del self.latest[source][code]
+
+    def drain(self):
+        """Return (newly_only_A, newly_only_B, resolved) since the last drain."""
+        new_a, new_b, resolved = [], [], []
+        for code, before in self._pending.items():
+            after = self.state(code)
+            if after == before:
+                continue
+            self.only["A"].discard(code)
+            self.only["B"].discard(code)
+            if after == ONLY_A:
+                self.only["A"].add(code)
+                new_a.append(f"{code} {self.latest['A'][code]}")
+            elif after == ONLY_B:
+                self.only["B"].add(code)
+                new_b.append(f"{code} {self.latest['B'][code]}")
+            elif before in (ONLY_A, ONLY_B):
+                resolved.append(code)
+        self._pending.clear()
+        return new_a, new_b, resolved
+
+    def only_in(self, source):
+        """Current full list of codes present only in `source`."""
+        return [f"{code} {self.latest[source][code]}" for code in self.only[source]]
+
+index = ReconciliationIndex()
+_last_reconcile = time.monotonic()
+
+def log_difference(reconcile=False):
+    """Log codes that became A-only/B-only or were resolved since the last call.
+
+    With `reconcile` (or every RECONCILE_INTERVAL seconds) also log a full
+    QTY/VAL reconciliation of the latest A and B lines.
+    """
+    global _last_reconcile
+    new_a, new_b, resolved = index.drain()
+    write_delta(new_a, new_b, resolved, len(index.only["A"]), len(index.only["B"]))
+    due = RECONCILE_INTERVAL and time.monotonic() - _last_reconcile >= RECONCILE_INTERVAL
+    if (reconcile or due) and c_reconcile is not None:
+        _last_reconcile = time.monotonic()
+        with M_APPLY.labels("reconcile").time():
+            report = c_reconcile.reconcile_latest(index.latest["A"], index.latest["B"])
+        write_reconciliation(report)
+
+def write_delta(new_a, new_b, resolved, open_a, open_b):
+    """Append one reconciliation delta to compare_log.txt."""
+    if not (new_a or new_b or resolved):
+        return
 
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open("compare_log.txt", "a") as f:
+    with M_WRITE.labels("compare_log").time(), open("compare_log.txt", "a") as f:
         f.write(f"\n--- {now} ---\n")
-        f.write(f"Only in A: {only_in_A}\n")
-        f.write(f"Only in B: {only_in_B}\n")
+        f.write(f"New only in A: {new_a}\n")
+        f.write(f"New only in B: {new_b}\n")
+        f.write(f"Resolved: {resolved}\n")
+        f.write(f"Open: A={open_a} B={open_b}\n")
 
-def add_to_history(source, transactions):
-    """Append new transactions with timestamps to history."""
+def write_reconciliation(report):
+    """Append a c_reconcile report to compare_log.txt."""
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    for t in transactions:
-        parts = t.split(" ", 1)
-        if len(parts) < 2:
-            continue
-        code, rest = parts[0], parts[1]
+    with M_WRITE.labels("compare_log").time(), open("compare_log.txt", "a") as f:
+        f.write(f"\n--- {now} reconciliation ---\n")
+        f.write(c_reconcile.format_report(report) + "\n")
+
+def current_elsewhere(key, code):
+    """Latest line of `code` in another store on the same side as `key`
+    (another of B's front-ends), or None when none of them lists it."""
+    side = side_of(key)
+    for other, store in history.items():
+        if other != key and side_of(other) == side:
+            last = store.last(code)
+            if last is not None and last[1] != REMOVED:
+                return last[1]
+    return None
+
+def add_to_history(source, transactions, removed=()):
+    """Append new transactions with timestamps to history.
+
+    `source` is a store_key. `removed` codes get a REMOVED version and drop
+    out of the index unless another front-end of the same side still lists
+    them. Returns the (timestamp, code, rest) records added.
+    """
+    epoch = int(time.time())
+    now = format_ts(epoch)
+    store = get_store(source)
+    side = side_of(source)
+    added = []
+    for code in removed:
+        last = store.last(code)
+        if last is not None and last[1] != REMOVED:
+            store.append(code, epoch, REMOVED)
+            added.append((now, code, REMOVED))
+            other = current_elsewhere(source, code)
+            if other is None:
+                index.remove(side, code)
+            else:
+                index.update(side, code, other)
+    # JSON lines or a binary batch (wire.Records)
+    for code, rest in transaction_pairs(transactions):
         # Only append if different from last entry
-        if not history[source][code] or history[source][code][-1][1] != rest:
-            history[source][code].append((now, rest))
+        last = store.last(code)
+        if last is None or last[1] != rest:
+            store.append(code, epoch, rest)
+            rest = store.last(code)[1]  # interned copy
+            added.append((now, code, rest))
+            index.update(side, code, rest)
+
+    # Journal only what this message added
+    with M_WRITE.labels("journal").time():
+        get_journal(source).append(added)
+    if SEARCH and added:
+        c_search.update(side, [(code, index.latest[side].get(code)) for _, code, _ in added])
+    return added
+
+def _check_source(source):
+    if source not in ("A", "B"):
+        M_MESSAGES.labels("invalid", "rejected").inc()
+        raise ValueError("Invalid source")
 
-    # Save full history log
-    with open(f"history_{source}.txt", "a") as f:
-        for code, records in history[source].items():
-            for ts, desc in records:
-                f.write(f"{ts} | {code} {desc}\n")
+def _check_endpoint(endpoint):
+    if endpoint is not None and not isinstance(endpoint, str):
+        M_MESSAGES.labels("invalid", "rejected").inc()
+        raise ValueError("Invalid endpoint")
+
+def _applied(source, items, started, trace):
+    M_MESSAGES.labels(source, "applied").inc()
+    M_ITEMS.labels(source).inc(len(items))
+    trace = metrics.valid_trace(trace)
+    if trace is not None:
+        M_E2E.labels(source).observe(time.time() - trace["start"])
+        metrics.record_span(trace, "c.apply", started, source=source, items=len(items))
+
+def apply_transactions(source, items, trace=None, removed=(), endpoint=None):
+    """Validate and apply one A/B message under the global lock.
+
+    `removed` lists codes A no longer has; they are applied before `items`.
+    `trace` is the message's {"id", "start"}; C times A->C latency from it.
+    B messages tagged with the A `endpoint` they came from are kept apart
+    per endpoint, so one front-end's removals don't touch another's codes.
+    """
+    _check_source(source)
+    _check_endpoint(endpoint)
+    key = store_key(source, endpoint)
+    started = time.time()
+    with M_INFLIGHT.track():
+        if engine is not None:
+            with M_APPLY.labels("sharded").time():
+                engine.apply(key, items, removed)
+        else:
+            waiting = time.perf_counter()
+            with lock:
+                M_LOCK_WAIT.observe(time.perf_counter() - waiting)
+                with M_APPLY.labels("add_to_history").time():
+                    add_to_history(key, items, removed)
+                with M_APPLY.labels("log_difference").time():
+                    log_difference()
+    _applied(source, items, started, trace)
+
+async def _apply_sharded(loop, source, items, trace=None, removed=(), endpoint=None):
+    """apply_transactions for a sharded C that holds no thread while the shards work."""
+    _check_source(source)
+    _check_endpoint(endpoint)
+    key = store_key(source, endpoint)
+    started = time.time()
+    with M_INFLIGHT.track(), M_APPLY.labels("sharded").time():
+        # submit() only blocks when a shard's inbox is full
+        pending = await loop.run_in_executor(None, engine.submit, key, items, removed)
+        await asyncio.wrap_future(pending)
+    _applied(source, items, started, trace)
+
+def restore_state(path=CHECKPOINT_PATH):
+    """Reload history from the last checkpoint plus the journal tail.
+
+    Without a checkpoint the whole journal is replayed. The index is rebuilt
+    silently so a restart doesn't log every code as newly A-/B-only.
+    """
+    loaded = load_checkpoint(path)
+    with lock:
+        for src in list_sources(JOURNAL_DIR):
+            get_store(src)
+        from_segment = {}
+        if loaded:
+            meta, data = loaded
+            for src, items in data.items():
+                store = get_store(src)
+                for code, versions in items:
+                    store.load(code, versions)
+                from_segment[src] = meta["sources"][src]["segment"]
+        replayed = 0
+        for src, store in history.items():
+            for epoch, code, rest in journal_tail(src, JOURNAL_DIR, from_segment.get(src)):
+                last = store.last(code)
+                if last is None or last[1] != rest:
+                    store.append(code, epoch, rest)
+                    replayed += 1
+            for code in store.codes():
+                rest = store.last(code)[1]
+                if rest != REMOVED:
+                    index.update(side_of(src), code, rest)
+        index.drain()
+    print(f"[C] Restored {len(index.latest['A'])} A / {len(index.latest['B'])} B current codes "
+          f"({'checkpoint + ' if loaded else ''}{replayed} journal records)")
+
+def start_checkpointer(path=CHECKPOINT_PATH, interval=CHECKPOINT_INTERVAL):
+    checkpointer = Checkpointer(lock, lambda: history, get_journal, path, interval)
+    checkpointer.start()
+    return checkpointer
+
+def memory_report():
+    """Memory used by C's in-memory state, per source."""
+    if engine is not None:
+        return engine.query("memory")
+    with lock:
+        return {src: store.memory_report() for src, store in history.items()}
+
+def only_in_report():
+    """Codes currently present on one side only."""
+    if engine is not None:
+        return engine.query("only_in")
+    with lock:
+        return {"A": index.only_in("A"), "B": index.only_in("B")}
+
+def reconcile_report(limit=None):
+    """Full QTY/VAL reconciliation of the latest A and B lines (needs numpy)."""
+    if c_reconcile is None:
+        raise ValueError("Reconciliation needs numpy")
+    limit = c_reconcile.LIMIT if limit is None else int(limit)
+    if engine is not None:
+        latest = engine.query("latest")
+        return c_reconcile.reconcile_latest(latest.get("A", []), latest.get("B", []), limit)
+    with lock:
+        latest_a, latest_b = dict(index.latest["A"]), dict(index.latest["B"])
+    return c_reconcile.reconcile_latest(latest_a, latest_b, limit)
+
+def handle_query(payload):
+    """Answer a {"query": ...} message instead of applying transactions."""
+    query = payload.get("query")
+    if query == "memory":
+        return memory_report()
+    if query == "only_in":
+        return only_in_report()
+    if query == "reconcile":
+        return reconcile_report(payload.get("limit"))
+    if query == "formats":
+        return FORMATS  # transaction formats this C accepts, preferred first
+    raise ValueError(f"Unknown query: {query}")
+
+def _recv_legacy(conn):
+    """Read one unframed JSON message from a blocking socket."""
+    data = bytearray()
+    while True:
+        chunk = conn.recv(LEGACY_READ)
+        if not chunk:
+            return json.loads(bytes(data).decode("utf-8"))  # raises on a truncated message
+        data += chunk
+        payload = decode_legacy(data)
+        if payload is not None:
+            return payload
 
 def handle_client(conn, addr):
     print(f"Connected by {addr}")
-    data = conn.recv(8192).decode("utf-8").strip()
     try:
-        payload = json.loads(data)
+        payload = _recv_legacy(conn)
+        if "query" in payload:
+            conn.sendall(json.dumps(handle_query(payload)).encode("utf-8"))
+            return
         source = payload.get("source")
         items = payload.get("transactions", [])
 
-        if source not in ("A", "B"):
-            raise ValueError("Invalid source")
-
-        with lock:
-            add_to_history(source, items)
-            log_difference()
+        apply_transactions(source, items, payload.get("trace"), payload.get("removed", ()),
+                           payload.get("endpoint"))
 
         conn.sendall(b"SUCCESS")
     except Exception as e:
@@ -79,5 +414,159 @@ def start_server():
             conn, addr = s.accept()
             threading.Thread(target=handle_client, args=(conn, addr)).start()
 
+# --- asyncio server: persistent, framed connections ---
+async def _worker(queue, loop):
+    while True:
+        payload, done, queued = await queue.get()
+        M_QUEUE_WAIT.observe(time.perf_counter() - queued)
+        try:
+            source = payload.get("source")
+            items = payload.get("transactions", [])
+            trace, removed = payload.get("trace"), payload.get("removed", ())
+            endpoint = payload.get("endpoint")
+            if engine is not None:
+                await _apply_sharded(loop, source, items, trace, removed, endpoint)
+            else:
+                await loop.run_in_executor(None, apply_transactions, source, items, trace,
+                                           removed, endpoint)
+            done.set_result(None)
+        except Exception as e:
+            done.set_exception(e)
+        finally:
+            queue.task_done()
+
+async def _submit(queue, payload):
+    done = asyncio.get_running_loop().create_future()
+    await queue.put((payload, done, time.perf_counter()))  # blocks the reader when C is saturated
+    await done
+
+async def _read_legacy(reader, first):
+    """Read one unframed JSON document (old A/B clients send no length)."""
+    data = bytearray(first)
+    while True:
+        payload = decode_legacy(data)
+        if payload is not None:
+            return payload
+        chunk = await reader.read(LEGACY_READ)
+        if not chunk:
+            return json.loads(bytes(data).decode("utf-8"))  # raises on a truncated message
+        data += chunk
+
+async def _handle_async_client(reader, writer, queue):
+    addr = writer.get_extra_info("peername")
+    print(f"Connected by {addr}")
+    try:
+        first = await reader.read(1)
+        if not first:
+            return
+        if first == b"{":
+            # Legacy client: one JSON message, plain-text reply, then close.
+            try:
+                payload = await _read_legacy(reader, first)
+                await _submit(queue, payload)
+                writer.write(b"SUCCESS")
+            except Exception as e:
+                print(f"Error: {e}")
+                writer.write(b"FAIL")
+            await writer.drain()
+            return
+
+        header = first
+        while True:
+            try:
+                payload = await read_frame(reader, header)
+            except BodyError as e:
+                # the frame was read whole, so the connection stays usable
+                print(f"Error: {e}")
+                M_MESSAGES.labels("invalid", "rejected").inc()
+                writer.write(encode_frame({"status": "FAIL", "error": str(e)}))
+                await writer.drain()
+                header = None
+                continue
+            header = None
+            if payload is None:
+                break
+            try:
+                if "query" in payload:
+                    result = await asyncio.get_running_loop().run_in_executor(
+                        None, handle_query, payload)
+                    reply = {"status": "SUCCESS", "result": result}
+                else:
+                    await _submit(queue, payload)
+                    reply = {"status": "SUCCESS"}
+            except Exception as e:
+                print(f"Error: {e}")
+                reply = {"status": "FAIL", "error": str(e)}
+            writer.write(encode_frame(reply))
+            await writer.drain()
+    except (FrameError, ConnectionError) as e:
+        print(f"Connection {addr} dropped: {e}")
+    finally:
+        writer.close()
+
+async def serve_async(host=HOST, port=PORT, queue_size=QUEUE_SIZE, workers=WORKERS):
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=queue_size)
+    if engine is not None:
+        # sharded workers only wait on the shards, so keep each shard's pipeline full
+        workers = max(workers, engine.shards * engine.pipeline)
+    tasks = [asyncio.create_task(_worker(queue, loop)) for _ in range(workers)]
+    server = await asyncio.start_server(
+        lambda r, w: _handle_async_client(r, w, queue), host, port)
+    print(f"C (compare_logger, async) listening on {host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for t in tasks:
+            t.cancel()
+
+def start_async_server(host=HOST, port=PORT):
+    asyncio.run(serve_async(host, port))
+
 if __name__ == "__main__":
-    start_server()
+    parser = argparse.ArgumentParser(description="Run C - compare logger")
+    parser.add_argument("--mode", choices=("thread", "async"), default="async",
+                        help="async: framed persistent connections (also takes unframed JSON); "
+                             "thread: one thread per connection, unframed JSON only (legacy)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--shards", type=int, default=0,
+                        help="Reconcile in N worker processes partitioned by item code (0 = in-process)")
+    parser.add_argument("--checkpoint-interval", type=int, default=CHECKPOINT_INTERVAL,
+                        help="Seconds between state checkpoints (0 disables restore and checkpoints)")
+    parser.add_argument("--search-port", type=int, default=0,
+                        help=f"Serve item search on this port (e.g. {c_search.SEARCH_PORT}; 0 = off)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="Serve /metrics and /traces on this port (0 = off)")
+    parser.add_argument("--reconcile-interval", type=int, default=RECONCILE_INTERVAL,
+                        help="Seconds between full QTY/VAL reconciliations in compare_log.txt (0 = off)")
+    args = parser.parse_args()
+    RECONCILE_INTERVAL = args.reconcile_interval
+    if RECONCILE_INTERVAL and c_reconcile is None:
+        print("[C] --reconcile-interval needs numpy; reconciliation disabled")
+    metrics.start_metrics_server(args.metrics_port)
+    SEARCH = bool(args.search_port)
+
+    if args.shards:
+        from c_shard import ShardedEngine
+        engine = ShardedEngine(args.shards, checkpoint_interval=args.checkpoint_interval,
+                               search=SEARCH)
+        engine.start()
+    elif args.checkpoint_interval:
+        restore_state()
+        start_checkpointer(interval=args.checkpoint_interval)
+
+    if SEARCH:
+        if engine is not None:
+            engine.load_search()
+        else:
+            with lock:
+                c_search.load_latest(index.latest)
+        c_search.start_search_server(args.host, args.search_port)
+
+    if args.mode == "async":
+        start_async_server(args.host, args.port)
+    else:
+        HOST, PORT = args.host, args.port
+        start_server()
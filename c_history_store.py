@@ -0,0 +1,171 @@
+# c_history_store.py
+# Bounded in-memory history for C.
+#
+# Per item code we keep a small bounded list (a ring trimmed from the front)
+# of (epoch, rest) tuples with interned strings; a deque costs ~600 bytes
+# even when empty, a one-element list under 100. Versions pushed out of the
+# ring, or older than the max age, are dropped or, with spill enabled,
+# appended to a flat file that is read back through mmap. The latest version of a code is
+# never expired since reconciliation depends on it.
+import os
+import re
+import sys
+import mmap
+import time
+import struct
+
+MAX_VERSIONS = 16          # versions kept in memory per code
+MAX_AGE = 7 * 24 * 3600    # seconds; None keeps versions until pushed out
+PRUNE_INTERVAL = 300       # seconds between full max-age sweeps
+
+SPILL_RECORD = struct.Struct("!qHI")  # epoch, len(code), len(rest)
+
+# Version recorded when A stops listing a code (a tombstone); such a code is
+# kept in history but is not current on that side
+REMOVED = "<removed>"
+
+def store_key(source, endpoint=None):
+    """History/journal key of a message: "A", "B", or "B-<endpoint>" when B
+    tags its batch with the A front-end it pulled from (file-name safe)."""
+    if source != "B" or not endpoint:
+        return source
+    return "B-" + (re.sub(r"[^A-Za-z0-9.]+", "_", endpoint).strip("_") or "_")
+
+def side_of(key):
+    """The side ("A" or "B") a history key reconciles on."""
+    return key.split("-", 1)[0]
+
+def format_ts(epoch):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(epoch))
+
+class HistoryStore:
+    """History of one source (A or B), keyed by item code."""
+
+    def __init__(self, max_versions=MAX_VERSIONS, max_age=MAX_AGE, spill_path=None):
+        self.max_versions = max_versions
+        self.max_age = max_age
+        self.spill_path = spill_path
+        self._codes = {}
+        self._spill = open(spill_path, "ab") if spill_path else None
+        self._spilled = 0
+        self._evicted = 0
+        self._last_prune = time.time()
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __contains__(self, code):
+        return code in self._codes
+
+    def codes(self):
+        return self._codes.keys()
+
+    def last(self, code):
+        """Latest (epoch, rest) for a code, or None."""
+        ring = self._codes.get(code)
+        return ring[-1] if ring else None
+
+    def versions(self, code):
+        """In-memory versions of a code, oldest first."""
+        return list(self._codes.get(code, ()))
+
+    def items(self):
+        """Yield (code, [(epoch, rest), ...]) for every code in memory."""
+        for code, ring in self._codes.items():
+            yield code, list(ring)
+
+    def append(self, code, epoch, rest):
+        code = sys.intern(code)
+        rest = sys.intern(rest)
+        ring = self._codes.get(code)
+        if ring is None:
+            ring = self._codes[code] = []
+        ring.append((epoch, rest))
+        while len(ring) > self.max_versions:
+            self._evict(code, ring.pop(0))
+        if self.max_age is not None:
+            self._expire(code, ring, epoch - self.max_age)
+        if epoch - self._last_prune >= PRUNE_INTERVAL:
+            self.prune(epoch)
+
+    def load(self, code, versions):
+        """Bulk-restore a code's versions (e.g. from a checkpoint), oldest first."""
+        intern = sys.intern
+        self._codes[intern(code)] = [(epoch, intern(rest))
+                                     for epoch, rest in versions[-self.max_versions:]]
+
+    def _evict(self, code, version):
+        self._evicted += 1
+        if self._spill:
+            epoch, rest = version
+            c, r = code.encode("utf-8"), rest.encode("utf-8")
+            self._spill.write(SPILL_RECORD.pack(epoch, len(c), len(r)) + c + r)
+            self._spilled += 1
+
+    def _expire(self, code, ring, cutoff):
+        while len(ring) > 1 and ring[0][0] < cutoff:
+            self._evict(code, ring.pop(0))
+
+    def prune(self, now=None):
+        """Expire versions older than max_age across all codes."""
+        now = time.time() if now is None else now
+        self._last_prune = now
+        if self.max_age is None:
+            return
+        cutoff = now - self.max_age
+        for code, ring in self._codes.items():
+            self._expire(code, ring, cutoff)
+
+    def spilled(self, code=None):
+        """Yield (code, epoch, rest) from the spill file, oldest first."""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        if self._spill:
+            self._spill.flush()
+        with open(self.spill_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                want = code.encode("utf-8") if code is not None else None
+                pos, end = 0, len(m)
+                while pos + SPILL_RECORD.size <= end:
+                    epoch, clen, rlen = SPILL_RECORD.unpack_from(m, pos)
+                    pos += SPILL_RECORD.size
+                    c = m[pos:pos + clen]
+                    pos += clen
+                    if want is None or c == want:
+                        yield c.decode("utf-8"), epoch, m[pos:pos + rlen].decode("utf-8")
+                    pos += rlen
+
+    def memory_report(self):
+        """Approximate memory held by this store, for host sizing."""
+        rings = versions = tuples = 0
+        strings = {}
+        for code, ring in self._codes.items():
+            rings += sys.getsizeof(ring)
+            versions += len(ring)
+            strings[id(code)] = code
+            for version in ring:
+                tuples += sys.getsizeof(version) + sys.getsizeof(version[0])
+                strings[id(version[1])] = version[1]
+        string_bytes = sum(sys.getsizeof(s) for s in strings.values())
+        index_bytes = sys.getsizeof(self._codes)
+        return {
+            "codes": len(self._codes),
+            "versions": versions,
+            "unique_strings": len(strings),
+            "bytes_index": index_bytes,
+            "bytes_rings": rings,
+            "bytes_versions": tuples,
+            "bytes_strings": string_bytes,
+            "bytes_total": index_bytes + rings + tuples + string_bytes,
+            "evicted": self._evicted,
+            "spilled": self._spilled,
+            "spill_file_bytes": os.path.getsize(self.spill_path)
+                if self.spill_path and os.path.exists(self.spill_path) else 0,
+        }
+
+    def close(self):
+        if self._spill:
+            self._spill.close()
+            self._spill = None
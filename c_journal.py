@@ -0,0 +1,203 @@
+# c_journal.py
+# Append-only history journal for C.
+#
+# Each add_to_history call appends only the records it added, as lines of
+#   "<timestamp> | <code> <rest>"
+# to the active segment history_<source>.<seq>.log. Segments rotate on size
+# or age; `compact` folds closed segments into the snapshot history_<source>.txt.
+#
+# Usage (with C stopped; a running C compacts via Journal.compact):
+#   python c_journal.py compact A B [--dir .]
+import os
+import re
+import time
+import glob
+import argparse
+import threading
+
+JOURNAL_DIR = "."
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+SEGMENT_MAX_AGE = 24 * 3600     # seconds
+FSYNC_INTERVAL = 1.0            # seconds; 0 = fsync every append, None = never
+BUFFER_SIZE = 1024 * 1024
+
+def snapshot_path(source, directory=JOURNAL_DIR):
+    return os.path.join(directory, f"history_{source}.txt")
+
+def segment_path(source, seq, directory=JOURNAL_DIR):
+    return os.path.join(directory, f"history_{source}.{seq:08d}.log")
+
+def list_segments(source, directory=JOURNAL_DIR):
+    """Return [(seq, path)] for all segments of a source, oldest first."""
+    pattern = re.compile(rf"history_{re.escape(source)}\.(\d{{8}})\.log$")
+    found = []
+    for path in glob.glob(os.path.join(directory, f"history_{source}.*.log")):
+        m = pattern.search(os.path.basename(path))
+        if m:
+            found.append((int(m.group(1)), path))
+    return sorted(found)
+
+def list_sources(directory=JOURNAL_DIR):
+    """Return the sources with a snapshot or segments in `directory`, sorted."""
+    pattern = re.compile(r"history_(.+?)(?:\.\d{8}\.log|\.txt)$")
+    found = set()
+    for name in os.listdir(directory):
+        m = pattern.match(name)
+        if m:
+            found.add(m.group(1))
+    return sorted(found)
+
+def format_record(ts, code, rest):
+    return f"{ts} | {code} {rest}\n"
+
+def parse_record(line):
+    """Inverse of format_record; returns (ts, code, rest) or None."""
+    ts, sep, body = line.rstrip("\n").partition(" | ")
+    if not sep:
+        return None
+    parts = body.split(" ", 1)
+    if len(parts) < 2:
+        return None
+    return ts, parts[0], parts[1]
+
+class Journal:
+    """Buffered, rotating append-only writer for one source."""
+
+    def __init__(self, source, directory=JOURNAL_DIR, max_bytes=SEGMENT_MAX_BYTES,
+                 max_age=SEGMENT_MAX_AGE, fsync_interval=FSYNC_INTERVAL,
+                 buffer_size=BUFFER_SIZE):
+        self.source = source
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.fsync_interval = fsync_interval
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._closed = False
+        os.makedirs(directory, exist_ok=True)
+        segments = list_segments(source, directory)
+        self.seq = segments[-1][0] + 1 if segments else 1
+        self._open_segment()
+        if fsync_interval:
+            # Group commit: one fsync per interval covers every append since the last.
+            threading.Thread(target=self._sync_loop, daemon=True).start()
+
+    def _open_segment(self):
+        self.path = segment_path(self.source, self.seq, self.directory)
+        self._f = open(self.path, "a", buffering=self.buffer_size)
+        self._opened = time.time()
+
+    def _sync_locked(self):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._dirty = False
+
+    def _sync_loop(self):
+        while not self._closed:
+            time.sleep(self.fsync_interval)
+            with self._lock:
+                if self._dirty and not self._closed:
+                    self._sync_locked()
+
+    def _rotate_locked(self):
+        self._sync_locked()
+        self._f.close()
+        self.seq += 1
+        self._open_segment()
+
+    def append(self, records):
+        """Append (ts, code, rest) records; rotates the segment when due."""
+        if not records:
+            return
+        with self._lock:
+            self._f.write("".join(format_record(ts, code, rest) for ts, code, rest in records))
+            self._dirty = True
+            if self.fsync_interval == 0:
+                self._sync_locked()
+            if (self._f.tell() >= self.max_bytes
+                    or time.time() - self._opened >= self.max_age):
+                self._rotate_locked()
+
+    def position(self):
+        """Flush and return (segment seq, byte offset) of the journal end."""
+        with self._lock:
+            self._f.flush()
+            return self.seq, self._f.tell()
+
+    def rotate(self):
+        with self._lock:
+            self._rotate_locked()
+
+    def flush(self):
+        with self._lock:
+            self._sync_locked()
+
+    def compact(self, before=None):
+        """Fold closed segments with seq < `before` (default: all) into the snapshot."""
+        if before is None:
+            with self._lock:
+                self._rotate_locked()
+                before = self.seq
+        return compact(self.source, self.directory, before=min(before, self.seq))
+
+    def close(self):
+        with self._lock:
+            if not self._closed:
+                self._sync_locked()
+                self._f.close()
+                self._closed = True
+
+def iter_records(source, directory=JOURNAL_DIR, segments=None, snapshot=True):
+    """Yield (ts, code, rest) from the snapshot and then the segments."""
+    paths = [snapshot_path(source, directory)] if snapshot else []
+    if segments is None:
+        segments = list_segments(source, directory)
+    paths += [p for _, p in segments]
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            for line in f:
+                rec = parse_record(line)
+                if rec:
+                    yield rec
+
+def compact(source, directory=JOURNAL_DIR, before=None):
+    """Rebuild history_<source>.txt from the snapshot plus closed segments.
+
+    Consecutive identical values for a code are dropped, which also cleans up
+    snapshots written by the old full-rewrite add_to_history. Segments with
+    seq >= `before` are left alone. Returns the number of records kept.
+    """
+    segments = [(seq, p) for seq, p in list_segments(source, directory)
+                if before is None or seq < before]
+    last = {}
+    kept = 0
+    out = snapshot_path(source, directory)
+    tmp = out + ".tmp"
+    with open(tmp, "w", buffering=BUFFER_SIZE) as f:
+        for ts, code, rest in iter_records(source, directory, segments):
+            if last.get(code) == rest:
+                continue
+            last[code] = rest
+            f.write(format_record(ts, code, rest))
+            kept += 1
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, out)
+    for _, path in segments:
+        os.remove(path)
+    return kept
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="C history journal tools")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_compact = sub.add_parser("compact", help="Fold segments into history_<source>.txt")
+    p_compact.add_argument("sources", nargs="+")
+    p_compact.add_argument("--dir", default=JOURNAL_DIR)
+    args = parser.parse_args()
+
+    for src in args.sources:
+        n = compact(src, args.dir)
+        print(f"[journal] {src}: {n} records in {snapshot_path(src, args.dir)}")
@@ -0,0 +1,369 @@
+# c_reconcile.py
+# Vectorized bulk reconciliation of A against B (needs numpy).
+#
+# ReconciliationIndex in c_compare_logger.py only knows whether a code is
+# present on one side or on both. This module compares the latest A and B
+# line of every code in one pass over NumPy columns and reports codes missing
+# on either side, codes on both sides with a different QTY or VAL, and the
+# total value (sum of QTY * VAL) held by each side and its drift.
+#
+# Lines are parsed straight from bytes: newline, space and " | " positions
+# come from vectorized searches and QTY/VAL are decoded one character column
+# at a time, so there is no per-line Python work. Each side is cut down to
+# its latest line per code with a stable sort, and the two sorted sides are
+# merged with searchsorted. Codes that are all plain decimals are joined as
+# int64, anything else as fixed-width bytes. A history record "<code> <removed>"
+# (a code A stopped listing) is a tombstone: if it is a code's last record,
+# the code is absent on that side.
+#
+# Used by C (log_difference every RECONCILE_INTERVAL, {"query": "reconcile"})
+# and offline over the snapshots and journal segments of both sources
+# (B's per-endpoint histories, history_B-<endpoint>, count as one side):
+#   python c_reconcile.py [--dir .] [--limit 20] [--json]
+#   python c_reconcile.py history_A.txt history_B.txt
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+
+from c_journal import JOURNAL_DIR, snapshot_path, list_segments, list_sources
+from c_history_store import REMOVED, side_of
+
+CHUNK_BYTES = 64 * 1024 * 1024  # file bytes parsed per pass (bounds memory)
+NUMBER_WIDTH = 24               # longer QTY/VAL fields count as unparsable
+INT_CODE_DIGITS = 18            # decimal codes up to this long are joined as int64
+LIMIT = 20                      # mismatches listed per kind, largest first
+
+NL, CR, SPACE, BAR, DOT, MINUS, PLUS, ZERO, NINE = b"\n\r |.-+09"
+TOMBSTONE = REMOVED.encode("utf-8")
+
+class Columns:
+    """Code / qty / val columns of one side; `skipped` lines did not parse.
+
+    `removed` marks tombstone rows (None when there are none).
+    """
+
+    def __init__(self, codes, qtys, vals, skipped=0, removed=None):
+        self.codes, self.qtys, self.vals = codes, qtys, vals
+        self.skipped = skipped
+        self.removed = removed
+
+    def __len__(self):
+        return len(self.codes)
+
+def _empty(skipped=0):
+    return Columns(np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.float64), skipped)
+
+def _numbers(buf, start, end):
+    """Decode buf[start:end] of each row as a decimal -> (mantissa, decimals, ok)."""
+    n = len(start)
+    width = end - start
+    mant = np.zeros(n, np.int64)
+    frac = np.zeros(n, np.int8)
+    digits = np.zeros(n, np.int8)
+    dots = np.zeros(n, np.int8)
+    ok = (width > 0) & (width <= NUMBER_WIDTH)
+    first = buf.take(start, mode="clip")
+    neg = first == MINUS
+    sign = neg | (first == PLUS)
+    for k in range(min(int(width.max(initial=0)), NUMBER_WIDTH)):
+        active = k < width
+        d = buf.take(start + k, mode="clip") - np.uint8(ZERO)  # non-digits wrap to >= 10
+        is_digit = d < 10
+        is_digit &= active
+        is_dot = d == np.uint8((DOT - ZERO) % 256)
+        is_dot &= active
+        bad = active & ~is_digit & ~is_dot
+        if k == 0:
+            bad &= ~sign
+        ok &= ~bad
+        mant *= np.where(is_digit, 10, 1)
+        mant += d * is_digit
+        frac += is_digit & (dots > 0)
+        digits += is_digit
+        dots += is_dot
+    ok &= (digits > 0) & (digits <= 18) & (dots <= 1)
+    np.negative(mant, out=mant, where=neg)
+    return mant, frac, ok
+
+def _code_keys(buf, start, end):
+    """int64 keys when every code is a canonical decimal, else fixed-width bytes."""
+    width = end - start
+    mant, frac, ok = _numbers(buf, start, end)
+    lead = buf[np.minimum(start, len(buf) - 1)]
+    if (ok & (frac == 0) & (width <= INT_CODE_DIGITS) & (lead >= ZERO) & (lead <= NINE)
+            & ((lead != ZERO) | (width == 1))).all():
+        return mant
+    w = max(int(width.max(initial=1)), 1)
+    out = np.zeros((len(start), w), np.uint8)
+    last = len(buf) - 1
+    for k in range(w):
+        out[:, k] = np.where(k < width, buf[np.minimum(start + k, last)], 0)
+    return out.view(f"S{w}").ravel()
+
+def parse(data, records=False):
+    """Columns for the "<code> <desc> <qty> <val>" lines in `data` (bytes).
+
+    With `records` the lines are journal records "<ts> | <code> ...". Lines
+    that don't split that way, or whose QTY is not an integer, are skipped;
+    a VAL that is not a number is kept as NaN. "<code> <removed>" lines are
+    kept as tombstone rows (QTY 0, VAL NaN, marked in `removed`).
+    """
+    buf = np.frombuffer(data, np.uint8)
+    if not len(buf):
+        return _empty()
+    ends = np.flatnonzero(buf == NL)
+    if not len(ends) or ends[-1] != len(buf) - 1:
+        ends = np.append(ends, len(buf))
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    ends = ends - ((ends > starts) & (buf[np.maximum(ends - 1, 0)] == CR))  # CRLF files
+    keep = ends > starts
+    lines = int(keep.sum())
+    spaces = np.flatnonzero(buf == SPACE)
+    if not len(spaces):
+        return _empty(lines)
+    last = len(buf) - 1
+    if records:
+        # the code starts after the first " | " of the line; timestamps
+        # usually have one width, so try the first line's bar column first
+        bar = starts + max(bytes(data[:200]).find(b" | ") + 1, 1)
+        if not ((buf.take(bar, mode="clip") == BAR) | ~keep).all():
+            bars = np.flatnonzero(buf == BAR)
+            if not len(bars):
+                return _empty(lines)
+            j = np.searchsorted(bars, starts)
+            bar = bars[np.minimum(j, len(bars) - 1)]
+            keep &= j < len(bars)
+        keep &= (bar > starts) & (bar + 2 < ends)
+        bar = np.where(keep, bar, 1)
+        keep &= (buf[bar - 1] == SPACE) & (buf[np.minimum(bar + 1, last)] == SPACE)
+        code_start = bar + 2
+    else:
+        code_start = starts
+    # the code ends at the first space; QTY and VAL are the last two fields
+    i_code = np.searchsorted(spaces, code_start)
+    tomb = keep & (i_code < len(spaces))
+    tomb_end = spaces[np.minimum(i_code, len(spaces) - 1)]
+    tomb &= (tomb_end > code_start) & (ends - tomb_end - 1 == len(TOMBSTONE))
+    for k, ch in enumerate(TOMBSTONE):
+        tomb &= buf.take(tomb_end + 1 + k, mode="clip") == ch
+    keep &= ~tomb
+    i_val = np.searchsorted(spaces, ends) - 1
+    keep &= (i_code < len(spaces)) & (i_val - 1 > i_code)
+    i_code = np.where(keep, i_code, 0)
+    i_val = np.where(keep, i_val, min(1, len(spaces) - 1))
+    code_end, qty_sp, val_sp = spaces[i_code], spaces[i_val - 1], spaces[i_val]
+    keep &= (code_end > code_start) & (val_sp + 1 < ends)
+
+    rows = np.flatnonzero(keep)
+    qty, qty_frac, qty_ok = _numbers(buf, qty_sp[rows] + 1, val_sp[rows])
+    good = rows[qty_ok & (qty_frac == 0)]
+    val, val_frac, val_ok = _numbers(buf, val_sp[good] + 1, ends[good])
+    vals = np.where(val_ok, val / np.power(10.0, val_frac), np.nan)
+    codes = _code_keys(buf, code_start[good], code_end[good])
+    qtys = qty[qty_ok & (qty_frac == 0)]
+    gone = np.flatnonzero(tomb)
+    if not len(gone):
+        return Columns(codes, qtys, vals, lines - len(good))
+    # merge the tombstone rows back in file order
+    order = np.argsort(np.concatenate([good, gone]), kind="stable")
+    codes, gone_codes = _common(codes, _code_keys(buf, code_start[gone], tomb_end[gone]))
+    return Columns(np.concatenate([codes, gone_codes])[order],
+                   np.concatenate([qtys, np.zeros(len(gone), np.int64)])[order],
+                   np.concatenate([vals, np.full(len(gone), np.nan)])[order],
+                   lines - len(good) - len(gone),
+                   np.concatenate([np.zeros(len(good), bool), np.ones(len(gone), bool)])[order])
+
+def _common(*arrays):
+    """Same key dtype everywhere: int64 only if every array is int64."""
+    if all(a.dtype.kind == "i" for a in arrays):
+        return arrays
+    arrays = [a.astype("S") if a.dtype.kind == "i" else a for a in arrays]
+    dtype = np.result_type(*arrays)
+    return [a.astype(dtype) for a in arrays]
+
+def concat(parts):
+    """One Columns from several (e.g. one per file or chunk), in order."""
+    parts = [p for p in parts if len(p)] or [_empty()]
+    skipped = sum(p.skipped for p in parts)
+    if len(parts) == 1:
+        return Columns(parts[0].codes, parts[0].qtys, parts[0].vals, skipped, parts[0].removed)
+    codes = np.concatenate(_common(*[p.codes for p in parts]))
+    removed = None
+    if any(p.removed is not None for p in parts):
+        removed = np.concatenate([np.zeros(len(p), bool) if p.removed is None else p.removed
+                                  for p in parts])
+    return Columns(codes, np.concatenate([p.qtys for p in parts]),
+                   np.concatenate([p.vals for p in parts]), skipped, removed)
+
+def latest(cols):
+    """The last line of every code, sorted by code; codes whose last line is a tombstone are dropped."""
+    order = np.argsort(cols.codes, kind="stable")
+    codes = cols.codes[order]
+    last = np.ones(len(codes), bool)
+    last[:-1] = codes[1:] != codes[:-1]
+    if cols.removed is not None:
+        last &= ~cols.removed[order]
+    rows = order[last]
+    return Columns(codes[last], cols.qtys[rows], cols.vals[rows], cols.skipped)
+
+def _code_text(code):
+    return code.decode("utf-8", "replace") if isinstance(code, bytes) else str(int(code))
+
+def _largest(weights, limit):
+    """Indices of the `limit` largest weights, largest first (NaN last)."""
+    weights = np.nan_to_num(weights, nan=-np.inf)
+    if len(weights) > limit:
+        top = np.argpartition(-weights, limit)[:limit]
+    else:
+        top = np.arange(len(weights))
+    return top[np.argsort(-weights[top], kind="stable")]
+
+def reconcile(a, b, limit=LIMIT):
+    """Report comparing the latest line per code of `a` and `b` (Columns).
+
+    Counts and totals cover every code; the code lists hold the `limit`
+    largest entries of each kind (by value for one-sided codes, by absolute
+    delta for mismatches).
+    """
+    started = time.perf_counter()
+    a_codes, b_codes = _common(a.codes, b.codes)
+    a = latest(Columns(a_codes, a.qtys, a.vals, a.skipped, a.removed))
+    b = latest(Columns(b_codes, b.qtys, b.vals, b.skipped, b.removed))
+    # merge the two sorted code columns
+    pos = np.searchsorted(b.codes, a.codes)
+    hit = pos < len(b.codes)
+    hit[hit] = b.codes[pos[hit]] == a.codes[hit]
+    ia, ib = np.flatnonzero(hit), pos[hit]
+    only_a = np.flatnonzero(~hit)
+    b_hit = np.zeros(len(b.codes), bool)
+    b_hit[ib] = True
+    only_b = np.flatnonzero(~b_hit)
+
+    a_value, b_value = a.qtys * a.vals, b.qtys * b.vals
+    qty_delta = b.qtys[ib] - a.qtys[ia]
+    va, vb = a.vals[ia], b.vals[ib]
+    val_delta = vb - va
+    qty_diff = np.flatnonzero(qty_delta != 0)
+    val_diff = np.flatnonzero((va != vb) & ~(np.isnan(va) & np.isnan(vb)))
+    total_a, total_b = float(np.nansum(a_value)), float(np.nansum(b_value))
+
+    def side(cols, value, only):
+        return {"codes": len(cols), "only": len(only), "skipped": cols.skipped,
+                "total_value": round(float(np.nansum(value)), 6),
+                "only_value": round(float(np.nansum(value[only])), 6)}
+
+    report = {
+        "A": side(a, a_value, only_a),
+        "B": side(b, b_value, only_b),
+        "matched": len(ia),
+        "qty_mismatches": len(qty_diff),
+        "value_mismatches": len(val_diff),
+        "qty_delta": int(qty_delta.sum()),
+        "value_drift": round(total_b - total_a, 6),
+        "only_A": [_code_text(a.codes[i]) for i in only_a[_largest(a_value[only_a], limit)]],
+        "only_B": [_code_text(b.codes[i]) for i in only_b[_largest(b_value[only_b], limit)]],
+        "qty_diffs": [[_code_text(a.codes[ia[i]]), int(a.qtys[ia[i]]), int(b.qtys[ib[i]])]
+                      for i in qty_diff[_largest(np.abs(qty_delta[qty_diff]), limit)]],
+        "value_diffs": [[_code_text(a.codes[ia[i]]), _num(va[i]), _num(vb[i])]
+                        for i in val_diff[_largest(np.abs(val_delta[val_diff]), limit)]],
+    }
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+def _num(x):
+    return None if np.isnan(x) else float(x)
+
+def from_latest(pairs):
+    """Columns from C's in-memory latest lines: {code: rest} or [(code, rest)]."""
+    if isinstance(pairs, dict):
+        pairs = pairs.items()
+    return parse("\n".join(map(" ".join, pairs)).encode("utf-8"))
+
+def reconcile_latest(latest_a, latest_b, limit=LIMIT):
+    return reconcile(from_latest(latest_a), from_latest(latest_b), limit)
+
+def read_file(path, records=None):
+    """Columns for one file of item lines or journal records, in file order.
+
+    `records` None sniffs the first line for " | ".
+    """
+    parts = []
+    with open(path, "rb") as f:
+        tail = b""
+        while True:
+            chunk = f.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            chunk = tail + chunk
+            cut = chunk.rfind(b"\n") + 1
+            tail = chunk[cut:]
+            if cut:
+                if records is None:
+                    records = b" | " in chunk[:chunk.find(b"\n")]
+                parts.append(parse(chunk[:cut], records))
+        if tail:
+            parts.append(parse(tail, b" | " in tail if records is None else records))
+    return concat(parts)
+
+def history_paths(source, directory=JOURNAL_DIR):
+    """Snapshot then journal segments of a source, oldest first."""
+    paths = [snapshot_path(source, directory)] + [p for _, p in list_segments(source, directory)]
+    return [p for p in paths if os.path.exists(p)]
+
+def read_history(source, directory=JOURNAL_DIR):
+    return concat([read_file(p, records=True) for p in history_paths(source, directory)])
+
+def read_side(side, directory=JOURNAL_DIR):
+    """Current lines of one side: the history of `side` itself, or for B
+    with per-endpoint histories (B-<endpoint>) the union of their latest lines."""
+    keys = [k for k in list_sources(directory) if side_of(k) == side]
+    if keys in ([], [side]):
+        return read_history(side, directory)
+    return concat([latest(read_history(k, directory)) for k in keys])
+
+def format_report(report):
+    lines = []
+    for src in ("A", "B"):
+        s = report[src]
+        lines.append(f"{src}: {s['codes']} codes, {s['only']} only in {src} "
+                     f"(value {s['only_value']:.2f}), total value {s['total_value']:.2f}"
+                     + (f", {s['skipped']} lines skipped" if s["skipped"] else ""))
+    lines.append(f"Matched: {report['matched']}, QTY mismatches: {report['qty_mismatches']} "
+                 f"(net B-A {report['qty_delta']:+d}), VAL mismatches: {report['value_mismatches']}")
+    lines.append(f"Total value drift B-A: {report['value_drift']:+.2f}")
+    lines.append(f"Only in A: {report['only_A']}")
+    lines.append(f"Only in B: {report['only_B']}")
+    lines.append(f"QTY A->B: {[f'{c} {x}->{y}' for c, x, y in report['qty_diffs']]}")
+    lines.append(f"VAL A->B: {[f'{c} {x}->{y}' for c, x, y in report['value_diffs']]}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile A against B: missing codes, QTY/VAL deltas, value drift")
+    parser.add_argument("files", nargs="*", metavar="A_FILE B_FILE",
+                        help="Item line or history files (default: snapshots + journal segments in --dir)")
+    parser.add_argument("--dir", default=JOURNAL_DIR)
+    parser.add_argument("--limit", type=int, default=LIMIT, help="Codes listed per kind")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+    if args.files and len(args.files) != 2:
+        parser.error("give both an A file and a B file, or neither")
+
+    started = time.perf_counter()
+    if args.files:
+        a, b = read_file(args.files[0]), read_file(args.files[1])
+    else:
+        a, b = read_side("A", args.dir), read_side("B", args.dir)
+    loaded = time.perf_counter()
+    report = reconcile(a, b, args.limit)
+    report["load_seconds"] = round(loaded - started, 3)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report))
+        print(f"[reconcile] {len(a) + len(b)} lines loaded in {report['load_seconds']}s, "
+              f"reconciled in {report['seconds']}s")
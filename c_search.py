@@ -0,0 +1,396 @@
+# c_search.py
+# Search over C's current A/B item lines.
+#
+# One SearchIndex per source keeps the latest line of every item code and:
+#   - a trigram index over "<code> <desc>" (lowercase), plus word-prefix keys
+#     for 1-2 character terms, as array('I') posting lists
+#   - integer buckets for QTY and VAL, with sorted bucket keys for ranges
+# A query walks the shortest posting list (or the value buckets) its terms
+# allow and checks each candidate against the full query, so postings may
+# hold stale ids: an update only appends the keys a line gained, and a removed
+# code's doc id is retired. add_to_history feeds changes in as they arrive.
+#
+# Query syntax (terms are ANDed, case-insensitive; field names as in
+# search.html's field table):
+#   drill             substring of code or description (1-2 chars: word prefix)
+#   cord*             a word starting with "cord"
+#   lineno:101        exact line number;  lineno:10*  line numbers starting 10
+#   desc:hammer       substring of the description;  desc:ham*  word prefix
+#   qty:2  qty:>=2  val:<50  val:10..20   numeric comparisons and ranges
+#
+# Service (started by c_compare_logger.py --search-port):
+#   GET /search?q=<query>&side=A|B&offset=0&limit=50
+import math
+import time
+import json
+import shlex
+import bisect
+import threading
+from array import array
+from itertools import chain
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SEARCH_PORT = 5001
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+EXACT_COUNT_LIMIT = 5000    # candidates checked in full to give an exact total
+PROBE = 1000                # candidates checked before narrowing a sparse query
+INTERSECT_MAX = 200000      # longest second list worth intersecting with
+STALE_REBUILD = 0.5         # rebuild postings once stale entries exceed this share
+
+FIELDS = ("lineno", "desc", "qty", "val")
+
+def parse_line(code, rest):
+    """Split "<desc> <qty> <val>" into (desc, qty, val); numbers are None when absent."""
+    parts = rest.rsplit(" ", 2)
+    if len(parts) == 3:
+        try:
+            qty, val = float(parts[1]), float(parts[2].lstrip("Rr"))
+        except ValueError:
+            pass
+        else:
+            if math.isfinite(qty) and math.isfinite(val):  # "nan"/"inf" lines are text-only
+                return parts[0], qty, val
+    return rest, None, None
+
+def index_keys(text):
+    """Trigrams of the whole text plus "^x"/"^xy" keys for every word start."""
+    keys = {text[i:i + 3] for i in range(len(text) - 2)}
+    for word in text.split():
+        keys.add("^" + word[:1])
+        keys.add("^" + word[:2])
+    return keys
+
+def term_keys(term):
+    """Index keys a candidate must carry to contain `term` (or a word starting with it)."""
+    if len(term) < 3:
+        return ["^" + term]
+    return [term[i:i + 3] for i in range(len(term) - 2)]
+
+# --- query parsing ---
+def _number_range(spec):
+    """'2', '>=2', '<50', '10..20' -> (low, high, low_inclusive, high_inclusive)."""
+    if ".." in spec:
+        lo, hi = spec.split("..", 1)
+        return (float(lo) if lo else None, float(hi) if hi else None, True, True)
+    for op in (">=", "<=", ">", "<", "="):
+        if spec.startswith(op):
+            n = float(spec[len(op):])
+            return {">=": (n, None, True, True), "<=": (None, n, True, True),
+                    ">": (n, None, False, True), "<": (None, n, True, False),
+                    "=": (n, n, True, True)}[op]
+    n = float(spec)
+    return (n, n, True, True)
+
+def parse_query(q):
+    """Return a list of (kind, field, value) terms."""
+    try:
+        tokens = shlex.split(q)
+    except ValueError:
+        tokens = q.split()
+    terms = []
+    for tok in tokens:
+        field, sep, value = tok.partition(":")
+        if sep and field.lower() in FIELDS and value:
+            field = field.lower()
+            if field in ("qty", "val"):
+                try:
+                    terms.append(("range", field, _number_range(value)))
+                except ValueError:
+                    raise ValueError(f"Bad {field} filter: {value}")
+                continue
+        else:
+            field, value = None, tok
+        value = value.lower()
+        prefix = value.endswith("*")
+        value = value.rstrip("*")
+        if not value:
+            continue
+        if field == "lineno":
+            terms.append(("code_prefix" if prefix else "code", field, value))
+        elif prefix or len(value) < 3:
+            terms.append(("word_prefix", field, value))
+        else:
+            terms.append(("substring", field, value))
+    return terms
+
+def _in_range(x, rng):
+    lo, hi, lo_inc, hi_inc = rng
+    if x is None:
+        return False
+    if lo is not None and (x < lo or (x == lo and not lo_inc)):
+        return False
+    if hi is not None and (x > hi or (x == hi and not hi_inc)):
+        return False
+    return True
+
+class SearchIndex:
+    """Latest line per item code for one source, searchable."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.ids = {}      # code -> doc id
+        self.lines = []    # doc id -> "code rest"
+        self.texts = []    # doc id -> lowercase "code desc"
+        self.codelen = []  # doc id -> len(code), to split texts
+        self.numbers = {"qty": [], "val": []}
+        self.postings = {}  # key -> array('I') of doc ids
+        self.buckets = {"qty": {}, "val": {}}      # int(value) -> array('I')
+        self.bucket_keys = {"qty": [], "val": []}  # sorted bucket ints
+        self.entries = 0
+        self.stale = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --- updates ---
+    def _post(self, key, doc):
+        p = self.postings.get(key)
+        if p is None:
+            p = self.postings[key] = array("I")
+        p.append(doc)
+        self.entries += 1
+
+    def _bucket(self, field, value, doc):
+        if value is None:
+            return
+        b = int(value // 1)
+        arr = self.buckets[field].get(b)
+        if arr is None:
+            arr = self.buckets[field][b] = array("I")
+            bisect.insort(self.bucket_keys[field], b)
+        arr.append(doc)
+        self.entries += 1
+
+    def update(self, changes):
+        """Apply (code, rest) pairs; unchanged lines are skipped, rest None removes the code."""
+        with self.lock:
+            for code, rest in changes:
+                if rest is None:
+                    self._remove(code)
+                    continue
+                line = f"{code} {rest}"
+                desc, qty, val = parse_line(code, rest)
+                text = f"{code} {desc}".lower()
+                doc = self.ids.get(code)
+                if doc is None:
+                    doc = self.ids[code] = len(self.lines)
+                    self.lines.append(line)
+                    self.texts.append(text)
+                    self.codelen.append(len(code))
+                    self.numbers["qty"].append(qty)
+                    self.numbers["val"].append(val)
+                    for key in index_keys(text):
+                        self._post(key, doc)
+                    self._bucket("qty", qty, doc)
+                    self._bucket("val", val, doc)
+                    continue
+                if self.lines[doc] == line:
+                    continue
+                old_text = self.texts[doc]
+                self.lines[doc] = line
+                self.texts[doc] = text
+                if text != old_text:
+                    old_keys, new_keys = index_keys(old_text), index_keys(text)
+                    for key in new_keys - old_keys:
+                        self._post(key, doc)
+                    self.stale += len(old_keys - new_keys)
+                for field, value in (("qty", qty), ("val", val)):
+                    old = self.numbers[field][doc]
+                    self.numbers[field][doc] = value
+                    if (old is None) != (value is None) or (old is not None and old // 1 != value // 1):
+                        self._bucket(field, value, doc)
+                        self.stale += old is not None
+            if self.stale > STALE_REBUILD * max(self.entries, 1):
+                self.rebuild()
+
+    def _remove(self, code):
+        doc = self.ids.pop(code, None)
+        if doc is None:
+            return
+        # The doc id is retired: its postings go stale and _scan skips it
+        self.stale += len(index_keys(self.texts[doc]))
+        self.stale += sum(self.numbers[f][doc] is not None for f in ("qty", "val"))
+        self.lines[doc] = None
+        self.texts[doc] = ""
+        self.numbers["qty"][doc] = self.numbers["val"][doc] = None
+
+    def rebuild(self):
+        """Recreate postings and buckets from the current lines."""
+        with self.lock:
+            self.postings = {}
+            self.buckets = {"qty": {}, "val": {}}
+            self.bucket_keys = {"qty": [], "val": []}
+            self.entries = self.stale = 0
+            for doc, text in enumerate(self.texts):
+                if self.lines[doc] is None:
+                    continue
+                for key in index_keys(text):
+                    self._post(key, doc)
+                self._bucket("qty", self.numbers["qty"][doc], doc)
+                self._bucket("val", self.numbers["val"][doc], doc)
+
+    # --- queries ---
+    def _matches(self, doc, terms):
+        text = self.texts[doc]
+        for kind, field, value in terms:
+            if kind == "range":
+                if not _in_range(self.numbers[field][doc], value):
+                    return False
+                continue
+            code = text[:self.codelen[doc]]
+            if kind == "code":
+                ok = code == value
+            elif kind == "code_prefix":
+                ok = code.startswith(value)
+            else:
+                hay = text[self.codelen[doc] + 1:] if field == "desc" else text
+                if kind == "substring":
+                    ok = value in hay
+                else:
+                    ok = hay.startswith(value) or (" " + value) in hay
+            if not ok:
+                return False
+        return True
+
+    def _sources(self, terms):
+        """(size, [arrays of ids]) per term; None if some term can't match."""
+        sources = []
+        for kind, field, value in terms:
+            if kind == "range":
+                keys = self.bucket_keys[field]
+                lo, hi = value[0], value[1]
+                i = 0 if lo is None else bisect.bisect_left(keys, int(lo // 1))
+                j = len(keys) if hi is None else bisect.bisect_right(keys, int(hi // 1))
+                arrays = [self.buckets[field][k] for k in keys[i:j]]
+                sources.append((sum(len(a) for a in arrays), arrays))
+                continue
+            # Trigrams of one term are correlated; only its shortest list is used
+            shortest = None
+            for key in term_keys(value):
+                p = self.postings.get(key)
+                if p is None:
+                    return None
+                if shortest is None or len(p) < len(shortest):
+                    shortest = p
+            sources.append((len(shortest), [shortest]))
+        return sources
+
+    def _scan(self, ids, terms, offset, want, stop=True, budget=None):
+        """Check ids in order: (matches, page items, distinct ids checked, exhausted)."""
+        seen = set()
+        total = checked = 0
+        items = []
+        for doc in ids:
+            if doc in seen:
+                continue
+            seen.add(doc)
+            if self.lines[doc] is None:
+                continue
+            checked += 1
+            if self._matches(doc, terms):
+                if offset <= total < want:
+                    items.append(self.lines[doc])
+                total += 1
+                if stop and total >= want:
+                    return total, items, checked, False
+            if budget is not None and checked >= budget:
+                return total, items, checked, False
+        return total, items, checked, True
+
+    def search(self, q, offset=0, limit=DEFAULT_LIMIT):
+        """Return {"total", "exact", "items"} for one page of matches.
+
+        Candidates come from the shortest id list the terms allow. Short
+        lists are checked in full for an exact total. Long ones are checked
+        only until the page is full, and the total is estimated from the hit
+        rate; if PROBE candidates yield too few hits, the list is first
+        intersected with the next term's (C-level set ops beat checking
+        every candidate in Python).
+        """
+        terms = parse_query(q)
+        want = offset + limit
+        with self.lock:
+            sources = self._sources(terms)
+            if sources is None:
+                return {"total": 0, "exact": True, "items": []}
+            sources.sort(key=lambda s: s[0])
+            if sources:
+                size, arrays = sources[0]
+                ids = chain.from_iterable(arrays)
+            else:
+                size = len(self.lines)
+                ids = range(size)
+            if size > EXACT_COUNT_LIMIT:
+                narrow = len(sources) > 1 and sources[1][0] <= INTERSECT_MAX
+                total, items, checked, exhausted = self._scan(
+                    ids, terms, offset, want, budget=PROBE if narrow else None)
+                if exhausted or total >= want:
+                    return self._page(total, items, checked, size, exhausted)
+                found = set(chain.from_iterable(arrays))
+                found.intersection_update(chain.from_iterable(sources[1][1]))
+                size = len(found)
+                ids = sorted(found)
+            total, items, checked, exhausted = self._scan(
+                ids, terms, offset, want, stop=size > EXACT_COUNT_LIMIT)
+            return self._page(total, items, checked, size, exhausted)
+
+    @staticmethod
+    def _page(total, items, checked, size, exhausted):
+        if not exhausted:
+            total = max(total, round(size * total / max(checked, 1)))
+        return {"total": total, "exact": exhausted, "items": items}
+
+# Per-source indexes used by c_compare_logger
+indexes = {"A": SearchIndex(), "B": SearchIndex()}
+
+def update(source, changes):
+    indexes[source].update(changes)
+
+def load_latest(latest):
+    """Index C's current lines, {side: {code: rest}} (ReconciliationIndex.latest)."""
+    for side, lines in latest.items():
+        indexes[side].update(lines.items())
+
+# --- HTTP service ---
+class SearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path != "/search":
+            self.send_json(404, {"error": "Not Found"})
+            return
+        query = parse_qs(url.query)
+        q = query.get("q", [""])[0]
+        sides = [s for s in query.get("side", ["A,B"])[0].split(",") if s in indexes]
+        try:
+            offset = max(int(query.get("offset", ["0"])[0]), 0)
+            limit = min(max(int(query.get("limit", [str(DEFAULT_LIMIT)])[0]), 1), MAX_LIMIT)
+            start = time.perf_counter()
+            result = {side: indexes[side].search(q, offset, limit) for side in sides}
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        result["took_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        self.send_json(200, result)
+
+    def send_json(self, code, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Access-Control-Allow-Origin", "*")  # search.html may be opened from disk
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        return
+
+def start_search_server(host="0.0.0.0", port=SEARCH_PORT):
+    server = ThreadingHTTPServer((host, port), SearchHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[C] Search service on http://{host}:{port}/search")
+    return server
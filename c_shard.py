@@ -0,0 +1,213 @@
+# c_shard.py
+# Multi-process sharded reconciliation for C.
+#
+# Transactions are partitioned by a stable hash of the item code. Each shard
+# is a worker process with its own history, reconciliation index and journal
+# directory (shards/<n>/). The coordinator fans a message out to the shards
+# it touches without waiting for them, so several messages are in flight per
+# shard; when a message's last shard answers, the collector thread merges the
+# deltas into one compare_log.txt entry and feeds the lines the shards
+# actually changed to c_search. Each shard restores and checkpoints its own
+# state (shards/<n>/c_state.ckpt).
+#
+# Usage:
+#   python c_compare_logger.py --mode async --shards 16
+import os
+import zlib
+import itertools
+import threading
+import multiprocessing
+import concurrent.futures
+
+import c_search
+import c_compare_logger as c
+
+SHARD_DIR = "shards"
+INBOX_SIZE = 256   # messages queued per shard before the coordinator blocks
+PIPELINE = 4       # messages the async server keeps in flight per shard
+
+def shard_of(code, shards):
+    # crc32 rather than hash(): str hashes are salted per process, and a code
+    # must land on the same shard after a restart.
+    return zlib.crc32(code.encode("utf-8")) % shards
+
+def _shard_worker(shard_id, inbox, outbox, directory, checkpoint_interval, search):
+    os.makedirs(directory, exist_ok=True)
+    c.JOURNAL_DIR = directory
+    c.journals = {}
+    c.history = c.new_history(directory)
+    c.index = c.ReconciliationIndex()
+    c.lock = threading.Lock()
+    c.engine = None
+    if checkpoint_interval:
+        checkpoint_path = os.path.join(directory, c.CHECKPOINT_PATH)
+        c.restore_state(checkpoint_path)
+        c.start_checkpointer(checkpoint_path, checkpoint_interval)
+    while True:
+        msg = inbox.get()
+        if msg is None:
+            break
+        req_id, kind, arg = msg
+        try:
+            with c.lock:
+                result = _shard_request(kind, arg, search)
+            outbox.put((req_id, shard_id, result, None))
+        except Exception as e:
+            outbox.put((req_id, shard_id, None, str(e)))
+    for journal in c.journals.values():
+        journal.close()
+
+def _shard_request(kind, arg, search=False):
+    if kind == "apply":
+        source, items, removed = arg
+        added = c.add_to_history(source, items, removed)
+        new_a, new_b, resolved = c.index.drain()
+        # Only what this shard changed goes back for the coordinator's c_search
+        side = c.side_of(source)
+        changed = [(code, c.index.latest[side].get(code))
+                   for _, code, _ in added] if search else []
+        return (new_a, new_b, resolved,
+                len(c.index.only["A"]), len(c.index.only["B"]), changed)
+    if kind == "only_in":
+        return {"A": c.index.only_in("A"), "B": c.index.only_in("B")}
+    if kind == "memory":
+        return {src: store.memory_report() for src, store in c.history.items()}
+    if kind == "latest":
+        return {src: list(latest.items()) for src, latest in c.index.latest.items()}
+    raise ValueError(f"Unknown shard request: {kind}")
+
+class _Pending:
+    def __init__(self, waiting, finish):
+        self.waiting = waiting
+        self.finish = finish  # runs on the collector thread with {shard_id: result}
+        self.results = {}
+        self.error = None
+        self.future = concurrent.futures.Future()
+
+class ShardedEngine:
+    """Coordinator for N shard worker processes."""
+
+    def __init__(self, shards, directory=SHARD_DIR, checkpoint_interval=c.CHECKPOINT_INTERVAL,
+                 search=False, pipeline=PIPELINE):
+        self.shards = shards
+        self.pipeline = pipeline
+        self.search = search  # keep c_search's indexes current (they live in this process)
+        self.directory = directory
+        self.checkpoint_interval = checkpoint_interval
+        self._ctx = multiprocessing.get_context()
+        self._outbox = self._ctx.Queue()
+        self._inboxes = []
+        self._procs = []
+        self._ids = itertools.count()
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Open-code counts per shard, summed for the log line (collector thread only)
+        self._open = [(0, 0)] * shards
+
+    def start(self):
+        for i in range(self.shards):
+            inbox = self._ctx.Queue(INBOX_SIZE)
+            proc = self._ctx.Process(
+                target=_shard_worker,
+                args=(i, inbox, self._outbox, os.path.join(self.directory, str(i)),
+                      self.checkpoint_interval, self.search),
+                daemon=True)
+            proc.start()
+            self._inboxes.append(inbox)
+            self._procs.append(proc)
+        threading.Thread(target=self._collect, daemon=True).start()
+        print(f"[C] Started {self.shards} reconciliation shards")
+
+    def stop(self):
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for proc in self._procs:
+            proc.join()
+
+    def _collect(self):
+        while True:
+            req_id, shard_id, result, error = self._outbox.get()
+            with self._lock:
+                pending = self._pending[req_id]
+                if error:
+                    pending.error = error
+                pending.results[shard_id] = result
+                pending.waiting -= 1
+                finished = pending.waiting == 0
+                if finished:
+                    del self._pending[req_id]
+            if not finished:
+                continue
+            try:
+                if pending.error:
+                    raise RuntimeError(pending.error)
+                pending.future.set_result(pending.finish(pending.results))
+            except Exception as e:
+                pending.future.set_exception(e)
+
+    def _request(self, parts, finish=lambda results: results):
+        """Send {shard_id: (kind, arg)}; the future gets finish(answers) once all shards answered."""
+        req_id = next(self._ids)
+        pending = _Pending(len(parts), finish)
+        with self._lock:
+            self._pending[req_id] = pending
+        for shard_id, (kind, arg) in parts.items():
+            self._inboxes[shard_id].put((req_id, kind, arg))
+        return pending.future
+
+    def submit(self, source, items, removed=()):
+        """Partition one A/B message across shards without waiting for them.
+
+        Returns a concurrent.futures.Future that completes once every shard
+        has applied its part and the merged delta is logged. Messages reach
+        each shard in submission order.
+        """
+        split = {}
+        for t in items:
+            code = t.split(" ", 1)[0]
+            split.setdefault(shard_of(code, self.shards), ([], []))[0].append(t)
+        for code in removed:
+            split.setdefault(shard_of(code, self.shards), ([], []))[1].append(code)
+        if not split:
+            done = concurrent.futures.Future()
+            done.set_result(None)
+            return done
+        return self._request({i: ("apply", (source, part, gone)) for i, (part, gone) in split.items()},
+                             lambda results: self._merge(source, results))
+
+    def apply(self, source, items, removed=()):
+        """submit() and wait for the merged delta."""
+        self.submit(source, items, removed).result()
+
+    def _merge(self, source, results):
+        new_a, new_b, resolved, changed = [], [], [], []
+        for shard_id, (a, b, r, open_a, open_b, ch) in results.items():
+            new_a += a
+            new_b += b
+            resolved += r
+            changed += ch
+            self._open[shard_id] = (open_a, open_b)
+        open_a = sum(o[0] for o in self._open)
+        open_b = sum(o[1] for o in self._open)
+        c.write_delta(new_a, new_b, resolved, open_a, open_b)
+        if self.search and changed:
+            c_search.update(c.side_of(source), changed)
+
+    def load_search(self):
+        """Index every shard's latest lines (after they restored their state)."""
+        for src, latest in self.query("latest").items():
+            c_search.update(src, latest)
+
+    def query(self, kind):
+        """Run an only_in/memory/latest query on every shard and merge the answers."""
+        results = self._request({i: (kind, None) for i in range(self.shards)}).result()
+        merged = {}
+        for shard_id in sorted(results):
+            for src, value in results[shard_id].items():
+                if kind in ("only_in", "latest"):
+                    merged.setdefault(src, []).extend(value)
+                else:
+                    total = merged.setdefault(src, {})
+                    for key, n in value.items():
+                        total[key] = total.get(key, 0) + n
+        return merged
@@ -0,0 +1,17 @@
+# conftest.py
+# Shared fixtures for the root test modules.
+import pytest
+
+import c_compare_logger as c
+
+@pytest.fixture
+def fresh_c(tmp_path, monkeypatch):
+    """C with empty state, writing its journals and compare_log.txt under tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(c, "JOURNAL_DIR", str(tmp_path))
+    monkeypatch.setattr(c, "history", c.new_history(str(tmp_path)))
+    monkeypatch.setattr(c, "index", c.ReconciliationIndex())
+    monkeypatch.setattr(c, "journals", {})
+    yield c
+    for journal in c.journals.values():
+        journal.close()
@@ -0,0 +1,177 @@
+# embedded.py
+# A, B and C in one process, connected by bounded in-memory queues.
+#
+# For small sites and tests: instead of A rendering <custom> tags over HTTP,
+# B re-parsing them and both sending JSON to C over TCP, the stages share
+# the item lines themselves:
+#
+#   A  every change to the ItemLines (see a_http.py) wakes the A thread,
+#      which queues A's delta for C and triggers B
+#   B  triggers go through B's TriggerScheduler (coalescing, one pull per A
+#      running and one queued); a pull reads its own delta of the same
+#      ItemLines and queues it for C
+#   C  one worker thread per source takes (lines, removed, trace) off that
+#      source's queue and runs c_compare_logger.apply_transactions
+#      (add_to_history + log_difference), so each source's deltas apply in
+#      the order they were taken
+#
+# A full queue blocks the A thread or B's pull until C catches up. The
+# lines are the str objects A holds; nothing is rendered, encoded or copied.
+#
+# Usage:
+#   python embedded.py [--window 0.05] [--queue-size 64] [--http-port 0]
+import time
+import queue
+import argparse
+import threading
+
+import metrics
+import c_compare_logger as c
+from a_http import make_server
+from b_collector_monitor import TriggerScheduler
+
+QUEUE_SIZE = 64        # deltas per source waiting for C before A or B blocks
+TRIGGER_WINDOW = 0.05  # seconds; B's coalescing window for A's changes
+METRICS_PORT = 9200    # /metrics and /traces; 0 disables
+SOURCE_URL = "embedded"  # the one A, as B's scheduler keys it
+
+M_DEPTH = metrics.gauge("embedded_queue_depth", "Deltas waiting for C", ["source"])
+M_REMOVED = metrics.counter("embedded_removed_total", "Codes removed on A", ["source"])
+
+class Pipeline:
+    """One process running A -> B -> C over `items` (an ItemLines)."""
+
+    def __init__(self, items, queue_size=QUEUE_SIZE, window=TRIGGER_WINDOW):
+        self.items = items
+        # One queue and one C worker per source: a later delta (e.g. a
+        # removal) must never be applied before an earlier one
+        self.queues = {"A": queue.Queue(queue_size), "B": queue.Queue(queue_size)}
+        self.scheduler = TriggerScheduler(self._pull_b, window)
+        self.cursors = {"A": "", "B": ""}
+        self._changed = threading.Event()
+        self._a_busy = False
+        self._threads = []
+        self._stopping = False
+
+    def start(self):
+        self.items.subscribe(lambda items: self._changed.set())
+        self._changed.set()  # first pass sends everything
+        self._threads = [threading.Thread(target=self._run_a, daemon=True)]
+        self._threads += [threading.Thread(target=self._run_c, args=(source,), daemon=True)
+                          for source in self.queues]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self):
+        self._stopping = True
+        self._changed.set()
+        for q in self.queues.values():
+            q.put(None)
+        for t in self._threads:
+            t.join()
+
+    def _delta(self, source):
+        lines, removed, cursor, _ = self.items.delta(self.cursors[source])
+        self.cursors[source] = cursor
+        if removed:
+            M_REMOVED.labels(source).inc(len(removed))
+        return lines, removed, cursor
+
+    def _submit(self, source, lines, removed, trace):
+        q = self.queues[source]
+        q.put((lines, removed, trace, time.perf_counter()))
+        M_DEPTH.labels(source).set(q.qsize())
+
+    # --- A: changes -> C, and a trigger for B ---
+    def _run_a(self):
+        while True:
+            self._changed.wait()
+            self._a_busy = True
+            self._changed.clear()
+            if self._stopping:
+                return
+            try:
+                trace = metrics.new_trace()
+                lines, removed, cursor = self._delta("A")
+                if lines or removed:
+                    self._submit("A", lines, removed, trace)
+                instance, _, version = cursor.partition(":")
+                self.scheduler.trigger(SOURCE_URL, trace, (instance, int(version)))
+            finally:
+                self._a_busy = False
+
+    # --- B: pull its own delta of A ---
+    def _pull_b(self, url, trace, on_sent, on_failed):
+        started = time.time()
+        lines, removed, _ = self._delta("B")
+        metrics.record_span(trace, "b.fetch", started, url=url)
+        if lines or removed:
+            self._submit("B", lines, removed, trace)
+        on_sent()  # the queue to C's B worker never drops a job
+
+    # --- C: apply ---
+    def _run_c(self, source):
+        q = self.queues[source]
+        while True:
+            job = q.get()
+            try:
+                if job is None:
+                    return
+                lines, removed, trace, queued = job
+                M_DEPTH.labels(source).set(q.qsize())
+                c.M_QUEUE_WAIT.observe(time.perf_counter() - queued)
+                c.apply_transactions(source, lines, trace, removed)
+            except Exception as e:
+                print(f"[embedded] Error applying {source} delta: {e}")
+            finally:
+                q.task_done()
+
+    def idle(self):
+        """True once every change has gone through A, B and C."""
+        s = self.scheduler.stats()
+        return (not self._changed.is_set() and not self._a_busy
+                and not s["pulls_running"] and not s["pulls_queued"]
+                and not any(q.unfinished_tasks for q in self.queues.values()))
+
+    def wait_idle(self, timeout=None, poll=0.005):
+        """Block until idle() (e.g. in tests); False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.idle():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll)
+        return True
+
+    def stats(self):
+        result = self.scheduler.stats()
+        result["queued"] = sum(q.qsize() for q in self.queues.values())
+        return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run A, B and C in one process")
+    parser.add_argument("--window", type=float, default=TRIGGER_WINDOW,
+                        help="seconds of A changes coalesced into one B pull")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    parser.add_argument("--http-port", type=int, default=0,
+                        help="also serve A's /itemlines on this port for outside B's (0 = off)")
+    parser.add_argument("--checkpoint-interval", type=int, default=c.CHECKPOINT_INTERVAL,
+                        help="Seconds between C state checkpoints (0 disables restore and checkpoints)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="Serve /metrics and /traces on this port (0 = off)")
+    args = parser.parse_args()
+    metrics.start_metrics_server(args.metrics_port)
+
+    from a_sql_monitor import itemlines  # A's sample data
+    if args.checkpoint_interval:
+        c.restore_state()
+        c.start_checkpointer(interval=args.checkpoint_interval)
+    pipeline = Pipeline(itemlines, args.queue_size, args.window).start()
+    print(f"[embedded] A -> B -> C running on {len(itemlines)} item lines")
+    if args.http_port:
+        server = make_server(itemlines, "0.0.0.0", args.http_port)
+        print(f"[embedded] A HTTP server running on port {args.http_port}...")
+        server.serve_forever()
+    else:
+        while True:
+            time.sleep(3600)
@@ -0,0 +1,112 @@
+# framing.py
+# Length-prefixed framing shared by A, B and C.
+# Each frame is a 4-byte big-endian length followed by a UTF-8 JSON body,
+# so one connection can carry many messages of any size. Transaction
+# batches may instead carry a binary body (see wire.py) once C has offered
+# that format; the body's first bytes tell the two apart.
+import json
+import struct
+
+import wire
+
+HEADER = struct.Struct("!I")
+MAX_FRAME = 64 * 1024 * 1024  # 64 MB per message
+
+class FrameError(Exception):
+    pass
+
+class BodyError(ValueError):
+    """A whole frame arrived but its body could not be decoded.
+
+    Unlike FrameError the stream is still in sync: reply and read on.
+    """
+
+def encode_frame(payload, binary=False):
+    """Encode a JSON-serialisable payload as one frame.
+
+    binary=True sends a payload with "transactions" in wire.py's format.
+    """
+    body = None
+    if binary and "transactions" in payload:
+        try:
+            body = wire.encode_payload(payload)
+        except (ValueError, OverflowError):
+            pass  # not representable (NUL in text, huge numbers): send JSON
+    if body is None:
+        body = json.dumps(payload).encode("utf-8")
+    return HEADER.pack(len(body)) + body
+
+def decode_body(body):
+    try:
+        payload = wire.decode_payload(body) if wire.is_binary(body) else json.loads(body.decode("utf-8"))
+    except (ValueError, TypeError, struct.error) as e:  # UnicodeDecodeError is a ValueError
+        raise BodyError(f"Bad frame body: {e}") from None
+    if not isinstance(payload, dict):
+        raise BodyError("Frame body is not a JSON object")
+    return payload
+
+def decode_legacy(data):
+    """Payload from the bytes of an unframed JSON message so far, or None if incomplete.
+
+    Decoding is only tried once the buffer ends in "}", so a large message
+    read in many chunks is not re-parsed after every chunk.
+    """
+    if not bytes(data[-64:]).rstrip().endswith(b"}"):
+        return None
+    try:
+        return json.loads(bytes(data).decode("utf-8"))
+    except ValueError:
+        return None
+
+def _check_length(length):
+    if length > MAX_FRAME:
+        raise FrameError(f"Frame of {length} bytes exceeds {MAX_FRAME}")
+
+# --- blocking sockets ---
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(min(n - len(buf), 1 << 20))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+def send_frame(sock, payload, binary=False):
+    sock.sendall(encode_frame(payload, binary))
+
+def recv_frame(sock):
+    """Read one frame from a blocking socket; None on clean EOF."""
+    header = _recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    (length,) = HEADER.unpack(header)
+    _check_length(length)
+    body = _recv_exact(sock, length)
+    if body is None:
+        raise FrameError("Connection closed mid-frame")
+    return decode_body(body)
+
+# --- asyncio streams ---
+async def read_frame(reader, header=None):
+    """Read one frame from an asyncio StreamReader; None on clean EOF.
+
+    `header` lets the caller pass bytes it already peeked at.
+    """
+    import asyncio
+    try:
+        if header is None:
+            header = await reader.readexactly(HEADER.size)
+        elif len(header) < HEADER.size:
+            header += await reader.readexactly(HEADER.size - len(header))
+    except asyncio.IncompleteReadError as e:
+        if not e.partial and not header:
+            return None
+        raise FrameError("Connection closed mid-header")
+    (length,) = HEADER.unpack(header)
+    _check_length(length)
+    try:
+        body = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise FrameError("Connection closed mid-frame")
+    return decode_body(body)
@@ -2,34 +2,22 @@
 
 import os
 import threading
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from a_http import ItemLines, make_handler, make_server  # copy a_http.py alongside
 
 # --- DATA ---
-lineitems = [
+lineitems = ItemLines([
     "101 18V Cordless Drill 2 89.99",
     "102 6-inch Wood Clamp 4 12.50",
     "103 Carpenter's Hammer 1 19.99"
-]
+])
 
 # -------------------------
-# Legacy HTTPServer Handler
+# HTTP Handler (threaded, cached body, ETag, gzip)
 # -------------------------
-class Handler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        if self.path == "/lineitems":   #endpoint
-            self.send_response(200)
-            self.send_header("Content-type", "text/plain")
-            self.end_headers()
-            for ln in lineitems:
-                self.wfile.write(f"<custom>{ln}</custom>\n".encode())  #change to match with b_collector_monitor
-        else:
-            self.send_response(404)
-            self.end_headers()
-            self.wfile.write(b"Not Found")
+Handler = make_handler(lineitems, "/lineitems")   #endpoint; <custom> tags match b_collector_monitor
 
 #def run_http_server(host="0.0.0.0", port=5555): 
-#    server_address = (host, port)
-#    httpd = HTTPServer(server_address, Handler)
+#    httpd = make_server(lineitems, host, port, "/lineitems")
 #    print(f"[A] Legacy server at http://{host}:{port}/line-items")
 #    httpd.serve_forever()
 
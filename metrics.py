@@ -0,0 +1,323 @@
+# metrics.py
+# Lightweight instrumentation shared by A, B, C and the Feed sink.
+#
+# Histograms are HDR-style: values are kept as integers (microseconds for
+# latencies) in log-linear buckets, 32 per power of two, so any quantile is
+# within ~3% at a fixed cost of one bit_length and one list increment per
+# observation, whatever the range. Counters and gauges are plain numbers.
+# Everything is exported in Prometheus text format at /metrics.
+#
+# Traces: A (or B, when no A trace arrived) starts a trace {"id", "start"}
+# and it travels in the trigger and in the JSON payloads ("trace" field).
+# Each process records the spans it ran for that trace in a small ring
+# served at /traces, so A->B->C timelines can be joined by trace id;
+# C also observes the end-to-end latency in als_end_to_end_seconds.
+import os
+import sys
+import time
+import json
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SUB_BITS = 5                   # 2**5 = 32 sub-buckets per power of two
+SUB_COUNT = 1 << SUB_BITS
+MAX_INDEX = 64 * SUB_COUNT     # covers any 64-bit value
+# Prometheus `le` bounds for latency histograms, in seconds
+LATENCY_BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                  0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 50000)
+TRACE_RING = 2048              # spans kept for /traces
+
+def _index(v):
+    if v < SUB_COUNT:
+        return v
+    shift = v.bit_length() - SUB_BITS - 1
+    return (shift + 1) * SUB_COUNT + (v >> shift) - SUB_COUNT
+
+def _lowest(i):
+    """Smallest value that falls in bucket `i`."""
+    if i < SUB_COUNT:
+        return i
+    shift = i // SUB_COUNT - 1
+    return (i % SUB_COUNT + SUB_COUNT) << shift
+
+def _highest(i):
+    return _lowest(i + 1) - 1
+
+def _label_str(names, values, extra=""):
+    parts = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _fmt(x):
+    return repr(float(x)) if isinstance(x, float) else str(x)
+
+class _Histogram:
+    def __init__(self, scale):
+        self.scale = scale
+        self.counts = [0] * MAX_INDEX
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        v = int(value * self.scale)
+        if v < 0:
+            v = 0
+        i = _index(v)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += v
+            if v > self.max:
+                self.max = v
+
+    def time(self):
+        return _Timer(self.observe)
+
+    def quantile(self, q):
+        """Value (in observed units) at quantile q, 0..1."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = max(1, int(q * self.count + 0.5))
+            seen = 0
+            for i, n in enumerate(self.counts):
+                if n:
+                    seen += n
+                    if seen >= rank:
+                        return min(_highest(i), self.max) / self.scale
+        return self.max / self.scale
+
+    def snapshot(self, bounds):
+        """(cumulative counts per bound, count, sum) for export."""
+        with self._lock:
+            nonzero = [(i, n) for i, n in enumerate(self.counts) if n]
+            count, total = self.count, self.total
+        limits = [b * self.scale for b in bounds]
+        cumulative = [0] * len(bounds)
+        for i, n in nonzero:
+            low = _lowest(i)
+            for j, limit in enumerate(limits):
+                if low <= limit:
+                    cumulative[j] += n
+        return cumulative, count, total / self.scale
+
+class _Timer:
+    __slots__ = ("record", "start")
+
+    def __init__(self, record):
+        self.record = record
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.record(time.perf_counter() - self.start)
+
+class _Value:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+    def dec(self, n=1):
+        with self._lock:
+            self.value -= n
+
+    def set(self, value):
+        self.value = value
+
+    def track(self):
+        """Context manager counting in-flight work."""
+        return _InFlight(self)
+
+class _InFlight:
+    __slots__ = ("gauge",)
+
+    def __init__(self, gauge):
+        self.gauge = gauge
+
+    def __enter__(self):
+        self.gauge.inc()
+
+    def __exit__(self, *exc):
+        self.gauge.dec()
+
+class Metric:
+    """A named metric family; `labels(...)` returns the child for one label set.
+
+    Unlabelled metrics can be used directly (inc, set, observe, time, track).
+    """
+
+    def __init__(self, kind, name, help, labelnames=(), scale=1e6, bounds=LATENCY_BOUNDS):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.scale = scale
+        self.bounds = bounds
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **kw):
+        key = tuple(str(v) for v in values) or tuple(str(kw[n]) for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = _Histogram(self.scale) if self.kind == "histogram" else _Value()
+                    self._children[key] = child
+        return child
+
+    def __getattr__(self, attr):
+        # inc/dec/set/track/observe/time/quantile on the unlabelled child
+        if attr.startswith("_") or attr in ("kind", "name", "help", "labelnames", "scale", "bounds"):
+            raise AttributeError(attr)
+        return getattr(self.labels(), attr)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            if self.kind != "histogram":
+                lines.append(f"{self.name}{_label_str(self.labelnames, key)} {_fmt(child.value)}")
+                continue
+            cumulative, count, total = child.snapshot(self.bounds)
+            labels = _label_str(self.labelnames, key)
+            for bound, n in zip(self.bounds, cumulative):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {n}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {count}")
+            lines.append(f"{self.name}_sum{labels} {_fmt(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        if self.kind == "histogram" and self._children:
+            # HDR quantiles, more precise than histogram_quantile() over the buckets
+            lines.append(f"# TYPE {self.name}_quantile gauge")
+            for key, child in sorted(self._children.items()):
+                for q in (0.5, 0.9, 0.99, 0.999):
+                    quantile = 'quantile="%s"' % q
+                    lines.append(f"{self.name}_quantile{_label_str(self.labelnames, key, quantile)} "
+                                 f"{_fmt(child.quantile(q))}")
+        return "\n".join(lines)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def _get(kind, name, help, labelnames, **kw):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = Metric(kind, name, help, labelnames, **kw)
+        return metric
+
+def counter(name, help, labelnames=()):
+    return _get("counter", name, help, labelnames)
+
+def gauge(name, help, labelnames=()):
+    return _get("gauge", name, help, labelnames)
+
+def histogram(name, help, labelnames=(), scale=1e6, bounds=LATENCY_BOUNDS):
+    """Latency histogram in seconds by default; pass scale=1, bounds=SIZE_BOUNDS for sizes."""
+    return _get("histogram", name, help, labelnames, scale=scale, bounds=bounds)
+
+START_TIME = time.time()
+
+def _process_lines():
+    lines = ["# TYPE process_start_time_seconds gauge", f"process_start_time_seconds {START_TIME}"]
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        lines += ["# TYPE process_resident_memory_bytes gauge", f"process_resident_memory_bytes {rss}"]
+    except (OSError, ValueError, AttributeError):
+        pass
+    return lines
+
+def render():
+    """All metrics in Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return "\n".join([m.render() for m in metrics] + _process_lines()) + "\n"
+
+# --- traces ---
+_spans = deque(maxlen=TRACE_RING)
+PROCESS = (os.environ.get("ALS_PROCESS")
+           or os.path.splitext(os.path.basename(sys.argv[0]))[0].strip("-") or "python")
+
+def new_trace():
+    return {"id": os.urandom(8).hex(), "start": time.time()}
+
+def valid_trace(trace):
+    """The trace dict from a payload, or None."""
+    if isinstance(trace, dict) and isinstance(trace.get("id"), str) \
+            and isinstance(trace.get("start"), (int, float)):
+        return trace
+    return None
+
+def trace_to_text(trace):
+    """Trigger-line encoding: "<id> <start>"."""
+    return f"{trace['id']} {trace['start']:.6f}"
+
+def trace_from_text(text):
+    parts = text.split()
+    if len(parts) == 2:
+        try:
+            return {"id": parts[0], "start": float(parts[1])}
+        except ValueError:
+            pass
+    return None
+
+def record_span(trace, name, started, ended=None, **attrs):
+    """Remember that `name` ran for `trace` between two time.time() stamps."""
+    if trace is None:
+        return
+    ended = time.time() if ended is None else ended
+    span = {"trace": trace["id"], "process": PROCESS, "span": name,
+            "start": round(started, 6), "ms": round((ended - started) * 1000, 3),
+            "since_trace_ms": round((ended - trace["start"]) * 1000, 3)}
+    span.update(attrs)
+    _spans.append(span)
+
+def spans(trace_id=None):
+    return [s for s in list(_spans) if trace_id is None or s["trace"] == trace_id]
+
+# --- /metrics endpoint ---
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+        if path == "/metrics":
+            body, ctype = render().encode("utf-8"), "text/plain; version=0.0.4"
+        elif path == "/traces":
+            trace_id = query[3:] if query.startswith("id=") else None
+            body, ctype = json.dumps(spans(trace_id)).encode("utf-8"), "application/json"
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        return
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """Serve /metrics and /traces on a daemon thread; port 0 disables."""
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[metrics] http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,60 @@
+# test_b_trigger_scheduler.py
+# TriggerScheduler: triggers count as covered only once their pull reached C.
+#
+# Usage:
+#   python -m pytest test_b_trigger_scheduler.py
+import threading
+
+from b_collector_monitor import TriggerScheduler
+
+URL = "http://a:8000/itemlines"
+
+class FakePull:
+    """Pull that fails the first `failures` times; records each call's outcome."""
+
+    def __init__(self, failures=0, raises=False):
+        self.failures = failures
+        self.raises = raises
+        self.calls = []
+        self.done = threading.Event()
+
+    def __call__(self, url, trace, on_sent, on_failed):
+        failed = len(self.calls) < self.failures
+        self.calls.append("failed" if failed else "sent")
+        if not failed:
+            on_sent()
+            self.done.set()
+        elif self.raises:
+            raise OSError("A is down")
+        else:
+            on_failed()
+
+def test_failed_pull_is_retried_and_its_triggers_stay_live():
+    pull = FakePull(failures=1)
+    scheduler = TriggerScheduler(pull, window=0.01, retry_delay=0.05)
+    assert scheduler.trigger(URL, None, ("a", 1)) == "queued"
+    assert pull.done.wait(5)
+    assert pull.calls == ["failed", "sent"]
+    assert scheduler.stats()["trigger_pulls_failed"] == 1
+    # the retry delivered seq 1, so an older or equal trigger is now stale
+    assert scheduler.trigger(URL, None, ("a", 1)) == "stale"
+
+def test_pull_raising_is_retried():
+    pull = FakePull(failures=2, raises=True)
+    scheduler = TriggerScheduler(pull, window=0.01, retry_delay=0.01)
+    scheduler.trigger(URL, None, ("a", 3))
+    assert pull.done.wait(5)
+    assert pull.calls == ["failed", "failed", "sent"]
+    assert scheduler.trigger(URL, None, ("a", 2)) == "stale"
+
+def test_seq_is_not_covered_before_the_send_succeeds():
+    sends = []
+    scheduler = TriggerScheduler(lambda url, trace, on_sent, on_failed: sends.append(on_sent),
+                                 window=0.01)
+    scheduler.trigger(URL, None, ("a", 5))
+    while not sends:
+        threading.Event().wait(0.01)
+    # C has not accepted the pull yet: the same seq still queues a pull
+    assert scheduler.trigger(URL, None, ("a", 5)) == "queued"
+    sends[0]()
+    assert scheduler.trigger(URL, None, ("a", 4)) == "stale"
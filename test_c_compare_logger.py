@@ -0,0 +1,40 @@
+# test_c_compare_logger.py
+# C's history and reconciliation index for B batches from several A front-ends.
+#
+# Usage:
+#   python -m pytest test_c_compare_logger.py
+import c_compare_logger as c
+from c_history_store import REMOVED
+
+EAST = "http://east:8000/itemlines"
+WEST = "http://west:8000/itemlines"
+
+def test_front_ends_keep_separate_b_histories(fresh_c):
+    c.apply_transactions("B", ["101 Hammer 2 10.00"], endpoint=EAST)
+    c.apply_transactions("B", ["101 Hammer 2 10.00", "102 Drill 1 50.00"], endpoint=WEST)
+    assert sorted(c.history) == ["A", "B", "B-http_east_8000_itemlines", "B-http_west_8000_itemlines"]
+    assert len(c.history["B"]) == 0
+    assert c.index.latest["B"] == {"101": "Hammer 2 10.00", "102": "Drill 1 50.00"}
+
+def test_removal_on_one_front_end_keeps_the_others_code(fresh_c):
+    c.apply_transactions("A", ["101 Hammer 2 10.00"])
+    c.apply_transactions("B", ["101 Hammer 2 10.00"], endpoint=EAST)
+    c.apply_transactions("B", ["101 Hammer 2 10.00"], endpoint=WEST)
+    c.apply_transactions("B", [], removed=["101"], endpoint=EAST)
+    assert c.history["B-http_east_8000_itemlines"].last("101")[1] == REMOVED
+    assert c.index.latest["B"] == {"101": "Hammer 2 10.00"}
+    assert c.index.only == {"A": set(), "B": set()}
+    c.apply_transactions("B", [], removed=["101"], endpoint=WEST)
+    assert c.index.latest["B"] == {}
+    assert c.index.only["A"] == {"101"}
+
+def test_restore_rebuilds_every_front_end(fresh_c):
+    c.apply_transactions("B", ["101 Hammer 2 10.00"], endpoint=EAST)
+    c.apply_transactions("B", ["102 Drill 1 50.00"], endpoint=WEST)
+    c.apply_transactions("B", [], removed=["102"], endpoint=WEST)
+    for journal in c.journals.values():
+        journal.close()
+    c.history, c.index, c.journals = c.new_history(c.JOURNAL_DIR), c.ReconciliationIndex(), {}
+    c.restore_state()
+    assert c.index.latest["B"] == {"101": "Hammer 2 10.00"}
+    assert c.history["B-http_west_8000_itemlines"].last("102")[1] == REMOVED
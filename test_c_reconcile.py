@@ -0,0 +1,51 @@
+# test_c_reconcile.py
+# c_reconcile over journal records, including <removed> tombstones.
+#
+# Usage:
+#   python -m pytest test_c_reconcile.py
+import pytest
+
+np = pytest.importorskip("numpy")
+import c_reconcile
+
+TS = "2024-01-01 10:00:00"
+
+def records(*lines):
+    return "".join(f"{TS} | {ln}\n" for ln in lines).encode("utf-8")
+
+def test_tombstone_drops_the_code():
+    a = c_reconcile.parse(records("101 Hammer 2 10.00", "102 Drill 1 50.00", "102 <removed>"), True)
+    b = c_reconcile.parse(records("101 Hammer 2 10.00"), True)
+    assert a.skipped == 0
+    report = c_reconcile.reconcile(a, b)
+    assert report["only_A"] == []
+    assert report["A"]["codes"] == 1
+    assert report["matched"] == 1
+
+def test_line_after_tombstone_brings_the_code_back():
+    a = c_reconcile.parse(records("102 Drill 1 50.00", "102 <removed>", "102 Drill 3 55.00"), True)
+    b = c_reconcile.parse(records("102 Drill 1 50.00"), True)
+    report = c_reconcile.reconcile(a, b)
+    assert report["matched"] == 1
+    assert report["qty_diffs"] == [["102", 3, 1]]
+
+def test_tombstone_in_a_later_segment(tmp_path):
+    (tmp_path / "history_A.txt").write_bytes(records("X-1 Saw 1 7.00", "X-2 Nail 9 0.10"))
+    (tmp_path / "history_A.00000001.log").write_bytes(records("X-1 <removed>"))
+    (tmp_path / "history_B.txt").write_bytes(records("X-2 Nail 9 0.10"))
+    a = c_reconcile.read_history("A", str(tmp_path))
+    b = c_reconcile.read_history("B", str(tmp_path))
+    report = c_reconcile.reconcile(a, b)
+    assert report["only_A"] == [] and report["only_B"] == []
+    assert report["A"]["skipped"] == 0
+    assert report["matched"] == 1
+
+def test_b_front_ends_are_one_side(tmp_path):
+    (tmp_path / "history_A.txt").write_bytes(records("101 Hammer 2 10.00", "102 Drill 1 50.00"))
+    (tmp_path / "history_B-east.txt").write_bytes(records("101 Hammer 2 10.00", "102 Drill 1 50.00"))
+    (tmp_path / "history_B-west.00000001.log").write_bytes(records("102 Drill 1 50.00", "102 <removed>"))
+    a = c_reconcile.read_side("A", str(tmp_path))
+    b = c_reconcile.read_side("B", str(tmp_path))
+    report = c_reconcile.reconcile(a, b)
+    assert report["only_A"] == [] and report["only_B"] == []
+    assert report["matched"] == 2
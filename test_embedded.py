@@ -0,0 +1,46 @@
+# test_embedded.py
+# The embedded A -> B -> C pipeline end to end, checked against C's state.
+#
+# Usage:
+#   python -m pytest test_embedded.py
+import c_compare_logger as c
+from c_history_store import REMOVED
+from a_http import ItemLines
+from embedded import Pipeline
+
+def run(pipeline, change=None):
+    if change:
+        change()
+    assert pipeline.wait_idle(timeout=10)
+
+def test_upsert_then_removal(fresh_c):
+    items = ItemLines(["101 Hammer 2 10.00", "102 Drill 1 50.00"])
+    pipeline = Pipeline(items, window=0.01).start()
+    try:
+        run(pipeline)
+        # several updates of one code, then its removal, in quick succession
+        run(pipeline, lambda: [items.upsert([f"102 Drill {n} 50.00"]) for n in range(2, 6)]
+                              + [items.remove("102 Drill 5 50.00")])
+        run(pipeline, lambda: items.upsert(["103 Saw 3 7.00"]))
+    finally:
+        pipeline.stop()
+
+    for source in ("A", "B"):
+        assert c.index.latest[source] == {"101": "Hammer 2 10.00", "103": "Saw 3 7.00"}
+        assert c.history[source].last("102")[1] == REMOVED
+    assert c.index.only == {"A": set(), "B": set()}
+
+def test_removed_code_comes_back(fresh_c):
+    items = ItemLines(["201 Nail 9 0.10"])
+    pipeline = Pipeline(items, window=0.01).start()
+    try:
+        run(pipeline)
+        run(pipeline, lambda: items.remove("201 Nail 9 0.10"))
+        run(pipeline, lambda: items.append("201 Nail 8 0.12"))
+    finally:
+        pipeline.stop()
+
+    for source in ("A", "B"):
+        assert c.index.latest[source] == {"201": "Nail 8 0.12"}
+        assert [rest for _, rest in c.history[source].versions("201")] == \
+            ["Nail 9 0.10", REMOVED, "Nail 8 0.12"]
@@ -0,0 +1,36 @@
+# test_wire.py
+# Binary batches: round trip and rejection of malformed frames.
+#
+# Usage:
+#   python -m pytest test_wire.py
+import struct
+
+import pytest
+
+import wire
+
+LINES = ["101 Hammer 2 10.00", "X1 Drill 1 5.00", "odd line"]
+
+def encode(lines=LINES):
+    return wire.encode_payload({"source": "B", "transactions": lines})
+
+def test_round_trip():
+    payload = wire.decode_payload(encode())
+    assert payload["source"] == "B"
+    assert list(payload["transactions"]) == LINES
+
+def test_string_index_out_of_range_rejects_the_frame():
+    body = bytearray(encode())
+    body[-1] = 0xff  # last record's val index
+    with pytest.raises(ValueError, match="string index"):
+        wire.decode_payload(bytes(body))
+
+def test_unknown_typecodes_are_rejected():
+    body = bytearray(encode())
+    struct.pack_into("4s", body, 6, b"BBdB")
+    with pytest.raises(ValueError, match="typecodes"):
+        wire.decode_payload(bytes(body))
+
+def test_truncated_frame_is_rejected():
+    with pytest.raises(ValueError, match="Truncated"):
+        wire.decode_payload(encode()[:-1])
@@ -0,0 +1,245 @@
+# wire.py
+# Binary transaction batches for A/B -> C ("bin1"), negotiated next to JSON.
+#
+# A frame body starting with MAGIC is a binary batch; anything else is the
+# JSON body framing.py always sent. Transactions follow the LINENO / DESC /
+# QTY / VAL layout (see search.html) and are stored column by column:
+#
+#   header   "<4sBB4sIIII": MAGIC, VERSION, flags, typecodes of the four
+#            arrays below, len(meta), strings, len(blob), records
+#   meta     JSON object with every payload key except "transactions"
+#   blob     the string table, UTF-8, NUL-separated: "" first, then every
+#            distinct description and value (and code, unless NUMERIC_CODES)
+#   code     the code itself with NUMERIC_CODES, else a string index
+#   desc     string index
+#   qty      the quantity
+#   val      string index (values are kept as sent, e.g. "89.99")
+#
+# Each array uses the narrowest type that fits and every section starts on
+# an 8-byte boundary. A line that does not split into those four fields
+# exactly is sent whole: val is 0 (the "" string) and desc indexes the line.
+# Arrays are read through memoryview casts straight off the received body,
+# so decoding copies no fields; the string table is decoded in one split.
+# Text containing NUL cannot be sent this way (encode_payload raises
+# ValueError and framing.py sends JSON instead). decode_payload checks the
+# header, section sizes and every string index before returning, so a
+# malformed batch raises ValueError up front instead of part-way through
+# being applied.
+import sys
+import json
+import struct
+from array import array
+
+MAGIC = b"ALSB"
+VERSION = 1
+FORMAT = "bin1"
+FORMATS = [FORMAT, "json"]   # what C accepts, preferred first
+HEADER = struct.Struct("<4sBB4sIIII")
+NUMERIC_CODES = 1            # flag: every code is a plain decimal integer
+WHOLE_LINE = 0               # val index of a line sent whole
+UNSIGNED = "BHIQ"
+SIGNED = "bhiq"
+QTY_TEXT_MAX = 4096          # quantities below this are turned into text by lookup
+LITTLE = sys.byteorder == "little"
+
+def is_binary(body):
+    return body[:4] == MAGIC
+
+def split_line(line):
+    """(code, desc, qty, val) when `line` is exactly "<code> <desc> <qty> <val>", else None."""
+    parts = line.split(" ", 1)
+    if len(parts) < 2:
+        return None
+    fields = parts[1].rsplit(" ", 2)
+    if len(fields) < 3 or not fields[2]:
+        return None
+    desc, qty, val = fields
+    try:
+        q = int(qty)
+    except ValueError:
+        return None
+    if str(q) != qty:
+        return None
+    return parts[0], desc, q, val
+
+def _split_all(lines):
+    """split_line for a whole batch in list comprehensions; None if any line needs the slow path."""
+    heads = [line.split(" ", 1) for line in lines]
+    if min(map(len, heads), default=2) < 2:
+        return None
+    fields = [head[1].rsplit(" ", 2) for head in heads]
+    if min(map(len, fields), default=3) < 3:
+        return None
+    descs, qty_text, vals = zip(*fields) if fields else ((), (), ())
+    try:
+        qtys = list(map(int, qty_text))
+    except ValueError:
+        return None
+    if list(map(str, qtys)) != list(qty_text) or "" in vals:
+        return None
+    return [head[0] for head in heads], descs, qtys, vals
+
+def _narrowest(values, typecodes):
+    lo, hi = (min(values), max(values)) if len(values) else (0, 0)
+    for code in typecodes:
+        bits = array(code).itemsize * 8
+        if code in UNSIGNED:
+            if lo >= 0 and hi < 1 << bits:
+                return code
+        elif -(1 << bits - 1) <= lo and hi < 1 << bits - 1:
+            return code
+    raise OverflowError("value does not fit in 64 bits")
+
+def _numeric(codes):
+    """Codes as ints if every one is a plain non-negative decimal, else None."""
+    try:
+        numbers = list(map(int, codes))
+    except ValueError:
+        return None
+    if list(map(str, numbers)) != list(codes) or (numbers and (min(numbers) < 0 or max(numbers) >= 1 << 64)):
+        return None
+    return numbers
+
+def _pad(n):
+    return -n % 8
+
+def encode_payload(payload):
+    """Binary body for a {"source", "transactions": [line, ...], ...} payload."""
+    meta = json.dumps({k: v for k, v in payload.items() if k != "transactions"}).encode("utf-8")
+    lines = payload.get("transactions", [])
+    table = {"": WHOLE_LINE}
+    split = _split_all(lines)
+    if split is not None:
+        codes, descs, qtys, vals = split
+        descs = [table.setdefault(d, len(table)) for d in descs]
+        vals = [table.setdefault(v, len(table)) for v in vals]
+    else:
+        codes, descs, qtys, vals = [], [], [], []
+        for line in lines:
+            fields = split_line(line)
+            if fields is None:
+                fields = ("0", line, 0, "")
+            codes.append(fields[0])
+            descs.append(table.setdefault(fields[1], len(table)))
+            qtys.append(fields[2])
+            vals.append(table.setdefault(fields[3], len(table)))
+    flags = 0
+    numbers = _numeric(codes)
+    if numbers is not None:
+        flags |= NUMERIC_CODES
+        codes = numbers
+    else:
+        codes = [table.setdefault(c, len(table)) for c in codes]
+    text = "\0".join(table)
+    if text.count("\0") != len(table) - 1:
+        raise ValueError("Transaction text contains NUL")
+    blob = text.encode("utf-8")
+    typecodes = (_narrowest(codes, UNSIGNED) + _narrowest(descs, UNSIGNED) +
+                 _narrowest(qtys, SIGNED) + _narrowest(vals, UNSIGNED))
+    arrays = [array(t, col) for t, col in zip(typecodes, (codes, descs, qtys, vals))]
+    if not LITTLE:
+        for col in arrays:
+            col.byteswap()
+    out = [HEADER.pack(MAGIC, VERSION, flags, typecodes.encode("ascii"),
+                       len(meta), len(table), len(blob), len(qtys))]
+    size = HEADER.size
+    for part in [meta, blob] + [col.tobytes() for col in arrays]:
+        pad = _pad(size)
+        out.append(b"\0" * pad)
+        out.append(part)
+        size += pad + len(part)
+    return b"".join(out)
+
+class Records:
+    """Transactions of one binary batch; iterates like the JSON list of lines."""
+
+    def __init__(self, strings, codes, descs, qtys, vals, numeric_codes=False):
+        self.strings = strings
+        self.codes, self.descs, self.qtys, self.vals = codes, descs, qtys, vals
+        self.numeric_codes = numeric_codes
+
+    def __len__(self):
+        return len(self.qtys)
+
+    def _code_text(self):
+        return map(str, self.codes) if self.numeric_codes else map(self.strings.__getitem__, self.codes)
+
+    def _qty_text(self):
+        if len(self.qtys) and min(self.qtys) >= 0 and max(self.qtys) < QTY_TEXT_MAX:
+            return map([str(q) for q in range(max(self.qtys) + 1)].__getitem__, self.qtys)
+        return map(str, self.qtys)
+
+    def _whole_lines(self):
+        return len(self.vals) and min(self.vals) == WHOLE_LINE
+
+    def fields(self):
+        """Yield (code, desc, qty, val); a line sent whole comes back as (None, line, None, None)."""
+        s = self.strings
+        for c, d, q, v in zip(self._code_text(), self.descs, self.qtys, self.vals):
+            yield (None, s[d], None, None) if v == WHOLE_LINE else (c, s[d], q, s[v])
+
+    def pairs(self):
+        """(code, rest) as line.split(" ", 1) gives them; lines without a space are skipped."""
+        if self._whole_lines():
+            return (parts for parts in (line.split(" ", 1) for line in self) if len(parts) == 2)
+        get = self.strings.__getitem__
+        rest = map(" ".join, zip(map(get, self.descs), self._qty_text(), map(get, self.vals)))
+        return zip(self._code_text(), rest)
+
+    def __iter__(self):
+        get = self.strings.__getitem__
+        if self._whole_lines():
+            return (s if c is None else f"{c} {s} {q} {v}" for c, s, q, v in self.fields())
+        return map(" ".join, zip(self._code_text(), map(get, self.descs), self._qty_text(), map(get, self.vals)))
+
+def _array(view, pos, typecode, count):
+    pos += _pad(pos)
+    size = array(typecode).itemsize * count
+    if pos + size > len(view):
+        raise ValueError("Truncated binary batch")
+    col = view[pos:pos + size].cast(typecode)
+    if not LITTLE:
+        col = array(typecode, col)
+        col.byteswap()
+    return col, pos + size
+
+def decode_payload(body):
+    """Payload dict for a binary body; "transactions" is a Records."""
+    view = memoryview(body)
+    if len(view) < HEADER.size:
+        raise ValueError("Truncated binary batch")
+    magic, version, flags, typecodes, meta_len, n_strings, blob_len, n_records = HEADER.unpack_from(view)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unsupported binary batch version {version}")
+    typecodes = typecodes.decode("ascii", "replace")
+    if not (typecodes[0] in UNSIGNED and typecodes[1] in UNSIGNED and
+            typecodes[2] in SIGNED and typecodes[3] in UNSIGNED):
+        raise ValueError(f"Unsupported binary batch typecodes {typecodes!r}")
+    pos = HEADER.size + _pad(HEADER.size)
+    meta = json.loads(str(view[pos:pos + meta_len], "utf-8"))
+    pos += meta_len
+    pos += _pad(pos)
+    if pos + blob_len > len(view):
+        raise ValueError("Truncated binary batch")
+    strings = str(view[pos:pos + blob_len], "utf-8").split("\0")
+    if len(strings) != n_strings:
+        raise ValueError("Corrupt binary batch string table")
+    pos += blob_len
+    arrays = []
+    for typecode in typecodes:
+        col, pos = _array(view, pos, typecode, n_records)
+        arrays.append(col)
+    # Every string index is checked here, so a bad batch is rejected whole
+    # before C applies any of it
+    codes, descs, _, vals = arrays
+    indexed = (descs, vals) if flags & NUMERIC_CODES else (codes, descs, vals)
+    if n_records and max(max(col) for col in indexed) >= n_strings:
+        raise ValueError("Corrupt binary batch: string index out of range")
+    meta["transactions"] = Records(strings, *arrays, numeric_codes=bool(flags & NUMERIC_CODES))
+    return meta
+
+def transaction_pairs(transactions):
+    """(code, rest) pairs from a JSON list of lines or a Records batch."""
+    if isinstance(transactions, Records):
+        return transactions.pairs()
+    return (parts for parts in (t.split(" ", 1) for t in transactions) if len(parts) == 2)